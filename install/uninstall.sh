@@ -70,6 +70,12 @@ remove_files() {
     echo_success "\tdevice.json does not exist in $CONFIG_DIR"
   fi
 
+  # Remove the runtime state journal if it exists
+  if [ -f "$CONFIG_DIR/state.jsonl" ]; then
+    rm "$CONFIG_DIR/state.jsonl"
+    echo_success "\tRemoved state.jsonl."
+  fi
+
   # Remove plugins.json if it exists
   if [ -f "$CONFIG_DIR/plugins.json" ]; then
     rm "$CONFIG_DIR/plugins.json"
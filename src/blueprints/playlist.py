@@ -4,7 +4,9 @@ import json
 from datetime import datetime
 import os
 import logging
-from utils.app_utils import resolve_path, handle_request_files
+from utils.app_utils import resolve_path, handle_request_files, parse_form
+from utils import image_store
+from plugins.plugin_registry import notify_settings_saved
 
 
 logger = logging.getLogger(__name__)
@@ -17,7 +19,7 @@ def add_plugin():
     playlist_manager = device_config.get_playlist_manager()
 
     try:
-        plugin_settings = request.form.to_dict()
+        plugin_settings = parse_form(request.form)
         refresh_settings = json.loads(plugin_settings.pop("refresh_settings"))
         plugin_id = plugin_settings.pop("plugin_id")
 
@@ -63,6 +65,8 @@ def add_plugin():
             return jsonify({"error": "Failed to add to playlist"}), 500
 
         device_config.write_config()
+        refresh_task.signal_config_change(plugin_instance=True)
+        notify_settings_saved(device_config, plugin_id, plugin_settings)
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
     return jsonify({"success": True, "message": "Scheduled refresh configured."})
@@ -82,6 +86,7 @@ def playlists():
 @playlist_bp.route('/create_playlist', methods=['POST'])
 def create_playlist():
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     data = request.json
@@ -107,6 +112,7 @@ def create_playlist():
 
         # save changes to device config file
         device_config.write_config()
+        refresh_task.signal_config_change(playlist=True)
 
     except Exception as e:
         logger.exception("EXCEPTION CAUGHT: " + str(e))
@@ -118,6 +124,7 @@ def create_playlist():
 @playlist_bp.route('/update_playlist/<string:playlist_name>', methods=['PUT'])
 def update_playlist(playlist_name):
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     data = request.get_json()
@@ -138,12 +145,14 @@ def update_playlist(playlist_name):
     if not result:
         return jsonify({"error": "Failed to delete playlist"}), 500
     device_config.write_config()
+    refresh_task.signal_config_change(playlist=True)
 
     return jsonify({"success": True, "message": f"Updated playlist '{playlist_name}'!"})
 
 @playlist_bp.route('/delete_playlist/<string:playlist_name>', methods=['DELETE'])
 def delete_playlist(playlist_name):
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     if not playlist_name:
@@ -155,6 +164,8 @@ def delete_playlist(playlist_name):
 
     playlist_manager.delete_playlist(playlist_name)
     device_config.write_config()
+    refresh_task.signal_config_change(playlist=True)
+    image_store.collect_garbage(device_config)
 
     return jsonify({"success": True, "message": f"Deleted playlist '{playlist_name}'!"})
 
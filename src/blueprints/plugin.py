@@ -1,6 +1,7 @@
-from flask import Blueprint, request, jsonify, current_app, render_template, send_from_directory
-from plugins.plugin_registry import get_plugin_instance
-from utils.app_utils import resolve_path, handle_request_files
+from flask import Blueprint, request, jsonify, current_app, render_template, send_from_directory, Response, stream_with_context
+from plugins.plugin_registry import get_plugin_instance, notify_settings_saved
+from utils.app_utils import resolve_path, handle_request_files, parse_form
+from utils import image_store
 from refresh_task import ManualRefresh, PlaylistRefresh
 import json
 import os
@@ -10,6 +11,7 @@ logger = logging.getLogger(__name__)
 plugin_bp = Blueprint("plugin", __name__)
 
 PLUGINS_DIR = resolve_path("plugins")
+SSE_KEEPALIVE_SECONDS = 15
 
 @plugin_bp.route('/plugin/<plugin_id>')
 def plugin_page(plugin_id):
@@ -49,6 +51,7 @@ def image(plugin_id, filename):
 @plugin_bp.route('/delete_plugin_instance', methods=['POST'])
 def delete_plugin_instance():
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     data = request.json
@@ -67,6 +70,9 @@ def delete_plugin_instance():
 
         # save changes to device config file
         device_config.write_config()
+        refresh_task.signal_config_change(plugin_instance=True)
+        # remove uploads only this instance used
+        image_store.collect_garbage(device_config)
 
     except Exception as e:
         logger.exception("EXCEPTION CAUGHT: " + str(e))
@@ -77,10 +83,11 @@ def delete_plugin_instance():
 @plugin_bp.route('/update_plugin_instance/<string:instance_name>', methods=['PUT'])
 def update_plugin_instance(instance_name):
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
     playlist_manager = device_config.get_playlist_manager()
 
     try:
-        form_data = request.form.to_dict()
+        form_data = parse_form(request.form)
 
         if not instance_name:
             raise RuntimeError("Instance name is required")
@@ -94,6 +101,9 @@ def update_plugin_instance(instance_name):
 
         plugin_instance.settings = plugin_settings
         device_config.write_config()
+        notify_settings_saved(device_config, plugin_id, plugin_settings)
+        image_store.collect_garbage(device_config)
+        refresh_task.signal_config_change(plugin_instance=True)
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
     return jsonify({"success": True, "message": f"Updated plugin instance {instance_name}."})
@@ -118,11 +128,11 @@ def display_plugin_instance():
         if not plugin_instance:
             return jsonify({"success": False, "message": f"Plugin instance '{plugin_instance_name}' not found"}), 400
 
-        refresh_task.manual_update(PlaylistRefresh(playlist, plugin_instance))
+        job = refresh_task.submit_manual_update(PlaylistRefresh(playlist, plugin_instance))
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-    return jsonify({"success": True, "message": "Display updated"}), 200
+    return update_job_response(job)
 
 @plugin_bp.route('/update_now', methods=['POST'])
 def update_now():
@@ -130,12 +140,51 @@ def update_now():
     refresh_task = current_app.config['REFRESH_TASK']
 
     try:
-        plugin_settings = request.form.to_dict()  # Get all form data
+        plugin_settings = parse_form(request.form)  # Get all form data
         plugin_settings.update(handle_request_files(request.files))
         plugin_id = plugin_settings.pop("plugin_id")
+        notify_settings_saved(device_config, plugin_id, plugin_settings)
 
-        refresh_task.manual_update(ManualRefresh(plugin_id, plugin_settings))
+        job = refresh_task.submit_manual_update(ManualRefresh(plugin_id, plugin_settings))
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
-    return jsonify({"success": True, "message": "Display updated"}), 200
\ No newline at end of file
+    return update_job_response(job)
+
+@plugin_bp.route('/update_status/<string:job_id>')
+def update_status(job_id):
+    refresh_task = current_app.config['REFRESH_TASK']
+
+    job = refresh_task.get_job(job_id)
+    if not job:
+        return jsonify({"error": f"Update job '{job_id}' not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@plugin_bp.route('/update_status/<string:job_id>/stream')
+def update_status_stream(job_id):
+    refresh_task = current_app.config['REFRESH_TASK']
+
+    job = refresh_task.get_job(job_id)
+    if not job:
+        return jsonify({"error": f"Update job '{job_id}' not found"}), 404
+
+    def generate():
+        status = None
+        while True:
+            # wake up periodically to send a keep alive comment
+            new_status = job.wait_for_update(status, timeout=SSE_KEEPALIVE_SECONDS)
+            if new_status == status:
+                yield ": keep-alive\n\n"
+                continue
+            status = new_status
+            yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.is_finished():
+                break
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def update_job_response(job):
+    """Returns the response for a queued manual update, the client polls the job until it completes."""
+    if not job:
+        return jsonify({"success": True, "message": "Display updated"}), 200
+    return jsonify({"success": True, "message": "Update queued", **job.to_dict()}), 202
\ No newline at end of file
@@ -13,6 +13,7 @@ def settings_page():
 @settings_bp.route('/save_settings', methods=['POST'])
 def save_settings():
     device_config = current_app.config['DEVICE_CONFIG']
+    refresh_task = current_app.config['REFRESH_TASK']
 
     try:
         form_data = request.form.to_dict()
@@ -35,8 +36,14 @@ def save_settings():
             "plugin_cycle_interval_seconds": plugin_cycle_interval_seconds
         }
         device_config.update_config(settings)
+        refresh_task.signal_config_change()
     except RuntimeError as e:
         return jsonify({"error": str(e)}), 500
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-    return jsonify({"success": True, "message": "Saved settings."})
\ No newline at end of file
+    return jsonify({"success": True, "message": "Saved settings."})
+
+@settings_bp.route('/config_write_stats')
+def config_write_stats():
+    device_config = current_app.config['DEVICE_CONFIG']
+    return jsonify(device_config.get_write_stats())
@@ -1,11 +1,19 @@
 import os
 import json
 import logging
+import shutil
+import tempfile
+import threading
+from datetime import datetime
 from dotenv import load_dotenv
 from model import PlaylistManager, RefreshInfo
+from state_journal import StateJournal, DEFAULT_MAX_ENTRIES
 
 logger = logging.getLogger(__name__)
 
+# seconds to wait for further changes before writing the config file
+DEFAULT_WRITE_DEBOUNCE_SECONDS = 5
+
 class Config:
     # Base path for the project directory
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -14,6 +22,9 @@ class Config:
     config_file = os.path.join(BASE_DIR, "config", "device.json")
     plugins_file = os.path.join(BASE_DIR, "plugins", "plugins.json")
 
+    # Append-only journal of the runtime state (latest refresh, playlist positions)
+    state_file = os.path.join(BASE_DIR, "config", "state.jsonl")
+
     # File path for storing the current image being displayed
     current_image_file = os.path.join(BASE_DIR, "static", "images", "current_image.png")
 
@@ -26,6 +37,25 @@ class Config:
         self.playlist_manager = self.load_playlist_manager()
         self.refresh_info = self.load_refresh_info()
 
+        self._write_lock = threading.RLock()
+        self._write_timer = None
+        # configs written before the state journal existed still contain the runtime state
+        self._config_dirty = "refresh_info" in self.config
+        with open(self.config_file, "rb") as f:
+            self._last_written = f.read()
+        self.write_stats = {
+            "requested": 0,
+            "written": 0,
+            "skipped_clean": 0,
+            "skipped_identical": 0,
+            "coalesced": 0,
+            "journal_entries": 0,
+            "last_write_time": None
+        }
+
+        self.state_journal = StateJournal(self.state_file, self.get_config("state_journal_max_entries", default=DEFAULT_MAX_ENTRIES))
+        self.load_runtime_state()
+
     def read_config(self):
         """Reads the device config JSON file and returns it as a dictionary."""
         logger.debug(f"Reading device config from {self.config_file}")
@@ -41,12 +71,101 @@ class Config:
         return plugins_list
 
     def write_config(self):
-        """Updates the cached config from the model objects and writes to the config file."""
-        logger.debug(f"Writing device config to {self.config_file}")
-        self.update_value("playlist_config", self.playlist_manager.to_dict())
-        self.update_value("refresh_info", self.refresh_info.to_dict())
-        with open(self.config_file, 'w') as outfile:
-            json.dump(self.config, outfile, indent=4)
+        """Schedules a write of the config file if the config or its model objects changed.
+
+        Writes requested within `config_write_debounce_seconds` of each other are coalesced into a single
+        write. Use `flush_config()` to write pending changes immediately (e.g. on shutdown).
+        """
+        with self._write_lock:
+            self.write_stats["requested"] += 1
+            if not self.is_dirty():
+                self.write_stats["skipped_clean"] += 1
+                return
+            if self._write_timer:
+                self.write_stats["coalesced"] += 1
+                return
+
+            debounce_seconds = self.get_config("config_write_debounce_seconds", default=DEFAULT_WRITE_DEBOUNCE_SECONDS)
+            if not debounce_seconds:
+                self.flush_config()
+                return
+            self._write_timer = threading.Timer(debounce_seconds, self.flush_config)
+            self._write_timer.daemon = True
+            self._write_timer.start()
+
+    def flush_config(self):
+        """Updates the cached config from the model objects and writes it to the config file if anything changed."""
+        with self._write_lock:
+            if self._write_timer:
+                self._write_timer.cancel()
+                self._write_timer = None
+            if not self.is_dirty():
+                return
+
+            # the flags are cleared before the snapshot, so a change made while it is taken marks them again
+            # and is written by the next flush instead of being lost
+            self._config_dirty = False
+            self.playlist_manager.clear_dirty()
+            self.refresh_info.clear_dirty()
+
+            try:
+                # runtime state goes to the journal, device.json only holds what the user configured
+                self.config["playlist_config"] = self.playlist_manager.to_dict(include_runtime_state=False)
+                self.config.pop("refresh_info", None)
+                data = json.dumps(self.config, indent=4).encode("utf-8")
+                runtime_state = self.get_runtime_state()
+
+                self.write_stats["journal_entries"] += self.state_journal.update(runtime_state)
+
+                if data == self._last_written:
+                    self.write_stats["skipped_identical"] += 1
+                    return
+
+                logger.debug(f"Writing device config to {self.config_file}")
+                self._write_atomic(data)
+            except Exception:
+                # nothing is known to be written, keep everything pending for the next flush
+                self._config_dirty = True
+                self.playlist_manager.mark_dirty()
+                self.refresh_info.mark_dirty()
+                raise
+            self._last_written = data
+            self.write_stats["written"] += 1
+            self.write_stats["last_write_time"] = datetime.now().isoformat()
+
+    def _write_atomic(self, data):
+        """Writes the data to a temporary file and renames it over the config file, so it is never left half written."""
+        config_dir = os.path.dirname(self.config_file)
+        fd, tmp_path = tempfile.mkstemp(prefix=".device.", suffix=".json.tmp", dir=config_dir)
+        try:
+            if os.path.exists(self.config_file):
+                # mkstemp creates the file private to the owner, keep the original permissions
+                shutil.copymode(self.config_file, tmp_path)
+            with os.fdopen(fd, "wb") as outfile:
+                outfile.write(data)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            os.replace(tmp_path, self.config_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        # persist the rename itself
+        dir_fd = os.open(config_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def is_dirty(self):
+        """Returns True if the config or its model objects changed since the last write."""
+        return self._config_dirty or self.playlist_manager.is_dirty() or self.refresh_info.is_dirty()
+
+    def get_write_stats(self):
+        """Returns counters of requested, performed and skipped config writes."""
+        with self._write_lock:
+            return dict(self.write_stats, pending=self._write_timer is not None)
 
     def get_config(self, key=None, default={}):
         """Gets the value of a specific configuration key or returns the entire config if none provided."""
@@ -70,11 +189,14 @@ class Config:
 
     def update_config(self, config):
         """Updates the config with the new values provided and writes to the config file."""
-        self.config.update(config)
+        for key, value in config.items():
+            self.update_value(key, value)
         self.write_config()
 
     def update_value(self, key, value, write=False):
         """Updates a specific key in the configuration with a new value and optionally writes it to the config file."""
+        if self.config.get(key) != value:
+            self._config_dirty = True
         self.config[key] = value
         if write:
             self.write_config()
@@ -87,13 +209,73 @@ class Config:
     def load_playlist_manager(self):
         """Loads the playlist manager object from the config."""
         playlist_manager = PlaylistManager.from_dict(self.get_config("playlist_config"))
+        # freshly loaded state matches the file, only the default playlist added below needs saving
+        playlist_manager.clear_dirty()
         if not playlist_manager.playlists:
             playlist_manager.add_default_playlist()
         return playlist_manager
 
     def load_refresh_info(self):
         """Loads the refresh information from the config."""
-        return RefreshInfo.from_dict(self.get_config("refresh_info"))
+        refresh_info = RefreshInfo.from_dict(self.get_config("refresh_info"))
+        refresh_info.clear_dirty()
+        return refresh_info
+
+    def get_runtime_state(self):
+        """Returns the scheduler bookkeeping that is persisted in the state journal rather than device.json."""
+        playlists = {}
+        for playlist in self.playlist_manager.playlists:
+            plugins = {}
+            for plugin in playlist.plugins:
+                plugins.setdefault(plugin.plugin_id, {})[plugin.name] = {"latest_refresh_time": plugin.latest_refresh_time}
+            playlists[playlist.name] = {"current_plugin_index": playlist.current_plugin_index, "plugins": plugins}
+
+        refresh_info = self.refresh_info
+        return {
+            # every field is included so values that were cleared are journaled as well
+            "refresh_info": {
+                "refresh_time": refresh_info.refresh_time,
+                "image_hash": refresh_info.image_hash,
+                "refresh_type": refresh_info.refresh_type,
+                "plugin_id": refresh_info.plugin_id,
+                "playlist": refresh_info.playlist,
+                "plugin_instance": refresh_info.plugin_instance
+            },
+            "active_playlist": self.playlist_manager.active_playlist,
+            "playlists": playlists
+        }
+
+    def load_runtime_state(self):
+        """Replays the state journal onto the model objects, compacting it if it grew past its size limit."""
+        try:
+            state = self.state_journal.load()
+        except OSError as e:
+            logger.error(f"Failed to read state journal {self.state_file}: {str(e)}")
+            state = {}
+
+        # e.g. the default playlist added on first start, which still needs to be written to device.json
+        playlists_changed = self.playlist_manager.is_dirty()
+        if state.get("refresh_info"):
+            self.refresh_info = RefreshInfo.from_dict(state["refresh_info"])
+        if "active_playlist" in state:
+            self.playlist_manager.active_playlist = state["active_playlist"]
+        for playlist in self.playlist_manager.playlists:
+            playlist_state = state.get("playlists", {}).get(playlist.name, {})
+            if "current_plugin_index" in playlist_state:
+                playlist.current_plugin_index = playlist_state["current_plugin_index"]
+            for plugin in playlist.plugins:
+                plugin_state = playlist_state.get("plugins", {}).get(plugin.plugin_id, {}).get(plugin.name, {})
+                if "latest_refresh_time" in plugin_state:
+                    plugin.latest_refresh_time = plugin_state["latest_refresh_time"]
+
+        # the journal now matches the models
+        self.playlist_manager.clear_dirty()
+        self.refresh_info.clear_dirty()
+        if playlists_changed:
+            self.playlist_manager.mark_dirty()
+        # only rewritten when too long, so constructing a Config doesn't write to the disk
+        if self.state_journal.needs_compaction():
+            self.state_journal.compact(self.get_runtime_state())
 
     def get_playlist_manager(self):
         """Returns the playlist manager."""
@@ -1,14 +1,44 @@
 import os
-from utils.image_utils import resize_image, change_orientation
+import logging
+import hashlib
+import numpy as np
+from utils.image_utils import transform_image, quantize_image, compute_tile_hashes, DITHER_MODES, get_changed_regions, DEFAULT_TILE_SIZE
 from plugins.plugin_registry import get_plugin_instance
 
 # Import mock display for development mode
 from mock_display import MockDisplay
 
+logger = logging.getLogger(__name__)
+
+# largest fraction of the panel that is refreshed partially, above it a full refresh is cheaper
+DEFAULT_PARTIAL_REFRESH_MAX_RATIO = 0.5
+
+# saturation the Inky drivers use when converting images for 7 colour panels
+PANEL_SATURATION = 0.5
+
+ACCENT_COLOURS = {
+    "red": (255, 0, 0),
+    "yellow": (255, 255, 0)
+}
+
+class PanelFrame:
+    """An image together with the panel-ready representation it is displayed as."""
+
+    def __init__(self, image, panel_image):
+        self.image = image
+        self.panel_image = panel_image
+        # palette indices for quantized panels, RGB values otherwise
+        self.pixels = np.asarray(panel_image)
+        self.hash = hashlib.sha256(self.pixels.tobytes()).hexdigest()
+
 class DisplayManager:
     def __init__(self, device_config):
         """Manages the display and rendering of images."""
         self.device_config = device_config
+        # tile hashes of the last frame sent to the panel, used to find the regions that changed
+        self.last_tile_hashes = None
+        # last frame sent to the panel, compared in the panel's palette to skip visually identical refreshes
+        self.last_frame = None
         
         # Check if we should use the mock display
         use_mock = os.environ.get('INKYPI_MOCK_DISPLAY', 'false').lower() == 'true'
@@ -40,17 +70,106 @@ class DisplayManager:
             device_config.update_value("resolution",[int(self.inky_display.width), int(self.inky_display.height)], write=True)
 
     def display_image(self, image, image_settings=[]):
-        """Displays the image provided, applying the image_settings."""
+        """Displays the image provided, applying the image_settings.
+
+        Returns False if the panel already shows the same frame and the refresh was skipped.
+        """
+        return self.display_frame(self.prepare_frame(image, image_settings))
+
+    def prepare_frame(self, image, image_settings=[]):
+        """Resizes, orients and quantizes the image into the frame the panel would show."""
         if not image:
             raise ValueError(f"No image provided.")
 
+        # Resize and adjust orientation in a single pass
+        panel_image = transform_image(image, self.device_config.get_resolution(), image_settings, self.device_config.get_config("orientation"))
+
+        palette = self.get_palette()
+        if palette:
+            panel_image = quantize_image(panel_image, palette, self.get_dither_mode(image_settings))
+        elif panel_image.mode != "RGB":
+            panel_image = panel_image.convert("RGB")
+        return PanelFrame(image, panel_image)
+
+    def display_frame(self, frame):
+        """Sends a prepared frame to the display, skipping it if it matches the displayed frame within tolerance."""
+        if self.is_displayed(frame):
+            logger.info("Frame matches the displayed one, skipping display refresh.")
+            return False
+
         # Save the image
-        image.save(self.device_config.current_image_file)
+        frame.image.save(self.device_config.current_image_file)
+
+        tile_size = self.device_config.get_config("display_tile_size", default=DEFAULT_TILE_SIZE)
+        tile_hashes = compute_tile_hashes(frame.panel_image, tile_size)
+        regions = get_changed_regions(self.last_tile_hashes, tile_hashes, frame.panel_image.size, tile_size)
+
+        # Display the image on the Inky display, "P" mode frames are used by the driver as is
+        self.inky_display.set_image(frame.panel_image)
+        if regions and self.supports_partial_refresh() and self.should_refresh_partially(regions, frame.panel_image.size):
+            logger.info(f"Partially refreshing display | regions: {regions}")
+            self.inky_display.show_partial(regions)
+        else:
+            self.inky_display.show()
+        self.last_tile_hashes = tile_hashes
+        self.last_frame = frame
+        return True
+
+    def is_displayed(self, frame):
+        """Returns True if the frame differs from the displayed frame by no more than display_change_tolerance.
+
+        The tolerance is the fraction of panel pixels allowed to differ, 0 only skips identical frames.
+        """
+        if self.last_frame is None or self.last_frame.pixels.shape != frame.pixels.shape:
+            return False
+        if self.last_frame.hash == frame.hash:
+            return True
+
+        tolerance = self.device_config.get_config("display_change_tolerance", default=0)
+        if not tolerance:
+            return False
+        changed = self.last_frame.pixels != frame.pixels
+        if changed.ndim == 3:
+            changed = changed.any(axis=2)
+        changed_pixels = int(np.count_nonzero(changed))
+        if changed_pixels <= tolerance * changed.size:
+            logger.info(f"Only {changed_pixels} pixels changed, within display_change_tolerance {tolerance}")
+            return True
+        return False
+
+    def get_dither_mode(self, image_settings=[]):
+        """Returns the dither mode from a "dither-X" image setting, or the device's dither_mode."""
+        for setting in image_settings:
+            if setting.startswith("dither-"):
+                mode = setting.split("-", 1)[1]
+                if mode in DITHER_MODES:
+                    return mode
+                logger.warning(f"Ignoring unsupported image setting {setting}")
+        return self.device_config.get_config("dither_mode", default="diffusion")
+
+    def get_palette(self):
+        """Returns the (r, g, b) colours of the panel in index order, or None if the panel shows RGB directly."""
+        display = self.inky_display
+        if hasattr(display, "_palette_blend"):
+            # 7 colour panels (e.g. Inky Impression) blend the saturated and desaturated palettes
+            blend = display._palette_blend(PANEL_SATURATION)
+            return [tuple(blend[i:i + 3]) for i in range(0, len(blend), 3)]
+        colour = getattr(display, "colour", None)
+        if isinstance(display, MockDisplay) or colour is None:
+            return None
+        # Inky pHAT and wHAT index order is white, black, then the accent colour
+        palette = [(255, 255, 255), (0, 0, 0)]
+        if colour in ACCENT_COLOURS:
+            palette.append(ACCENT_COLOURS[colour])
+        return palette
 
-        # Resize and adjust orientation
-        image = change_orientation(image, self.device_config.get_config("orientation"))
-        image = resize_image(image, self.device_config.get_resolution(), image_settings)
+    def supports_partial_refresh(self):
+        """Returns True if the display driver can refresh regions of the panel."""
+        return callable(getattr(self.inky_display, "show_partial", None))
 
-        # Display the image on the Inky display
-        self.inky_display.set_image(image)
-        self.inky_display.show()
+    def should_refresh_partially(self, regions, size):
+        """Returns True if the changed regions are small enough for a partial refresh to pay off."""
+        width, height = size
+        changed_area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions)
+        max_ratio = self.device_config.get_config("partial_refresh_max_ratio", default=DEFAULT_PARTIAL_REFRESH_MAX_RATIO)
+        return changed_area <= max_ratio * width * height
@@ -16,6 +16,10 @@ import json
 import logging
 import threading
 from utils.app_utils import generate_startup_image
+from utils import image_store
+from utils.http_client import init_http_client
+from utils.browser_renderer import init_render_pool, get_render_pool
+from plugin_executor import init_plugin_executor, get_plugin_executor
 from flask import Flask, request
 from werkzeug.serving import is_running_from_reloader
 from config import Config
@@ -61,7 +65,12 @@ if __name__ == '__main__':
 
     # start the background refresh task
     if not is_running_from_reloader():
+        init_http_client(device_config)
+        init_render_pool(device_config)
+        init_plugin_executor(device_config)
         refresh_task.start()
+        # remove uploads left unreferenced while the app wasn't running
+        image_store.collect_garbage(device_config)
 
     # display default inkypi image on startup
     if device_config.get_config("startup") is True:
@@ -75,4 +84,9 @@ if __name__ == '__main__':
         app.secret_key = str(random.randint(100000,999999))
         app.run(host="0.0.0.0", port=int(os.getenv("PORT", 80)))
     finally:
-        refresh_task.stop()
\ No newline at end of file
+        refresh_task.stop()
+        device_config.flush_config()
+        get_plugin_executor().shutdown()
+        render_pool = get_render_pool()
+        if render_pool:
+            render_pool.shutdown()
\ No newline at end of file
@@ -1,5 +1,5 @@
 import logging
-from PIL import Image
+from PIL import Image, ImageDraw
 
 logger = logging.getLogger(__name__)
 
@@ -89,13 +89,38 @@ class MockDisplay:
             # Fall back to PIL's show method
             self.image.show()
     
-    def _update_tkinter_image(self):
+    def show_partial(self, regions):
+        """Refresh only the given (left, top, right, bottom) regions of the mock display.
+
+        The full image is saved as usual, and the refreshed regions are outlined in current_display_regions.png.
+        """
+        if self.image is None:
+            logger.warning("No image to display")
+            return
+
+        if self.image.width != self.width or self.image.height != self.height:
+            self.image = self.image.resize((self.width, self.height))
+
+        logger.info(f"Partial refresh of {len(regions)} region(s): {regions}")
+        self.image.save('current_display.png')
+
+        overlay = self.image.convert("RGB")
+        draw = ImageDraw.Draw(overlay)
+        for left, top, right, bottom in regions:
+            draw.rectangle((left, top, right - 1, bottom - 1), outline=(255, 0, 0), width=2)
+        overlay.save('current_display_regions.png')
+        logger.info("Saved refreshed regions to current_display_regions.png")
+
+        if HAS_TKINTER and self.root is not None:
+            self._update_tkinter_image(overlay)
+
+    def _update_tkinter_image(self, image=None):
         """Update the image in the UI thread."""
         if not HAS_TKINTER or self.root is None:
             return
             
         # Convert image for Tkinter
-        self.tk_image = ImageTk.PhotoImage(self.image)
+        self.tk_image = ImageTk.PhotoImage(image or self.image)
         
         # Update the image in the UI thread
         if self.panel is not None:
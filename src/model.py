@@ -5,7 +5,30 @@ from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-class RefreshInfo:
+_MISSING = object()
+
+class ChangeTracked:
+    """Mixin that flags an object as dirty whenever one of its public attributes is assigned a different value.
+
+    In place mutations of lists and dicts are not detected, methods that mutate them call `mark_dirty()`.
+    Subclasses holding other tracked objects override `is_dirty()` and `clear_dirty()` to include them.
+    """
+
+    def __setattr__(self, name, value):
+        if not name.startswith("_") and self.__dict__.get(name, _MISSING) != value:
+            self.__dict__["_dirty"] = True
+        super().__setattr__(name, value)
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    def is_dirty(self):
+        return self.__dict__.get("_dirty", False)
+
+    def clear_dirty(self):
+        self._dirty = False
+
+class RefreshInfo(ChangeTracked):
     """Keeps track of refresh metadata.
 
     Attributes:
@@ -57,7 +80,7 @@ class RefreshInfo:
             plugin_instance=data.get("plugin_instance")
         )
 
-class PlaylistManager:
+class PlaylistManager(ChangeTracked):
     """A class managing multiple time-based playlists.
 
     Attributes:
@@ -78,6 +101,7 @@ class PlaylistManager:
 
     def add_default_playlist(self):
         """Add a default playlist to the manager, called when no playlists exist."""
+        self.mark_dirty()
         return self.playlists.append(
             Playlist("Default", PlaylistManager.DEFAULT_PLAYLIST_START, PlaylistManager.DEFAULT_PLAYLIST_END, []))
 
@@ -126,6 +150,7 @@ class PlaylistManager:
         if not end_time:
             end_time = PlaylistManager.DEFAULT_PLAYLIST_END
         self.playlists.append(Playlist(name, start_time, end_time))
+        self.mark_dirty()
         return True
 
     def update_playlist(self, old_name, new_name, start_time, end_time):
@@ -143,11 +168,22 @@ class PlaylistManager:
         """Deletes the playlist with the specified name."""
         self.playlists = [p for p in self.playlists if p.name != name]
 
-    def to_dict(self):
-        return {
-            "playlists": [p.to_dict() for p in self.playlists],
-            "active_playlist": self.active_playlist
+    def is_dirty(self):
+        return super().is_dirty() or any(p.is_dirty() for p in self.playlists)
+
+    def clear_dirty(self):
+        super().clear_dirty()
+        for playlist in self.playlists:
+            playlist.clear_dirty()
+
+    def to_dict(self, include_runtime_state=True):
+        """Returns the playlists as a dictionary, without the scheduler bookkeeping if include_runtime_state is False."""
+        playlist_dict = {
+            "playlists": [p.to_dict(include_runtime_state) for p in self.playlists]
         }
+        if include_runtime_state:
+            playlist_dict["active_playlist"] = self.active_playlist
+        return playlist_dict
 
     @classmethod
     def from_dict(cls, data):
@@ -164,7 +200,7 @@ class PlaylistManager:
 
         return (current_time - latest_refresh) >= timedelta(seconds=interval_seconds)
 
-class Playlist:
+class Playlist(ChangeTracked):
     """Represents a playlist with a time interval.
 
     Attributes:
@@ -192,6 +228,7 @@ class Playlist:
             logger.warning(f"Plugin '{plugin_data['plugin_id']}' with instance '{plugin_data['name']}' already exists.")
             return False
         self.plugins.append(PluginInstance.from_dict(plugin_data))
+        self.mark_dirty()
         return True
 
     def update_plugin(self, plugin_id, instance_name, updated_data):
@@ -226,6 +263,22 @@ class Playlist:
         
         return self.plugins[self.current_plugin_index]
 
+    def peek_next_plugin(self):
+        """Returns the plugin instance that get_next_plugin will return, without updating the current_plugin_index."""
+        if not self.plugins:
+            return None
+        if self.current_plugin_index is None:
+            return self.plugins[0]
+        return self.plugins[(self.current_plugin_index + 1) % len(self.plugins)]
+
+    def is_dirty(self):
+        return super().is_dirty() or any(p.is_dirty() for p in self.plugins)
+
+    def clear_dirty(self):
+        super().clear_dirty()
+        for plugin in self.plugins:
+            plugin.clear_dirty()
+
     def get_priority(self):
         """Determine priority of a playlist, based on the time range"""
         return self.get_time_range_minutes()
@@ -242,14 +295,16 @@ class Playlist:
 
         return int((end - start).total_seconds() // 60)
 
-    def to_dict(self):
-        return {
+    def to_dict(self, include_runtime_state=True):
+        playlist_dict = {
             "name": self.name,
             "start_time": self.start_time,
             "end_time": self.end_time,
-            "plugins": [p.to_dict() for p in self.plugins],
-            "current_plugin_index": self.current_plugin_index
+            "plugins": [p.to_dict(include_runtime_state) for p in self.plugins]
         }
+        if include_runtime_state:
+            playlist_dict["current_plugin_index"] = self.current_plugin_index
+        return playlist_dict
 
     @classmethod
     def from_dict(cls, data):
@@ -261,7 +316,7 @@ class Playlist:
             current_plugin_index=data.get("current_plugin_index", None)
         )
 
-class PluginInstance:
+class PluginInstance(ChangeTracked):
     """Represents an individual plugin instance within a playlist.
 
     Attributes:
@@ -319,6 +374,34 @@ class PluginInstance:
 
         return False
 
+    def get_next_refresh_dt(self, current_time):
+        """Returns the earliest time this instance's refresh settings make it due, or None if it has none."""
+        latest_refresh_dt = self.get_latest_refresh_dt()
+        if not latest_refresh_dt:
+            return current_time
+
+        candidates = []
+        interval = self.refresh.get("interval")
+        if interval:
+            candidates.append(latest_refresh_dt + timedelta(seconds=interval))
+
+        scheduled_time_str = self.refresh.get("scheduled")
+        if scheduled_time_str:
+            scheduled_time = datetime.strptime(scheduled_time_str, "%H:%M").time()
+            latest_refresh_local = latest_refresh_dt.astimezone(current_time.tzinfo)
+            # first occurrence of the scheduled time after the latest refresh
+            scheduled_date = latest_refresh_local.date()
+            if scheduled_time <= latest_refresh_local.time().replace(tzinfo=None):
+                scheduled_date += timedelta(days=1)
+            scheduled_dt = datetime.combine(scheduled_date, scheduled_time)
+            if hasattr(current_time.tzinfo, "localize"):
+                scheduled_dt = current_time.tzinfo.localize(scheduled_dt)
+            else:
+                scheduled_dt = scheduled_dt.replace(tzinfo=current_time.tzinfo)
+            candidates.append(scheduled_dt)
+
+        return min(candidates) if candidates else None
+
     def get_image_path(self):
         """Formats the image path for this plugin instance."""
         return f"{self.plugin_id}_{self.name.replace(' ', '_')}.png"
@@ -330,14 +413,16 @@ class PluginInstance:
             latest_refresh = datetime.fromisoformat(self.latest_refresh_time)
         return latest_refresh
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_runtime_state=True):
+        plugin_dict = {
             "plugin_id": self.plugin_id,
             "name": self.name,
             "plugin_settings": self.settings,
             "refresh": self.refresh,
-            "latest_refresh_time": self.latest_refresh_time,
         }
+        if include_runtime_state:
+            plugin_dict["latest_refresh_time"] = self.latest_refresh_time
+        return plugin_dict
 
     @classmethod
     def from_dict(cls, data):
@@ -0,0 +1,315 @@
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import queue
+from io import BytesIO
+from multiprocessing.connection import Connection
+from PIL import Image
+from dotenv import load_dotenv
+from model import PlaylistManager
+from plugins.plugin_registry import get_plugin_instance
+from utils.app_utils import get_process_rss_mb
+from utils.http_client import init_http_client
+from utils.progress_utils import report_stage, stage_callback
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_INLINE = "inline"
+EXECUTOR_PROCESS = "process"
+
+DEFAULT_TIMEOUT = 120
+DEFAULT_MAX_RSS_MB = 300
+DEFAULT_NICE = 10
+
+# how often a running job is checked against its timeout and memory limit
+POLL_INTERVAL_SECONDS = 1
+
+_plugin_executor = None
+
+def init_plugin_executor(device_config):
+    """Creates the process-wide plugin executor selected by the `plugin_executor` config key."""
+    global _plugin_executor
+
+    mode = device_config.get_config("plugin_executor", default=EXECUTOR_INLINE)
+    if mode == EXECUTOR_PROCESS:
+        pool_size = int(device_config.get_config("plugin_pool_size", default=os.cpu_count() or 1))
+        logger.info(f"Running plugins in worker processes. | pool_size: {pool_size}")
+        _plugin_executor = ProcessExecutor(device_config, pool_size)
+    else:
+        _plugin_executor = InlineExecutor()
+    return _plugin_executor
+
+def get_plugin_executor():
+    """Returns the process-wide plugin executor, running plugins inline if it has not been initialized."""
+    global _plugin_executor
+    if _plugin_executor is None:
+        _plugin_executor = InlineExecutor()
+    return _plugin_executor
+
+def generate_plugin_image(plugin, settings, device_config):
+    """Generates the plugin image with the configured executor.
+
+    Plugins may update their settings while rendering (e.g. the current image index), so `settings`
+    is updated in place with the values the plugin left behind regardless of where it ran.
+    """
+    return get_plugin_executor().generate_image(plugin, settings, device_config)
+
+class PluginRenderError(RuntimeError):
+    """Raised in the parent process when a plugin failed inside a worker, carrying the plugin's error message."""
+
+class InlineExecutor:
+    """Runs plugins directly in the calling thread."""
+
+    def generate_image(self, plugin, settings, device_config):
+        return plugin.generate_image(settings, device_config)
+
+    def shutdown(self):
+        pass
+
+class ProcessExecutor:
+    """Runs plugins in a pool of worker processes.
+
+    Each job is bounded by a wall-clock timeout and a memory ceiling, both configurable per plugin in
+    plugins.json (`timeout_seconds`, `max_rss_mb`, `nice`) with device wide defaults (`plugin_timeout_seconds`,
+    `plugin_max_rss_mb`, `plugin_nice`). A worker that exceeds a limit or dies is killed and replaced.
+    Workers are started on demand, up to `pool_size`.
+    """
+
+    def __init__(self, device_config, pool_size):
+        self.device_config = device_config
+        self.pool_size = max(1, pool_size)
+
+        self._idle_workers = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def generate_image(self, plugin, settings, device_config):
+        plugin_config = plugin.config
+        plugin_id = plugin_config.get("id")
+        timeout = plugin_config.get("timeout_seconds", device_config.get_config("plugin_timeout_seconds", default=DEFAULT_TIMEOUT))
+        max_rss_mb = plugin_config.get("max_rss_mb", device_config.get_config("plugin_max_rss_mb", default=DEFAULT_MAX_RSS_MB))
+        nice = plugin_config.get("nice", device_config.get_config("plugin_nice", default=DEFAULT_NICE))
+
+        worker = self._acquire_worker(timeout)
+        try:
+            job = {
+                "plugin_id": plugin_id,
+                "settings": settings,
+                "config": device_config.get_config(),
+                "nice": nice
+            }
+            data, updated_settings = worker.run(job, timeout, max_rss_mb)
+        except PluginRenderError:
+            # the plugin raised an error, the worker itself is fine
+            raise
+        except Exception:
+            # the worker may be in any state after a failure, start over with a fresh process
+            worker.kill()
+            raise
+        finally:
+            self._idle_workers.put(worker)
+
+        settings.clear()
+        settings.update(updated_settings)
+        image = Image.open(BytesIO(data))
+        image.load()
+        return image
+
+    def shutdown(self):
+        """Stops all worker processes."""
+        with self._lock:
+            for worker in self._workers:
+                worker.kill()
+
+    def _acquire_worker(self, timeout):
+        try:
+            return self._idle_workers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._workers) < self.pool_size:
+                worker = PluginWorker(self.device_config.get_plugins())
+                self._workers.append(worker)
+                return worker
+
+        try:
+            return self._idle_workers.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError("Timed out waiting for an idle plugin worker")
+
+class PluginWorker:
+    """A worker process that loads all plugins and renders jobs sent over a pipe."""
+
+    def __init__(self, plugins_list):
+        self.plugins_list = plugins_list
+        self.process = None
+        self.conn_out = None
+        self.conn_in = None
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Launches the worker process and sends it the plugin list."""
+        self.kill()
+
+        child_read, parent_write = os.pipe()
+        parent_read, child_write = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), str(child_read), str(child_write)],
+                pass_fds=(child_read, child_write), stdin=subprocess.DEVNULL,
+                # own process group, so kill() also takes down browsers the plugin launched
+                start_new_session=True
+            )
+        except Exception:
+            os.close(parent_read)
+            os.close(parent_write)
+            raise
+        finally:
+            os.close(child_read)
+            os.close(child_write)
+
+        self.conn_out = Connection(parent_write, readable=False)
+        self.conn_in = Connection(parent_read, writable=False)
+        self.conn_out.send(self.plugins_list)
+        logger.info(f"Started plugin worker. | pid: {self.process.pid}")
+
+    def run(self, job, timeout, max_rss_mb):
+        """Sends a job to the worker and waits for the result, enforcing the timeout and memory limit."""
+        if not self.is_running():
+            self.start()
+
+        plugin_id = job["plugin_id"]
+        self.conn_out.send(job)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.conn_in.poll(POLL_INTERVAL_SECONDS):
+                try:
+                    status, result = self.conn_in.recv()
+                except EOFError:
+                    raise RuntimeError(f"Plugin worker exited while rendering '{plugin_id}'")
+                if status != "stage":
+                    break
+                # forward progress from the worker to whoever is listening in this thread
+                report_stage(result)
+                continue
+
+            if not self.is_running():
+                raise RuntimeError(f"Plugin worker exited while rendering '{plugin_id}'")
+            if time.monotonic() > deadline:
+                logger.error(f"Plugin '{plugin_id}' timed out after {timeout} seconds, killing worker {self.process.pid}")
+                raise RuntimeError(f"Plugin '{plugin_id}' timed out after {timeout} seconds")
+            rss_mb = get_process_rss_mb(self.process.pid) if max_rss_mb else None
+            if rss_mb is not None and rss_mb > max_rss_mb:
+                logger.error(f"Plugin '{plugin_id}' using {rss_mb:.0f}MB, limit is {max_rss_mb}MB, killing worker {self.process.pid}")
+                raise RuntimeError(f"Plugin '{plugin_id}' exceeded its memory limit")
+
+        if status == "error":
+            raise PluginRenderError(result)
+        return result
+
+    def kill(self):
+        """Kills the worker process and closes its pipes."""
+        if self.process is not None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.process.wait()
+            self.process = None
+        for conn in (self.conn_out, self.conn_in):
+            if conn is not None:
+                conn.close()
+        self.conn_out = self.conn_in = None
+
+class ConfigSnapshot:
+    """Read only copy of the device config handed to plugins running in a worker process.
+
+    Exposes the getters plugins use, without the files, journal and write scheduling of Config.
+    """
+
+    def __init__(self, config, plugins_list):
+        self.config = config
+        self.plugins_list = plugins_list
+
+    def get_config(self, key=None, default={}):
+        if key is not None:
+            return self.config.get(key, default)
+        return self.config
+
+    def get_plugins(self):
+        return self.plugins_list
+
+    def get_plugin(self, plugin_id):
+        return next((plugin for plugin in self.plugins_list if plugin['id'] == plugin_id), None)
+
+    def get_resolution(self):
+        width, height = self.get_config("resolution")
+        return (int(width), int(height))
+
+    def get_playlist_manager(self):
+        return PlaylistManager.from_dict(self.get_config("playlist_config"))
+
+    def load_env_key(self, key):
+        load_dotenv(override=True)
+        return os.getenv(key)
+
+    def write_config(self):
+        raise RuntimeError("Device config is read only in plugin workers")
+
+def _set_nice(nice):
+    try:
+        os.setpriority(os.PRIO_PROCESS, 0, nice)
+    except (OSError, AttributeError) as e:
+        logger.warning(f"Unable to set nice level {nice}: {str(e)}")
+
+def _worker_main(read_fd, write_fd):
+    """Entry point of a worker process: loads the plugins, then renders jobs until the pipe closes."""
+    from plugins.plugin_registry import load_plugins
+
+    conn_in = Connection(read_fd, writable=False)
+    conn_out = Connection(write_fd, readable=False)
+
+    plugins_list = conn_in.recv()
+    load_plugins(plugins_list)
+    http_configured = False
+
+    while True:
+        try:
+            job = conn_in.recv()
+        except EOFError:
+            break
+
+        try:
+            _set_nice(job["nice"])
+            device_config = ConfigSnapshot(job["config"], plugins_list)
+            if not http_configured:
+                init_http_client(device_config)
+                http_configured = True
+            plugin_config = device_config.get_plugin(job["plugin_id"])
+            plugin = get_plugin_instance(plugin_config)
+
+            settings = job["settings"]
+            with stage_callback(lambda stage: conn_out.send(("stage", stage))):
+                image = plugin.generate_image(settings, device_config)
+            if image.mode not in ("1", "L", "RGB", "RGBA"):
+                image = image.convert("RGB")
+            # a fast PNG keeps the pipe transfer well below the size of the raw frame
+            buffer = BytesIO()
+            image.save(buffer, format="PNG", compress_level=1)
+            conn_out.send(("ok", (buffer.getvalue(), settings)))
+        except Exception as e:
+            logger.exception(f"Failed to render plugin '{job.get('plugin_id')}'")
+            conn_out.send(("error", str(e)))
+
+if __name__ == "__main__":
+    import logging.config
+    logging.config.fileConfig(os.path.join(os.path.dirname(__file__), "config", "logging.conf"))
+    _worker_main(int(sys.argv[1]), int(sys.argv[2]))
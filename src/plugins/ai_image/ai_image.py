@@ -1,8 +1,7 @@
 from plugins.base_plugin.base_plugin import BasePlugin
-from openai import OpenAI
-from PIL import Image
+from utils.image_utils import open_image
+from utils import http_client
 from io import BytesIO
-import requests
 import logging
 
 logger = logging.getLogger(__name__)
@@ -38,9 +37,13 @@ class AIImage(BasePlugin):
             image_quality = DEFAULT_IMAGE_QUALITY
         randomize_prompt = settings.get('randomizePrompt') == 'true'
 
+        dimensions = device_config.get_resolution()
+        if device_config.get_config("orientation") == "vertical":
+            dimensions = dimensions[::-1]
+
         image = None
         try:
-            ai_client = OpenAI(api_key = api_key)
+            ai_client = http_client.get_openai_client(api_key)
             if randomize_prompt:
                 text_prompt = AIImage.fetch_image_prompt(ai_client, text_prompt)
 
@@ -49,7 +52,8 @@ class AIImage(BasePlugin):
                 text_prompt,
                 model=image_model,
                 quality=image_quality,
-                orientation=device_config.get_config("orientation")
+                orientation=device_config.get_config("orientation"),
+                target_size=dimensions
             )
         except Exception as e:
             logger.error(f"Failed to make Open AI request: {str(e)}")
@@ -57,7 +61,7 @@ class AIImage(BasePlugin):
         return image
 
     @staticmethod
-    def fetch_image(ai_client, prompt, model="dalle-e-3", quality="standard", orientation="horizontal"):
+    def fetch_image(ai_client, prompt, model="dalle-e-3", quality="standard", orientation="horizontal", target_size=None):
         logger.info(f"Generating image for prompt: {prompt}, model: {model}, quality: {quality}")
         prompt += (
             ". The image should fully occupy the entire canvas without any frames, "
@@ -80,8 +84,9 @@ class AIImage(BasePlugin):
 
         response = ai_client.images.generate(**args)
         image_url = response.data[0].url
-        response = requests.get(image_url)
-        img = Image.open(BytesIO(response.content))
+        # generated images have unique urls, there is nothing to cache
+        response = http_client.get(image_url, cache=False)
+        img = open_image(BytesIO(response.content), target_size)
 
         return img
 
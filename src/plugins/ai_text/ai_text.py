@@ -1,6 +1,6 @@
 from plugins.base_plugin.base_plugin import BasePlugin
 from utils.app_utils import resolve_path
-from openai import OpenAI
+from utils import http_client, text_utils
 from PIL import Image, ImageDraw, ImageFont
 from utils.image_utils import resize_image
 from io import BytesIO
@@ -12,6 +12,12 @@ import os
 
 logger = logging.getLogger(__name__)
 
+# "native" lays the text out with PIL, "html" renders ai_text.html in the browser
+DEFAULT_RENDER_BACKEND = "html"
+
+# short responses may be drawn up to this much larger than the css font size, to fill the display
+CONTENT_MAX_SCALE = 1.5
+
 class AIText(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
@@ -39,7 +45,7 @@ class AIText(BasePlugin):
             raise RuntimeError("Text Prompt is required.")
 
         try:
-            ai_client = OpenAI(api_key = api_key)
+            ai_client = http_client.get_openai_client(api_key)
             prompt_response = AIText.fetch_text_prompt(ai_client, text_model, text_prompt)
         except Exception as e:
             logger.error(f"Failed to make Open AI request: {str(e)}")
@@ -49,14 +55,45 @@ class AIText(BasePlugin):
         if device_config.get_config("orientation") == "vertical":
             dimensions = dimensions[::-1]
 
-        image_template_params = {
-            "title": title,
-            "content": prompt_response,
-            "plugin_settings": settings
-        }
-        
-        image = self.render_image(dimensions, "ai_text.html", "ai_text.css", image_template_params)
+        if settings.get('renderBackend', DEFAULT_RENDER_BACKEND) != "native":
+            image_template_params = {
+                "title": title,
+                "content": prompt_response,
+                "plugin_settings": settings
+            }
+            return self.render_image(dimensions, "ai_text.html", "ai_text.css", image_template_params)
+
+        return AIText.render_text(dimensions, title, prompt_response, settings)
+
+    @staticmethod
+    def render_text(dimensions, title, content, settings):
+        """Lays out the title and text with PIL, mirroring ai_text.html without a browser."""
+        image, box, text_color = text_utils.create_styled_canvas(dimensions, settings)
+        draw = ImageDraw.Draw(image)
+        left, top, right, bottom = box
+        box_width, box_height = right - left, bottom - top
+        width, height = dimensions
+
+        # title and text sizes are capped like ai_text.css: min(10cqh, 8cqi) and min(6cqh, 5cqi)
+        title_height = 0
+        gap = height * 0.01
+        if title:
+            title_font, title_lines = text_utils.fit_text(
+                title, (box_width, box_height * 0.3), font_weight="bold",
+                max_size=min(box_height * 0.1, box_width * 0.08))
+            title_height = text_utils.measure_lines(title_lines, title_font)[1]
+
+        content_font, content_lines = text_utils.fit_text(
+            content, (box_width, min(box_height * 0.8, box_height - title_height - gap)),
+            max_size=min(box_height * 0.06, box_width * 0.05) * CONTENT_MAX_SCALE)
+        content_height = text_utils.measure_lines(content_lines, content_font)[1]
 
+        # the block is centered vertically, as in the flex column of the template
+        y = top + (box_height - title_height - (gap if title else 0) - content_height) / 2
+        if title:
+            text_utils.draw_lines(draw, title_lines, title_font, (left, y, right, y + title_height), text_color)
+            y += title_height + gap
+        text_utils.draw_lines(draw, content_lines, content_font, (left, y, right, y + content_height), text_color)
         return image
     
     @staticmethod
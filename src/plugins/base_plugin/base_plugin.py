@@ -2,6 +2,8 @@ import logging
 import os
 from utils.app_utils import resolve_path, get_fonts
 from utils.image_utils import take_screenshot_html
+from utils import http_client
+from utils.progress_utils import report_stage
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pathlib import Path
 import asyncio
@@ -39,6 +41,15 @@ class BasePlugin:
     def generate_image(self, settings, device_config):
         raise NotImplementedError("generate_image must be implemented by subclasses")
 
+    def on_settings_saved(self, settings, device_config):
+        """Called after the settings of a plugin instance are saved, e.g. to prepare assets in the background."""
+        pass
+
+    def http_get(self, url, **kwargs):
+        """Sends a GET request through the shared HTTP client (pooled connections, timeouts, retries and the
+        response cache). Accepts the arguments of utils.http_client.get."""
+        return http_client.get(url, **kwargs)
+
     def get_plugin_id(self):
         return self.config.get("id")
 
@@ -75,6 +86,8 @@ class BasePlugin:
         Returns:
             PIL Image object
         """
+        report_stage("rendering")
+
         # For direct rendering without HTML templating
         if direct_render:
             return self.render_direct(dimensions, template_params)
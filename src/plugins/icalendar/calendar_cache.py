@@ -0,0 +1,203 @@
+import hashlib
+import itertools
+import logging
+import threading
+from datetime import datetime, time, timedelta
+from icalendar import Calendar
+import recurring_ical_events
+from plugins.icalendar import ics_stream
+
+logger = logging.getLogger(__name__)
+
+# number of calendar feeds kept parsed in memory
+MAX_CALENDARS = 8
+
+# feeds at least this large are read in streaming mode, keeping only the events near the window
+STREAM_THRESHOLD_BYTES = 512 * 1024
+
+# days past the window kept by a streaming parse, so the next days' refreshes don't parse the feed again
+STREAM_LOOKAHEAD = timedelta(days=7)
+
+_calendar_cache = None
+_calendar_cache_lock = threading.Lock()
+
+def get_calendar_cache():
+    """Returns the calendar cache shared by all iCalendar instances in this process."""
+    global _calendar_cache
+    with _calendar_cache_lock:
+        if _calendar_cache is None:
+            _calendar_cache = CalendarCache(MAX_CALENDARS)
+        return _calendar_cache
+
+def get_sort_key(event, tz):
+    """Returns a key ordering events by start, with all-day events (dates) first on their day."""
+    start = event['start']
+    if isinstance(start, datetime):
+        return start
+    return tz.localize(datetime.combine(start, time.min))
+
+class CachedCalendar:
+    """A parsed calendar and the occurrences already expanded from it, for the window [start, end).
+
+    A calendar parsed in streaming mode only holds the events of [parsed_start, parsed_end).
+    """
+
+    def __init__(self, content_hash, calendar, tz, parsed_start=None, parsed_end=None):
+        self.content_hash = content_hash
+        self.calendar = calendar
+        self.tz = tz
+        self.parsed_start = parsed_start
+        self.parsed_end = parsed_end
+        # held while expanding, the occurrences are updated in place
+        self.lock = threading.Lock()
+        self.start = None
+        self.end = None
+        # occurrences keyed by _get_key, so occurrences found by overlapping expansions are kept once
+        self.events = {}
+
+    def covers(self, start, end):
+        """Returns whether the parsed events include every event of [start, end)."""
+        if self.parsed_start is None:
+            return True
+        return self.parsed_start <= start and end <= self.parsed_end
+
+    def get_events(self, start, end):
+        """Returns the occurrences overlapping [start, end), expanding only the days not covered yet."""
+        if self.start is None or end <= self.start or start >= self.end:
+            # no overlap with the cached window, start over
+            self.events = {}
+            self._expand(start, end)
+        else:
+            if start < self.start:
+                self._expand(start, self.start)
+            if end > self.end:
+                self._expand(self.end, end)
+            # forget the occurrences that moved out of the window
+            self.events = {key: event for key, event in self.events.items()
+                           if self._overlaps(event, start, end)}
+        self.start, self.end = start, end
+
+        event_list = list(self.events.values())
+        event_list.sort(key=lambda event: get_sort_key(event, self.tz))
+        return event_list
+
+    def _expand(self, start, end):
+        logger.debug(f"Expanding recurrences between {start} and {end}")
+        for component in recurring_ical_events.of(self.calendar).between(start, end):
+            event = self._to_event(component)
+            self.events[self._get_key(component, event)] = event
+
+    @staticmethod
+    def _get_key(component, event):
+        """Returns (uid, start), or for events without a UID a key of their start, end and summary, so
+        different events without one starting at the same time aren't merged."""
+        uid = component.get('uid')
+        if uid:
+            return (str(uid), event['start'])
+        return (None, event['start'], event['end'], event['summary'])
+
+    def _to_event(self, component):
+        dtstart = component.get('dtstart').dt
+        dtend = component.get('dtend').dt if component.get('dtend') else dtstart
+
+        # Convert datetime to timezone-aware if it isn't already
+        if isinstance(dtstart, datetime) and dtstart.tzinfo is None:
+            dtstart = self.tz.localize(dtstart)
+        if isinstance(dtend, datetime) and dtend.tzinfo is None:
+            dtend = self.tz.localize(dtend)
+
+        return {
+            'summary': str(component.get('summary', 'No Title')),
+            'location': str(component.get('location', '')),
+            'start': dtstart,
+            'end': dtend,
+            # all-day events start on a date rather than a datetime
+            'all_day': not isinstance(dtstart, datetime)
+        }
+
+    def _overlaps(self, event, start, end):
+        event_start = get_sort_key(event, self.tz)
+        event_end = get_sort_key({'start': event['end']}, self.tz)
+        if not event['all_day'] and event_end == event_start:
+            # zero length events still occupy their start time
+            return start <= event_start < end
+        return event_start < end and event_end > start
+
+class CalendarCache:
+    """Parsed calendars and their expanded occurrences, keyed by URL.
+
+    Downloads go through the shared HTTP client, which revalidates unchanged feeds with conditional requests.
+    A feed is only parsed again when the hash of its content changes, and a refresh whose window overlaps
+    the previous one only expands recurrences for the newly exposed days. The feed is read and hashed one line
+    at a time: small feeds are buffered and parsed whole, larger ones are read in streaming mode, which keeps
+    only the events near the window (see ics_stream).
+    """
+
+    def __init__(self, max_calendars):
+        self.max_calendars = max_calendars
+        self.calendars = {}
+        self.lock = threading.Lock()
+
+    def get_events(self, url, lines, start, end, tz):
+        """Returns the events of an ICS feed that overlap [start, end), sorted by start.
+
+        Args:
+            url: URL of the feed, the cache key
+            lines: Iterable of the raw lines of the feed as bytes, e.g. response.iter_lines()
+        """
+        with self.lock:
+            cached = self.calendars.get(url)
+        # read and parsed without holding the lock, so a slow feed doesn't hold up the others
+        cached = self._read(url, lines, cached, start, end, tz)
+
+        with self.lock:
+            # most recently used last
+            self.calendars.pop(url, None)
+            self.calendars[url] = cached
+            while len(self.calendars) > self.max_calendars:
+                del self.calendars[next(iter(self.calendars))]
+        with cached.lock:
+            return cached.get_events(start, end)
+
+    def _read(self, url, lines, cached, start, end, tz):
+        """Reads the feed, returning the cached calendar if it is unchanged or a newly parsed one."""
+        content_hash = hashlib.sha256()
+        lines = _hash_lines(lines, content_hash)
+
+        head = []
+        size = 0
+        for line in lines:
+            head.append(line)
+            size += len(line) + 2
+            if size >= STREAM_THRESHOLD_BYTES:
+                break
+        else:
+            if self._is_reusable(cached, content_hash.hexdigest(), start, end, tz):
+                return cached
+            logger.debug(f"Parsing calendar {url}")
+            return CachedCalendar(content_hash.hexdigest(), Calendar.from_ical(b"\r\n".join(head)), tz)
+
+        # the rest of the feed isn't buffered, only the lines of the events near the window are kept
+        parsed_end = end + STREAM_LOOKAHEAD
+        kept = ics_stream.filter_window(itertools.chain(head, lines), start, parsed_end)
+        if self._is_reusable(cached, content_hash.hexdigest(), start, end, tz):
+            return cached
+        logger.debug(f"Parsing calendar {url} in streaming mode")
+        calendar = Calendar.from_ical(b"\r\n".join(kept))
+        return CachedCalendar(content_hash.hexdigest(), calendar, tz, start, parsed_end)
+
+    @staticmethod
+    def _is_reusable(cached, content_hash, start, end, tz):
+        return (cached is not None and cached.content_hash == content_hash and str(cached.tz) == str(tz)
+                and cached.covers(start, end))
+
+def _hash_lines(lines, content_hash):
+    """Yields the lines without their line breaks, adding each to content_hash as it goes by."""
+    for line in lines:
+        line = line.rstrip(b"\r\n")
+        # blank lines carry nothing in ICS, and iter_lines yields them where a chunk splits a CRLF
+        if not line:
+            continue
+        content_hash.update(line)
+        content_hash.update(b"\n")
+        yield line
@@ -0,0 +1,64 @@
+from bisect import bisect_left
+from datetime import datetime, date, time, timedelta
+from plugins.icalendar.calendar_cache import get_sort_key
+
+class EventIndex:
+    """Events of one render indexed for the view preparers.
+
+    Built once per render: events are sorted by start for bisect range queries, and bucketed by every local
+    day they cover, with multi-day and all-day spans expanded up front, so per-day and per-hour lookups
+    don't scan the whole event list.
+    """
+
+    def __init__(self, events, tz):
+        self.tz = tz
+        self.events = sorted(events, key=lambda event: get_sort_key(event, tz))
+        self.start_keys = [get_sort_key(event, tz) for event in self.events]
+        self.days = {}
+        for event in self.events:
+            day = self.get_start_date(event)
+            last_day = self.get_end_date(event)
+            while day <= last_day:
+                self.days.setdefault(day, []).append(event)
+                day += timedelta(days=1)
+
+    def get_start_date(self, event):
+        """Returns the local date an event starts on."""
+        start = event['start']
+        if isinstance(start, datetime):
+            return start.astimezone(self.tz).date()
+        return start
+
+    def get_end_date(self, event):
+        """Returns the last local date an event covers, its end being exclusive."""
+        start_date = self.get_start_date(event)
+        end = event['end']
+        if isinstance(end, datetime):
+            end = end.astimezone(self.tz)
+            # an event ending at midnight doesn't cover the next day
+            end_date = end.date() - timedelta(days=1) if end.time() == time.min else end.date()
+        elif isinstance(end, date):
+            # all-day events end on the day after their last day
+            end_date = end - timedelta(days=1)
+        else:
+            end_date = start_date
+        return max(start_date, end_date)
+
+    def on_date(self, day):
+        """Returns the events covering a date, sorted by start."""
+        return self.days.get(day, [])
+
+    def has_events_on(self, day):
+        return day in self.days
+
+    def starting_between(self, start, end):
+        """Returns the events starting in [start, end), sorted by start."""
+        return self.events[bisect_left(self.start_keys, start):bisect_left(self.start_keys, end)]
+
+    def get_start_hour(self, event, day):
+        """Returns the hour an event starts at on a date, 0 if it started on an earlier day or is all-day."""
+        start = event['start']
+        if not isinstance(start, datetime):
+            return 0
+        start = start.astimezone(self.tz)
+        return start.hour if start.date() == day else 0
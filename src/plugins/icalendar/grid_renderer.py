@@ -0,0 +1,109 @@
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from PIL import ImageDraw
+
+logger = logging.getLogger(__name__)
+
+# rendered day cells kept in memory, a month grid has at most 42
+MAX_TILES = 128
+
+# month skeletons kept in memory, e.g. one per orientation
+MAX_SKELETONS = 2
+
+_grid_renderer = None
+_grid_renderer_lock = threading.Lock()
+
+def get_grid_renderer():
+    """Returns the grid renderer shared by all iCalendar instances in this process."""
+    global _grid_renderer
+    with _grid_renderer_lock:
+        if _grid_renderer is None:
+            _grid_renderer = GridRenderer(MAX_TILES, MAX_SKELETONS)
+        return _grid_renderer
+
+class GridRenderer:
+    """Layered renderer for a month grid.
+
+    The static skeleton of a month (headings, background and grid lines) is drawn once per skeleton key.
+    Each day cell is drawn as its own tile, cached by the key of its content (e.g. its day number and events),
+    and the last composited grid is kept, so a refresh only pastes the tiles of the cells that changed.
+    """
+
+    def __init__(self, max_tiles, max_skeletons):
+        self.max_tiles = max_tiles
+        self.max_skeletons = max_skeletons
+        self.skeletons = OrderedDict()
+        self.tiles = OrderedDict()
+        # skeleton key -> (composited grid, cell key of every box)
+        self.composed = OrderedDict()
+        self.lock = threading.Lock()
+
+    def render(self, image, region, skeleton_key, draw_skeleton, cells, draw_cell):
+        """Draws the grid onto the region of the image.
+
+        Args:
+            image: Image to draw onto, whatever is already drawn in the region is kept under the grid
+            region: Box (left, top, right, bottom) covered by the grid
+            skeleton_key: Hashable key of everything draw_skeleton draws, e.g. month, resolution and colours
+            draw_skeleton: Callable(draw) drawing the skeleton in image coordinates
+            cells: List of (box, cell_key) with boxes in image coordinates and hashable cell keys
+            draw_cell: Callable(draw, cell_key, box) drawing a cell onto its tile, whose origin is the top left of box
+        """
+        region = tuple(int(value) for value in region)
+        base = image.crop(region)
+        # the skeleton is drawn over the region, so it depends on what was drawn there before
+        skeleton_key = (skeleton_key, region, image.mode, zlib.crc32(base.tobytes()))
+
+        with self.lock:
+            skeleton = self._get_skeleton(image, region, skeleton_key, draw_skeleton)
+            composed, cell_keys = self.composed.pop(skeleton_key, (None, {}))
+            if composed is None:
+                composed = skeleton.copy()
+
+            changed = 0
+            for box, cell_key in cells:
+                box = tuple(int(value) for value in box)
+                if cell_keys.get(box) == cell_key:
+                    continue
+                local_box = (box[0] - region[0], box[1] - region[1], box[2] - region[0], box[3] - region[1])
+                tile = self._get_tile(skeleton, skeleton_key, box, local_box, cell_key, draw_cell)
+                composed.paste(tile, local_box[:2])
+                cell_keys[box] = cell_key
+                changed += 1
+
+            self.composed[skeleton_key] = (composed, cell_keys)
+            while len(self.composed) > self.max_skeletons:
+                self.composed.popitem(last=False)
+
+        logger.debug(f"Composited {changed} of {len(cells)} grid cells")
+        image.paste(composed, region[:2])
+
+    def _get_skeleton(self, image, region, skeleton_key, draw_skeleton):
+        skeleton = self.skeletons.get(skeleton_key)
+        if skeleton is not None:
+            self.skeletons.move_to_end(skeleton_key)
+            return skeleton
+
+        canvas = image.copy()
+        draw_skeleton(ImageDraw.Draw(canvas))
+        skeleton = canvas.crop(region)
+        self.skeletons[skeleton_key] = skeleton
+        while len(self.skeletons) > self.max_skeletons:
+            self.skeletons.popitem(last=False)
+        return skeleton
+
+    def _get_tile(self, skeleton, skeleton_key, box, local_box, cell_key, draw_cell):
+        key = (skeleton_key, local_box, cell_key)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+
+        tile = skeleton.crop(local_box)
+        draw_cell(ImageDraw.Draw(tile), cell_key, box)
+        self.tiles[key] = tile
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
@@ -1,18 +1,24 @@
 import os
 from datetime import datetime, timedelta, date as dt_date
+import heapq
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
 from io import BytesIO
 import pytz
-import urllib.request
-from icalendar import Calendar
-import recurring_ical_events
-from PIL import Image, ImageDraw, ImageFont
-from utils.app_utils import get_font, resolve_path
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from utils.app_utils import get_font, get_text_bbox, resolve_path
+from utils import text_utils
+from utils.browser_renderer import get_render_pool
+from utils.progress_utils import report_stage
 from plugins.base_plugin.base_plugin import BasePlugin
+from plugins.icalendar.calendar_cache import get_calendar_cache, get_sort_key
+from plugins.icalendar.event_index import EventIndex
+from plugins.icalendar.grid_renderer import get_grid_renderer
 import re
 import calendar
 import subprocess
 import tempfile
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +27,26 @@ DEFAULT_DAYS_TO_SHOW = 7
 DEFAULT_MAX_EVENTS = 10
 DEFAULT_VIEW_MODE = "list"  # Options: "list", "week", "day"
 
+# seconds to wait for all calendar feeds, slower feeds are left out of the render
+FEEDS_TIMEOUT = 45
+
+# color of a calendar, as sent by the color picker of the settings
+HEX_COLOR = re.compile(r"#[0-9a-fA-F]{6}")
+
+# calendar feeds fetched at the same time, by all iCalendar instances together
+MAX_FEED_WORKERS = 4
+
+_feeds_executor = None
+_feeds_executor_lock = threading.Lock()
+
+def get_feeds_executor():
+    """Returns the thread pool fetching the calendar feeds of all iCalendar instances in this process."""
+    global _feeds_executor
+    with _feeds_executor_lock:
+        if _feeds_executor is None:
+            _feeds_executor = ThreadPoolExecutor(max_workers=MAX_FEED_WORKERS, thread_name_prefix="ICalendar")
+        return _feeds_executor
+
 # Color schemes
 COLOR_SCHEMES = {
     "blue": {
@@ -103,7 +129,7 @@ class ICalendar(BasePlugin):
 
     def generate_image(self, settings, device_config):
         # Get settings
-        url = settings.get('calendarUrl', '')
+        feeds = self.get_feeds(settings)
         days_to_show = int(settings.get('daysToShow', DEFAULT_DAYS_TO_SHOW))
         max_events = int(settings.get('maxEvents', DEFAULT_MAX_EVENTS))
         title = settings.get('title', 'Calendar')
@@ -128,12 +154,8 @@ class ICalendar(BasePlugin):
         now = datetime.now(tz)
         
         try:
-            # Fix webcal URLs
-            if url.startswith('webcal:'):
-                url = url.replace('webcal:', 'https:', 1)
-            
-            # Fetch and parse the calendar events
-            events = self.fetch_calendar_events(url, now, days_to_show, max_events, tz)
+            # Fetch and parse the events of every calendar
+            events = self.fetch_all_events(feeds, now, days_to_show, max_events, tz)
             
             # Prepare the template data based on view mode
             template_data = {
@@ -147,17 +169,25 @@ class ICalendar(BasePlugin):
             css_vars = self.get_css_variables(color_scheme)
             template_data.update(css_vars)
             
-            # Add view-specific data
+            # Add view-specific data, looking events up in an index built once per render
+            index = EventIndex(events, tz)
             if view_mode == "day":
-                template_data.update(self.prepare_day_view_data(events, now, tz))
+                template_data.update(self.prepare_day_view_data(index, now, tz))
             elif view_mode == "week":
-                template_data.update(self.prepare_week_view_data(events, now, tz))
+                template_data.update(self.prepare_week_view_data(index, now, tz))
             else:  # Default to list view
-                template_data.update(self.prepare_list_view_data(events, now, tz))
+                template_data.update(self.prepare_list_view_data(index, now, tz))
             
+            report_stage("rendering")
+
             # Prepare a temp output path for generation
             output_path = resolve_path("calendar_temp.png")
             
+            # Native rendering is opt-in per instance, the browser stays the default
+            render_backend = settings.get('renderBackend') or "html"
+            if render_backend == "native":
+                return self.render_direct(output_path, template_data, width, height)
+            
             try:
                 # Try using HTML rendering first
                 image = self.render_html(output_path, template_data, dimensions)
@@ -191,7 +221,7 @@ class ICalendar(BasePlugin):
                 
         return css_vars
     
-    def prepare_day_view_data(self, events, now, tz):
+    def prepare_day_view_data(self, index, now, tz):
         """Prepare data for day view template."""
         # Filter events for today
         today = now.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -201,24 +231,17 @@ class ICalendar(BasePlugin):
         all_day_events = []
         
         try:
-            for event in events:
+            # Events covering today, including the ones that started on an earlier day
+            for event in index.on_date(today.date()):
                 event_start = event['start']
                 event_end = event['end']
-                
-                # Check if event is today
-                if isinstance(event_start, datetime):
-                    event_start_date = event_start.date()
-                else:
-                    event_start_date = event_start
-                    
-                if event_start_date != today.date():
-                    continue
                     
                 if event['all_day']:
                     all_day_events.append({
                         'summary': event['summary'],
                         'location': event['location'],
-                        'all_day': True
+                        'all_day': True,
+                        'color': event.get('color')
                     })
                 else:
                     # Calculate position and height for the event
@@ -242,7 +265,9 @@ class ICalendar(BasePlugin):
                             'start_time': start_time,
                             'end_time': end_time,
                             'time': time_str,
-                            'all_day': False
+                            'start_hour': index.get_start_hour(event, today.date()),
+                            'all_day': False,
+                            'color': event.get('color')
                         })
                     except (AttributeError, TypeError) as e:
                         logger.warning(f"Error formatting event time: {str(e)} for event {event['summary']}")
@@ -265,7 +290,7 @@ class ICalendar(BasePlugin):
             'all_day_events': all_day_events
         }
     
-    def prepare_week_view_data(self, events, now, tz):
+    def prepare_week_view_data(self, index, now, tz):
         """Prepare data for week view template."""
         # Get the current month's calendar
         cal = calendar.monthcalendar(now.year, now.month)
@@ -301,7 +326,8 @@ class ICalendar(BasePlugin):
                             'date': target_day.strftime("%Y-%m-%d"),
                             'today': False,
                             'different_month': True,
-                            'has_events': self._has_events_on_date(events, target_day.date())
+                            'has_events': index.has_events_on(target_day.date()),
+                            'event_colors': self._get_event_colors(index, target_day.date())
                         }
                     else:
                         # Next month
@@ -311,7 +337,8 @@ class ICalendar(BasePlugin):
                             'date': target_day.strftime("%Y-%m-%d"),
                             'today': False,
                             'different_month': True,
-                            'has_events': self._has_events_on_date(events, target_day.date())
+                            'has_events': index.has_events_on(target_day.date()),
+                            'event_colors': self._get_event_colors(index, target_day.date())
                         }
                 else:
                     # Day in current month
@@ -321,7 +348,8 @@ class ICalendar(BasePlugin):
                         'date': target_day.strftime("%Y-%m-%d"),
                         'today': (day == today_day and now.month == today_month and now.year == today_year),
                         'different_month': False,
-                        'has_events': self._has_events_on_date(events, target_day.date())
+                        'has_events': index.has_events_on(target_day.date()),
+                        'event_colors': self._get_event_colors(index, target_day.date())
                     }
                 week_data.append(day_info)
             calendar_grid.append(week_data)
@@ -336,24 +364,22 @@ class ICalendar(BasePlugin):
         start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
         end_date = start_date + timedelta(days=lookahead)
         
-        # Group events by day
-        sorted_events = sorted(events, key=lambda x: x['start'])
+        # Events starting from today until the end of the lookahead, already sorted
+        upcoming = index.starting_between(start_date, end_date + timedelta(days=1))
         
-        for event in sorted_events:
+        for event in upcoming:
             event_start = event['start']
             
             # Skip past events
             if isinstance(event_start, datetime) and event_start < now:
                 continue
                 
-            # Convert date to datetime for comparison if needed
+            # Convert date to datetime for display if needed
             if not isinstance(event_start, datetime):
                 event_start = datetime.combine(event_start, datetime.min.time(), tzinfo=tz)
+            else:
+                event_start = event_start.astimezone(tz)
             
-            # Skip events too far in the future
-            if event_start.date() > end_date.date():
-                continue
-                
             # Format date/time for display
             event_day = event_start.strftime("%a %d")
             
@@ -367,7 +393,8 @@ class ICalendar(BasePlugin):
                 'time': event_time,
                 'summary': event['summary'],
                 'location': event['location'],
-                'all_day': event['all_day']
+                'all_day': event['all_day'],
+                'color': event.get('color')
             })
             
             # Limit to 10 upcoming events
@@ -381,25 +408,11 @@ class ICalendar(BasePlugin):
             'upcoming_events': upcoming_events
         }
     
-    def _has_events_on_date(self, events, date):
-        """Check if there are events on a specific date."""
-        for event in events:
-            event_start = event['start']
-            event_end = event['end']
-            
-            # Convert to date if datetime
-            if isinstance(event_start, datetime):
-                event_start = event_start.date()
-            if isinstance(event_end, datetime):
-                event_end = event_end.date()
-                
-            # Check if date falls within event range
-            if event_start <= date <= event_end:
-                return True
-                
-        return False
+    def _get_event_colors(self, index, date):
+        """Returns the colors of the calendars with events on a date."""
+        return sorted({event['color'] for event in index.on_date(date) if event.get('color')})
     
-    def prepare_list_view_data(self, events, now, tz):
+    def prepare_list_view_data(self, index, now, tz):
         """Prepare data for list view template."""
         # Group events by day
         days_dict = {}
@@ -411,18 +424,14 @@ class ICalendar(BasePlugin):
         start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
         end_date = start_date + timedelta(days=lookahead)
         
-        for event in events:
+        for event in index.starting_between(start_date, end_date + timedelta(days=1)):
             event_start = event['start']
             
-            # Convert date to datetime for comparison if needed
+            # Convert date to datetime for display if needed
             if not isinstance(event_start, datetime):
                 event_start_dt = datetime.combine(event_start, datetime.min.time(), tzinfo=tz)
             else:
-                event_start_dt = event_start
-                
-            # Skip events outside our range
-            if event_start_dt.date() < start_date.date() or event_start_dt.date() > end_date.date():
-                continue
+                event_start_dt = event_start.astimezone(tz)
                 
             # Get date string as key
             date_key = event_start_dt.date().isoformat()
@@ -453,7 +462,8 @@ class ICalendar(BasePlugin):
                 'location': event['location'],
                 'start_time': start_time,
                 'end_time': end_time,
-                'all_day': event['all_day']
+                'all_day': event['all_day'],
+                'color': event.get('color')
             })
         
         # Convert dictionary to sorted list
@@ -461,54 +471,69 @@ class ICalendar(BasePlugin):
         
         return {'list_days': list_days}
     
+    def get_feeds(self, settings):
+        """Returns the (url, color) of every calendar in the settings."""
+        urls = settings.get('calendarUrls[]') or [settings.get('calendarUrl', '')]
+        colors = settings.get('calendarColors[]') or []
+        feeds = []
+        for index, url in enumerate(urls):
+            url = url.strip()
+            if not url:
+                continue
+            # Fix webcal URLs
+            if url.startswith('webcal:'):
+                url = url.replace('webcal:', 'https:', 1)
+            color = colors[index].strip() if index < len(colors) else ''
+            # colors end up in style attributes, only accept what the color picker sends
+            feeds.append((url, color if HEX_COLOR.fullmatch(color) else None))
+        return feeds
+
+    def fetch_all_events(self, feeds, now, days_to_show, max_events, tz):
+        """Fetches the calendars concurrently and merges their events by start time.
+
+        Every calendar is fetched and cached independently: one that fails is left out, and the ones still
+        loading after FEEDS_TIMEOUT don't hold up the render.
+        """
+        if not feeds:
+            return []
+
+        executor = get_feeds_executor()
+        futures = {executor.submit(self.fetch_calendar_events, url, now, days_to_show, max_events, tz): (url, color)
+                   for url, color in feeds}
+        done, not_done = wait(futures, timeout=FEEDS_TIMEOUT)
+        for future in not_done:
+            # drop the feeds that haven't started, the running ones finish and warm the cache for the next render
+            future.cancel()
+
+        feed_events = []
+        for future, (url, color) in futures.items():
+            if future in not_done:
+                logger.warning(f"Calendar {url} took longer than {FEEDS_TIMEOUT}s, skipping it")
+                continue
+            events = future.result()
+            if color:
+                # the cached events are shared, so tag copies with the color of the calendar
+                events = [dict(event, color=color) for event in events]
+            feed_events.append(events)
+
+        # each calendar's events are already sorted
+        return list(heapq.merge(*feed_events, key=lambda event: get_sort_key(event, tz)))
+
     def fetch_calendar_events(self, url, now, days_to_show, max_events, tz):
         """Fetch and parse iCalendar events."""
         if not url:
             return []
         
         try:
-            # Download the iCalendar file
-            response = urllib.request.urlopen(url)
-            ical_data = response.read()
-            
-            # Parse the iCalendar data
-            cal = Calendar.from_ical(ical_data)
-            
             # Define the date range
             start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
             end_date = start_date + timedelta(days=days_to_show)
             
-            # Get events from the calendar, including recurring ones
-            events = recurring_ical_events.of(cal).between(start_date, end_date)
-            
-            # Process events
-            event_list = []
-            for event in events:
-                summary = str(event.get('summary', 'No Title'))
-                location = str(event.get('location', ''))
-                
-                dtstart = event.get('dtstart').dt
-                dtend = event.get('dtend').dt if event.get('dtend') else dtstart
-                
-                # Convert datetime to timezone-aware if it isn't already
-                if isinstance(dtstart, datetime) and dtstart.tzinfo is None:
-                    dtstart = tz.localize(dtstart)
-                if isinstance(dtend, datetime) and dtend.tzinfo is None:
-                    dtend = tz.localize(dtend)
-                
-                # Handle all-day events
-                all_day = not isinstance(dtstart, datetime)
-                
-                event_list.append({
-                    'summary': summary,
-                    'location': location,
-                    'start': dtstart,
-                    'end': dtend,
-                    'all_day': all_day
-                })
-            
-            # Sort events by start time
-            event_list.sort(key=lambda x: x['start'])
+            # Download the iCalendar file, streamed so a large feed is never held in memory whole
+            with self.http_get(url, stream=True) as response:
+                response.raise_for_status()
+                # Parse the calendar and expand recurring events, reusing what is cached for unchanged data
+                event_list = get_calendar_cache().get_events(url, response.iter_lines(), start_date, end_date, tz)
             
             return event_list
             
@@ -522,20 +547,16 @@ class ICalendar(BasePlugin):
         image = Image.new('RGB', (width, height), (255, 255, 255))
         draw = ImageDraw.Draw(image)
         
-        try:
-            font = get_font('Jost', int(width * 0.05))
-            title_font = get_font('Jost-SemiBold', int(width * 0.08))
-        except:
-            font = get_font('Jost', int(width * 0.05))
-            title_font = get_font('Jost', int(width * 0.08))
+        font = get_font('Jost', int(width * 0.05))
+        title_font = get_font('Jost', int(width * 0.08), 'bold')
             
         # Draw error title
         draw.text((width // 2, height // 3), "Calendar Error", 
                  fill=(200, 0, 0), font=title_font, anchor="mm")
         
         # Draw error message with wrapping
-        message_lines = self._wrap_text(error_message, font, width * 0.8)
-        line_height = font.getbbox("A")[3] + 5
+        message_lines = text_utils.wrap_text(error_message, font, width * 0.8)
+        line_height = get_text_bbox(font, "A")[3] + 5
         
         y_position = height // 2
         for line in message_lines:
@@ -545,37 +566,6 @@ class ICalendar(BasePlugin):
             
         return image
     
-    def _wrap_text(self, text, font, max_width):
-        """Wrap text to fit within max_width."""
-        words = text.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            # getbbox()[2] gives width
-            if font.getbbox(test_line)[2] <= max_width:
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                    current_line = [word]
-                else:
-                    # Word is too long, split it
-                    current_word = word
-                    while font.getbbox(current_word)[2] > max_width:
-                        for i in range(len(current_word) - 1, 0, -1):
-                            if font.getbbox(current_word[:i])[2] <= max_width:
-                                lines.append(current_word[:i] + '-')
-                                current_word = current_word[i:]
-                                break
-                    current_line = [current_word]
-        
-        if current_line:
-            lines.append(' '.join(current_line))
-            
-        return lines
-    
     def render_direct(self, template_path, params, width=800, height=480):
         """Render template directly using PIL."""
         try:
@@ -584,7 +574,12 @@ class ICalendar(BasePlugin):
             # Create new image - ensure dimensions are integers
             width = int(width)
             height = int(height)
-            image = Image.new('RGB', (width, height), (255, 255, 255))
+            # the views are drawn inside the margin, frame and background of the style settings
+            canvas, content_box, text_color = text_utils.create_styled_canvas(
+                (width, height), params.get('plugin_settings', {}))
+            content_box = tuple(int(value) for value in content_box)
+            image = canvas.crop(content_box)
+            width, height = image.size
             draw = ImageDraw.Draw(image)
             
             # Define some standard colors
@@ -600,29 +595,18 @@ class ICalendar(BasePlugin):
                 "today_bg": (219, 242, 255),  # Light sky blue
                 "grid_lines": (200, 200, 220)  # Light gray
             }
-            
-            # Load fonts
-            try:
-                # Try to load Jost-SemiBold first
-                header_font = ImageFont.truetype("./src/fonts/Jost-SemiBold.ttf", 26)
-                normal_font = ImageFont.truetype("./src/fonts/Jost-Regular.ttf", 18)
-                small_font = ImageFont.truetype("./src/fonts/Jost-Regular.ttf", 14)
-                logging.info("Successfully loaded Jost fonts for calendar rendering")
-            except Exception as e:
-                logging.warning(f"Failed to load Jost-SemiBold font: {e}")
-                try:
-                    # Try to load regular Jost if SemiBold fails
-                    header_font = ImageFont.truetype("./src/fonts/Jost-Regular.ttf", 26)
-                    normal_font = ImageFont.truetype("./src/fonts/Jost-Regular.ttf", 18)
-                    small_font = ImageFont.truetype("./src/fonts/Jost-Regular.ttf", 14)
-                    logging.info("Using Jost-Regular fonts for calendar rendering")
-                except Exception as e:
-                    logging.warning(f"Failed to load Jost fonts: {e}")
-                    # Fall back to default font
-                    header_font = ImageFont.load_default()
-                    normal_font = ImageFont.load_default()
-                    small_font = ImageFont.load_default()
-                    logging.warning("Using default fonts for calendar rendering")
+            if params.get('plugin_settings', {}).get('textColor'):
+                colors["text_dark"] = text_color
+            
+            # Load fonts, shared between renders
+            header_font = get_font("Jost", 26, "bold")
+            normal_font = get_font("Jost", 18)
+            small_font = get_font("Jost", 14)
+            if not (header_font and normal_font and small_font):
+                logging.warning("Failed to load Jost fonts, using default fonts for calendar rendering")
+                header_font = ImageFont.load_default()
+                normal_font = ImageFont.load_default()
+                small_font = ImageFont.load_default()
             
             # Extract template type from path or params
             # First check if viewMode is in settings
@@ -647,7 +631,7 @@ class ICalendar(BasePlugin):
             draw.rectangle([(0, 0), (width, title_height)], fill=colors["primary"])
             
             # Draw title text
-            title = self.title if hasattr(self, 'title') else 'Calendar'
+            title = params.get('title') or (self.title if hasattr(self, 'title') else 'Calendar')
             draw.text((10, title_height//2), title, fill=colors["text_header"], font=header_font, anchor="lm")
             
             # Draw date on right side
@@ -706,7 +690,7 @@ class ICalendar(BasePlugin):
                     
                     try:
                         # Render week view with error handling - ensure dimensions are passed correctly
-                        self._render_direct_week_view(draw, params, (int(width), int(height)), colors, header_font, normal_font, small_font)
+                        self._render_direct_week_view(draw, params, (int(width), int(height)), colors, header_font, normal_font, small_font, image)
                         logging.info("Week view rendering completed successfully")
                     except Exception as e:
                         logging.error(f"Error rendering week view: {str(e)}")
@@ -729,8 +713,10 @@ class ICalendar(BasePlugin):
                                 events.append({
                                     'summary': event.get('summary', ''),
                                     'location': event.get('location', ''),
-                                    'time': event.get('time', ''),
-                                    'all_day': event.get('all_day', False)
+                                    'time': event.get('time') or " - ".join(
+                                        filter(None, [event.get('start_time'), event.get('end_time')])),
+                                    'all_day': event.get('all_day', False),
+                                    'color': event.get('color')
                                 })
                             
                             days.append({
@@ -754,15 +740,9 @@ class ICalendar(BasePlugin):
                 logging.error(f"Error in view-specific rendering: {str(e)}")
                 self._render_error_message(draw, width, height, f"Error in view rendering: {str(e)}", header_font)
             
-            # Save and return the image
-            if template_path.endswith('.html'):
-                img_path = template_path.replace('.html', '.png')
-            else:
-                img_path = f"{template_path}.png"
-            
-            image.save(img_path)
-            logging.info(f"Direct PIL rendering complete: {img_path}")
-            return image
+            canvas.paste(image, content_box[:2])
+            logging.info("Direct PIL rendering complete")
+            return canvas
             
         except Exception as e:
             logging.error(f"Error in direct PIL rendering: {str(e)}")
@@ -905,10 +885,6 @@ class ICalendar(BasePlugin):
                     logger.error(f"CSS template file not found: {css_file}")
                     return self.render_direct(img_path, params, width, height)
 
-            # Create a temporary HTML file
-            with tempfile.NamedTemporaryFile(suffix='.html', delete=False) as f:
-                temp_html_path = f.name
-
             # Get color scheme
             settings = params.get('plugin_settings', {})
             color_scheme = settings.get('colorScheme', 'blue')
@@ -935,6 +911,24 @@ class ICalendar(BasePlugin):
             # Apply parameters to template
             html_content = self._apply_template(html_template, template_params)
 
+            # Prefer the shared browser pool, it renders in memory without launching a new browser
+            render_pool = get_render_pool()
+            if render_pool:
+                if not render_pool.is_healthy():
+                    logger.warning("Browser render pool unhealthy, using direct rendering")
+                    return self.render_direct(img_path, params, width, height)
+                try:
+                    img = render_pool.render(html_content, (width, height))
+                    logger.info("HTML rendering complete")
+                    return img
+                except Exception as e:
+                    logger.error(f"Browser render pool failed: {str(e)}")
+                    return self.render_direct(img_path, params, width, height)
+
+            # Create a temporary HTML file
+            with tempfile.NamedTemporaryFile(suffix='.html', delete=False) as f:
+                temp_html_path = f.name
+
             # Write HTML to temporary file
             with open(temp_html_path, 'w') as f:
                 f.write(html_content)
@@ -1021,13 +1015,17 @@ class ICalendar(BasePlugin):
         html += '<div class="all-day-events">'
         if all_day_events:
             for event in all_day_events:
-                html += f'<div class="event all-day"><div class="event-title">{event.get("summary", "")}</div>'
+                html += f'<div class="event all-day"{self._event_style(event)}><div class="event-title">{event.get("summary", "")}</div>'
                 if event.get('location'):
                     html += f'<div class="event-location">{event.get("location")}</div>'
                 html += '</div>'
         html += '</div>'
         
-        # Hourly timeline for timed events
+        # Hourly timeline for timed events, bucketed by their start hour once
+        events_by_hour = {}
+        for event in timed_events:
+            events_by_hour.setdefault(event.get('start_hour', 0), []).append(event)
+        
         html += '<div class="timeline">'
         for hour in range(0, 24):
             ampm = 'AM' if hour < 12 else 'PM'
@@ -1038,9 +1036,8 @@ class ICalendar(BasePlugin):
             html += f'<div class="hour"><div class="hour-label">{display_hour} {ampm}</div><div class="hour-events">'
             
             # Add events for this hour
-            hour_events = [e for e in timed_events if self._event_in_hour(e, hour)]
-            for event in hour_events:
-                html += f'<div class="event"><div class="event-time">{event.get("time", "")}</div>'
+            for event in events_by_hour.get(hour, []):
+                html += f'<div class="event"{self._event_style(event)}><div class="event-time">{event.get("time", "")}</div>'
                 html += f'<div class="event-title">{event.get("summary", "")}</div>'
                 if event.get('location'):
                     html += f'<div class="event-location">{event.get("location")}</div>'
@@ -1053,19 +1050,13 @@ class ICalendar(BasePlugin):
         
         return html
         
-    def _event_in_hour(self, event, hour):
-        """Check if an event falls within a specific hour."""
-        event_time = event.get('time', '')
-        if not event_time:
-            return False
-            
-        try:
-            # Simple check for now - just look for the hour in the event time string
-            event_hour = int(event_time.split(':')[0])
-            return event_hour == hour
-        except (ValueError, IndexError):
-            return False
-            
+    def _event_style(self, event):
+        """Returns the style attribute marking an event with the color of its calendar, if it has one."""
+        color = event.get('color')
+        if not color:
+            return ''
+        return f' style="border-left: 4px solid {color}"'
+
     def _get_week_view_html(self, params):
         """Generate HTML content for week view."""
         # Simplified placeholder implementation
@@ -1106,7 +1097,7 @@ class ICalendar(BasePlugin):
         html += '<h3>Coming Up</h3>'
         html += '<div class="events-list">'
         for event in upcoming_events[:5]:  # Limit to 5 events
-            html += f'<div class="event"><div class="event-day">{event.get("day", "")}</div>'
+            html += f'<div class="event"{self._event_style(event)}><div class="event-day">{event.get("day", "")}</div>'
             html += f'<div class="event-details"><div class="event-time">'
             html += 'All Day' if event.get('all_day') else event.get('time', '')
             html += f'</div><div class="event-title">{event.get("summary", "")}</div></div></div>'
@@ -1139,7 +1130,7 @@ class ICalendar(BasePlugin):
             
             html += '<div class="day-events">'
             for event in events:
-                html += '<div class="event">'
+                html += f'<div class="event"{self._event_style(event)}>'
                 html += f'<div class="event-time">'
                 html += 'All Day' if event.get('all_day') else event.get('time', '')
                 html += '</div>'
@@ -1165,12 +1156,13 @@ class ICalendar(BasePlugin):
             
             # Prepare data based on view mode
             params = {}
+            index = EventIndex(events, now.tzinfo)
             if view_mode == "day":
-                params = self.prepare_day_view_data(events, now, now.tzinfo)
+                params = self.prepare_day_view_data(index, now, now.tzinfo)
             elif view_mode == "week":
-                params = self.prepare_week_view_data(events, now, now.tzinfo)
+                params = self.prepare_week_view_data(index, now, now.tzinfo)
             else:  # list view
-                params = self.prepare_list_view_data(events, now, now.tzinfo)
+                params = self.prepare_list_view_data(index, now, now.tzinfo)
                 
             # Add common params
             params['current_date'] = now.strftime("%A, %B %d")
@@ -1180,6 +1172,10 @@ class ICalendar(BasePlugin):
             logger.error(f"Error fetching and parsing iCal data: {e}")
             return None 
 
+    def _get_font_key(self, font):
+        """Returns a hashable key identifying a font, for render caches."""
+        return (getattr(font, 'path', None), getattr(font, 'size', None), type(font).__name__)
+
     def _draw_rounded_rectangle(self, draw, xy, fill=None, outline=None, width=1, radius=10):
         """Draw a rectangle with rounded corners."""
         try:
@@ -1460,7 +1456,7 @@ class ICalendar(BasePlugin):
             # Re-raise to be caught by caller
             raise
 
-    def _render_direct_week_view(self, draw, params, dimensions, colors, header_font, normal_font, small_font):
+    def _render_direct_week_view(self, draw, params, dimensions, colors, header_font, normal_font, small_font, image):
         """Render week view directly using PIL."""
         try:
             # Ensure dimensions are properly formatted as floats
@@ -1482,166 +1478,186 @@ class ICalendar(BasePlugin):
                 "section_bg": (245, 245, 250)   # Off-white with blue tint
             }
             
+            # Draw calendar grid with better styling
+            calendar_grid = params.get('calendar_grid', [])
+            if not calendar_grid:
+                # Create an empty grid if none provided
+                calendar_grid = []
+                for _ in range(5):  # 5 weeks
+                    week = []
+                    for j in range(7):  # 7 days
+                        week.append({'day': j+1, 'different_month': False, 'has_events': False})
+                    calendar_grid.append(week)
+            
             # Draw month heading with background and rounded corners
             month_title_y = float(height * 0.2)
             title_height = float(45)
             title_width = float(width * 0.8)
             title_x = float(width * 0.1)
             
-            # Draw a background for the month heading
-            # Safely create coordinates for rectangle
-            x1 = float(title_x)
-            y1 = float(month_title_y - title_height/2)
-            x2 = float(title_x + title_width)
-            y2 = float(month_title_y + title_height/2)
-            
-            self._draw_rounded_rectangle(
-                draw, 
-                [(x1, y1), (x2, y2)],
-                fill=vibrant_colors["primary"],
-                radius=15
-            )
-            
-            # Draw month name with shadow for better visibility
-            # Draw shadow first
-            shadow_offset = 1
-            draw.text((float(width/2 + shadow_offset), float(month_title_y + shadow_offset)), 
-                     params.get('month_name', 'Calendar'), 
-                     fill=(45, 85, 205), font=header_font, anchor="mm")
-            
-            # Draw actual text on top
-            draw.text((float(width/2), float(month_title_y)), 
-                     params.get('month_name', 'Calendar'), 
-                     fill=(255, 255, 255), font=header_font, anchor="mm")
-            
-            # Draw weekday headers with gradient background
             weekdays = params.get('weekdays', ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"])
             if not weekdays or len(weekdays) == 0:
                 weekdays = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
                 
             day_width = float(width / 7)
-            
             weekday_y = float(height * 0.25)
-            # Draw gradient background for weekday header
-            for i in range(7):
-                x_start = float(i * day_width)
-                # Use different color for weekend days
-                if i == 0 or i == 6:  # Sunday or Saturday
-                    header_color = vibrant_colors["weekend"]
-                else:
-                    header_color = vibrant_colors["primary"]
-                
-                # Explicitly define rectangle coordinates as floats
-                x_end = float(x_start + day_width)
-                y_start = float(weekday_y - 15)
-                y_end = float(weekday_y + 15)
-                
-                draw.rectangle(
-                    [(x_start, y_start), (x_end, y_end)],
-                    fill=header_color,
-                    outline=None
-                )
-            
-            # Draw the weekday names
-            for i, day in enumerate(weekdays[:7]):  # Limit to 7 days
-                x = float(i * day_width + day_width/2)
-                draw.text((x, weekday_y), 
-                         day, 
-                         fill=(255, 255, 255), font=small_font, anchor="mm")
-            
-            # Draw calendar grid with better styling
-            calendar_grid = params.get('calendar_grid', [])
-            if not calendar_grid:
-                # Create an empty grid if none provided
-                calendar_grid = []
-                for _ in range(5):  # 5 weeks
-                    week = []
-                    for j in range(7):  # 7 days
-                        week.append({'day': j+1, 'different_month': False, 'has_events': False})
-                    calendar_grid.append(week)
             
             grid_top = float(height * 0.3)
             grid_height = float(height * 0.3)
             
-            # Draw grid background with slight blue tint
-            # Safe coordinate definition
-            x_start, y_start = float(0), float(grid_top)
-            x_end, y_end = float(width), float(grid_top + grid_height)
-            
-            draw.rectangle(
-                [(x_start, y_start), (x_end, y_end)],
-                fill=vibrant_colors["section_bg"],
-                outline=colors["grid_lines"]
-            )
-            
             # Maximum of 5 rows for weeks
             max_weeks = min(len(calendar_grid), 5) if calendar_grid else 5
             row_height = float(grid_height / max_weeks)
             
-            # Draw grid lines
-            for i in range(1, 7):  # Vertical lines between days
-                x = float(i * day_width)
-                draw.line([(x, grid_top), (x, grid_top + grid_height)], fill=colors["grid_lines"], width=1)
+            def draw_skeleton(draw):
+                """Draws the parts of the grid that only change with the month: headings, background and lines."""
+                # Draw a background for the month heading
+                # Safely create coordinates for rectangle
+                x1 = float(title_x)
+                y1 = float(month_title_y - title_height/2)
+                x2 = float(title_x + title_width)
+                y2 = float(month_title_y + title_height/2)
                 
-            for i in range(1, max_weeks):  # Horizontal lines between weeks
-                y = float(grid_top + i * row_height)
-                draw.line([(0, y), (width, y)], fill=colors["grid_lines"], width=1)
-            
-            # Draw days and event indicators
-            if calendar_grid:
-                for i, week in enumerate(calendar_grid[:max_weeks]):
-                    for j, day in enumerate(week[:7]):  # Limit to 7 days per week
-                        x = float(j * day_width + day_width/2)
-                        y = float(grid_top + i * row_height + row_height/2)
-                        
-                        # Default color for days
-                        fill_color = colors["text_dark"]
-                        
-                        # Different styling for weekend days
-                        if j == 0 or j == 6:  # Sunday or Saturday
-                            if not day.get('different_month'):
-                                fill_color = vibrant_colors["weekend"]
-                        
-                        # Different color for days not in current month
-                        if day.get('different_month'):
-                            fill_color = colors["text_light"]
-                        
-                        # Special highlight for today
-                        if day.get('today'):
-                            # Draw a filled circle with rounded border for today
-                            circle_radius = float(min(day_width, row_height) / 3.5)
-                            
-                            # Safe coordinate definition for ellipse
-                            ellipse_x1 = float(x - circle_radius)
-                            ellipse_y1 = float(y - circle_radius)
-                            ellipse_x2 = float(x + circle_radius)
-                            ellipse_y2 = float(y + circle_radius)
-                            
-                            # Draw filled circle for today's background
-                            draw.ellipse(
-                                [(ellipse_x1, ellipse_y1), (ellipse_x2, ellipse_y2)],
-                                fill=vibrant_colors["today_bg"],
-                                outline=vibrant_colors["primary"]
-                            )
-                            fill_color = vibrant_colors["primary"]  # Darker text for contrast
-                        
-                        # Draw the day number
-                        day_text = str(day.get('day', ''))
-                        draw.text((x, y), day_text, fill=fill_color, font=normal_font, anchor="mm")
-                        
-                        # Draw a colorful event indicator dot if there are events
-                        if day.get('has_events'):
-                            dot_y = float(y + row_height/4)
-                            # Safe coordinate definition for ellipse
-                            dot_x1 = float(x - 4)
-                            dot_y1 = float(dot_y)
-                            dot_x2 = float(x + 4)
-                            dot_y2 = float(dot_y + 8)
-                            
-                            draw.ellipse(
-                                [(dot_x1, dot_y1), (dot_x2, dot_y2)],
-                                fill=vibrant_colors["event_dot"]
-                            )
+                self._draw_rounded_rectangle(
+                    draw, 
+                    [(x1, y1), (x2, y2)],
+                    fill=vibrant_colors["primary"],
+                    radius=15
+                )
+                
+                # Draw month name with shadow for better visibility
+                # Draw shadow first
+                shadow_offset = 1
+                draw.text((float(width/2 + shadow_offset), float(month_title_y + shadow_offset)), 
+                         params.get('month_name', 'Calendar'), 
+                         fill=(45, 85, 205), font=header_font, anchor="mm")
+                
+                # Draw actual text on top
+                draw.text((float(width/2), float(month_title_y)), 
+                         params.get('month_name', 'Calendar'), 
+                         fill=(255, 255, 255), font=header_font, anchor="mm")
+                
+                # Draw gradient background for weekday header
+                for i in range(7):
+                    x_start = float(i * day_width)
+                    # Use different color for weekend days
+                    if i == 0 or i == 6:  # Sunday or Saturday
+                        header_color = vibrant_colors["weekend"]
+                    else:
+                        header_color = vibrant_colors["primary"]
+                    
+                    # Explicitly define rectangle coordinates as floats
+                    x_end = float(x_start + day_width)
+                    y_start = float(weekday_y - 15)
+                    y_end = float(weekday_y + 15)
+                    
+                    draw.rectangle(
+                        [(x_start, y_start), (x_end, y_end)],
+                        fill=header_color,
+                        outline=None
+                    )
+                
+                # Draw the weekday names
+                for i, day in enumerate(weekdays[:7]):  # Limit to 7 days
+                    x = float(i * day_width + day_width/2)
+                    draw.text((x, weekday_y), 
+                             day, 
+                             fill=(255, 255, 255), font=small_font, anchor="mm")
+                
+                # Draw grid background with slight blue tint
+                # Safe coordinate definition
+                x_start, y_start = float(0), float(grid_top)
+                x_end, y_end = float(width), float(grid_top + grid_height)
+                
+                draw.rectangle(
+                    [(x_start, y_start), (x_end, y_end)],
+                    fill=vibrant_colors["section_bg"],
+                    outline=colors["grid_lines"]
+                )
+                
+                # Draw grid lines
+                for i in range(1, 7):  # Vertical lines between days
+                    x = float(i * day_width)
+                    draw.line([(x, grid_top), (x, grid_top + grid_height)], fill=colors["grid_lines"], width=1)
+                    
+                for i in range(1, max_weeks):  # Horizontal lines between weeks
+                    y = float(grid_top + i * row_height)
+                    draw.line([(0, y), (width, y)], fill=colors["grid_lines"], width=1)
+            
+            def draw_cell(draw, cell, box):
+                """Draws the day number and event indicators of a cell onto its tile."""
+                day_text, different_month, today, weekend, event_colors, center = cell
+                # Tile coordinates
+                x = float(center[0] - box[0])
+                y = float(center[1] - box[1])
+                
+                # Default color for days
+                fill_color = colors["text_dark"]
+                
+                # Different styling for weekend days
+                if weekend and not different_month:
+                    fill_color = vibrant_colors["weekend"]
+                
+                # Different color for days not in current month
+                if different_month:
+                    fill_color = colors["text_light"]
+                
+                # Special highlight for today
+                if today:
+                    # Draw a filled circle with rounded border for today
+                    circle_radius = float(min(day_width, row_height) / 3.5)
+                    
+                    # Draw filled circle for today's background
+                    draw.ellipse(
+                        [(float(x - circle_radius), float(y - circle_radius)),
+                         (float(x + circle_radius), float(y + circle_radius))],
+                        fill=vibrant_colors["today_bg"],
+                        outline=vibrant_colors["primary"]
+                    )
+                    fill_color = vibrant_colors["primary"]  # Darker text for contrast
+                
+                # Draw the day number
+                draw.text((x, y), day_text, fill=fill_color, font=normal_font, anchor="mm")
+                
+                # Draw a colorful event indicator dot per calendar with events
+                # Kept inside the tile so the dots aren't cut off by the grid line below
+                dot_y = float(min(y + row_height/4, box[3] - box[1] - 9))
+                for k, dot_color in enumerate(event_colors):
+                    dot_x = float(x + (k - (len(event_colors) - 1) / 2) * 10)
+                    draw.ellipse(
+                        [(float(dot_x - 4), dot_y), (float(dot_x + 4), float(dot_y + 8))],
+                        fill=dot_color
+                    )
+            
+            # Day cells, each keyed by everything drawn in it
+            cells = []
+            for i, week in enumerate(calendar_grid[:max_weeks]):
+                for j, day in enumerate(week[:7]):  # Limit to 7 days per week
+                    x = float(j * day_width + day_width/2)
+                    y = float(grid_top + i * row_height + row_height/2)
+                    # Inside the grid lines
+                    box = (int(j * day_width) + 1, int(grid_top + i * row_height) + 1,
+                           int((j + 1) * day_width), int(grid_top + (i + 1) * row_height))
+                    
+                    event_colors = []
+                    if day.get('has_events'):
+                        for color in day.get('event_colors') or [None]:
+                            try:
+                                event_colors.append(ImageColor.getrgb(color) if color else vibrant_colors["event_dot"])
+                            except ValueError:
+                                event_colors.append(vibrant_colors["event_dot"])
+                    
+                    cell = (str(day.get('day', '')), bool(day.get('different_month')), bool(day.get('today')),
+                            j == 0 or j == 6, tuple(event_colors[:3]), (x, y))
+                    cells.append((box, cell))
+            
+            # Only the cells that changed since the last render are drawn again
+            skeleton_key = (params.get('month_name', 'Calendar'), (width, height), tuple(weekdays[:7]), max_weeks,
+                            tuple(sorted(colors.items())), tuple(sorted(vibrant_colors.items())),
+                            self._get_font_key(header_font), self._get_font_key(normal_font),
+                            self._get_font_key(small_font))
+            region = (0, max(0, int(month_title_y - title_height/2)), int(width), min(int(height), int(grid_top + grid_height) + 1))
+            get_grid_renderer().render(image, region, skeleton_key, draw_skeleton, cells, draw_cell)
             
             # Draw upcoming events section with enhanced styling
             upcoming_top = float(grid_top + grid_height + 20)
@@ -1878,6 +1894,11 @@ class ICalendar(BasePlugin):
                     else:
                         time_text = event.get('time', '')
                         time_box_color = vibrant_colors["primary"]
+                    if event.get('color'):
+                        try:
+                            time_box_color = ImageColor.getrgb(event['color'])
+                        except ValueError:
+                            pass
                     
                     # Create time box coordinates
                     time_box_coords = [
@@ -1902,10 +1923,9 @@ class ICalendar(BasePlugin):
                         anchor="mm"
                     )
                     
-                    # Draw event summary
-                    summary = event.get('summary', '')
-                    if len(summary) > 30:  # Truncate long titles
-                        summary = summary[:27] + "..."
+                    # Draw event summary, truncated to the width of the card
+                    text_width = float(width * 0.87 - width * 0.35)
+                    summary = text_utils.truncate_text(event.get('summary', ''), normal_font, text_width)
                     
                     draw.text(
                         (float(width * 0.35), float(event_y + event_height/2 - 2)),
@@ -1918,8 +1938,7 @@ class ICalendar(BasePlugin):
                     # Draw location if available
                     location = event.get('location', '')
                     if location:
-                        if len(location) > 35:  # Truncate long locations
-                            location = location[:32] + "..."
+                        location = text_utils.truncate_text(location, small_font, text_width)
                         
                         draw.text(
                             (float(width * 0.35), float(event_y + event_height/2 + 15)),
@@ -0,0 +1,129 @@
+import logging
+import re
+from datetime import date, timedelta
+from icalendar.prop import vDuration
+
+logger = logging.getLogger(__name__)
+
+# events are compared by date only, so allow for the time zone of their times
+DATE_MARGIN = timedelta(days=1)
+
+DATE_PATTERN = re.compile(rb"(\d{4})(\d{2})(\d{2})")
+UNTIL_PATTERN = re.compile(rb"UNTIL=(\d{8})", re.IGNORECASE)
+
+def filter_window(lines, start, end):
+    """Returns the lines of an ICS feed without the events that can't occur in [start, end).
+
+    The feed is read one line at a time and each VEVENT is buffered until it ends, then kept or discarded,
+    so only the events in the window are held in memory, e.g. when reading response.iter_lines(). Kept are:
+        - non-recurring events overlapping the window
+        - recurring masters (RRULE or RDATE) that aren't over before the window or starting after it
+        - overrides (RECURRENCE-ID) that move an occurrence into or out of the window
+    Every other component (e.g. VTIMEZONE) is kept.
+
+    Args:
+        lines: Iterable of the raw lines of the feed as bytes, e.g. a binary file or response.iter_lines()
+        start: Start of the window, a date or datetime
+        end: End of the window, a date or datetime
+    """
+    window_start = _to_date(start) - DATE_MARGIN
+    window_end = _to_date(end) + DATE_MARGIN
+
+    kept = []
+    event = None
+    depth = 0
+    total = 0
+    for line in _unfold(lines):
+        name = _get_name(line)
+        if event is None:
+            if name == b"BEGIN" and line.partition(b":")[2].strip().upper() == b"VEVENT":
+                event = {"lines": [line], "properties": {}}
+                depth = 1
+            else:
+                kept.append(line)
+            continue
+
+        event["lines"].append(line)
+        if name == b"BEGIN":
+            depth += 1
+        elif name == b"END":
+            depth -= 1
+            if depth == 0:
+                total += 1
+                if _in_window(event["properties"], window_start, window_end):
+                    kept.extend(event["lines"])
+                event = None
+        elif depth == 1:
+            # only the properties of the event itself, not of its alarms
+            event["properties"].setdefault(name, line)
+
+    logger.debug(f"Kept {len(kept)} lines and skipped {total} events outside of {window_start} - {window_end}")
+    return kept
+
+def _unfold(lines):
+    """Yields the logical lines of the feed, joining lines folded onto a continuation starting with a space."""
+    current = None
+    for line in lines:
+        line = line.rstrip(b"\r\n")
+        if line[:1] in (b" ", b"\t") and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+def _get_name(line):
+    """Returns the upper case property name of a content line, e.g. DTSTART for DTSTART;TZID=...:..."""
+    end = len(line)
+    for separator in (b":", b";"):
+        index = line.find(separator)
+        if index != -1:
+            end = min(end, index)
+    return line[:end].strip().upper()
+
+def _get_value(line):
+    return line.partition(b":")[2].strip()
+
+def _get_date(line):
+    match = DATE_PATTERN.match(_get_value(line)) if line else None
+    if not match:
+        return None
+    try:
+        return date(*(int(group) for group in match.groups()))
+    except ValueError:
+        return None
+
+def _to_date(value):
+    return value.date() if hasattr(value, "date") else value
+
+def _in_window(properties, window_start, window_end):
+    event_start = _get_date(properties.get(b"DTSTART"))
+    if event_start is None:
+        # can't tell, let the full parser decide
+        return True
+
+    if b"RECURRENCE-ID" in properties:
+        recurrence_date = _get_date(properties[b"RECURRENCE-ID"])
+        if recurrence_date and window_start <= recurrence_date <= window_end:
+            return True
+
+    if b"RRULE" in properties or b"RDATE" in properties:
+        if event_start > window_end:
+            return False
+        until = UNTIL_PATTERN.search(_get_value(properties.get(b"RRULE", b"")))
+        if until and b"RDATE" not in properties:
+            until_date = _get_date(b":" + until.group(1))
+            return until_date is None or until_date >= window_start
+        return True
+
+    event_end = _get_date(properties.get(b"DTEND"))
+    if event_end is None and b"DURATION" in properties:
+        try:
+            event_end = event_start + vDuration.from_ical(_get_value(properties[b"DURATION"]).decode("ascii"))
+        except (ValueError, UnicodeDecodeError):
+            return True
+    if event_end is None:
+        event_end = event_start
+    return event_start <= window_end and event_end >= window_start
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import threading
+from datetime import datetime
+from PIL import Image
+from utils import image_store
+from utils.app_utils import resolve_path
+
+logger = logging.getLogger(__name__)
+
+# metadata of every uploaded image, so slideshow ordering never has to open the image files
+INDEX_FILE = resolve_path(os.path.join("static", "images", "album_index.json"))
+
+ORDERINGS = ["upload", "shuffle", "date", "best-fit"]
+
+# number of dominant colours kept per image
+DOMINANT_COLOURS = 4
+
+# EXIF tags
+EXIF_IFD = 0x8769
+EXIF_ORIENTATION = 0x0112
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_ORIGINAL = 0x9003
+
+_album_index = None
+_album_index_lock = threading.Lock()
+
+def get_album_index():
+    """Returns the album index shared by all Image Upload instances."""
+    global _album_index
+    with _album_index_lock:
+        if _album_index is None:
+            _album_index = AlbumIndex(INDEX_FILE)
+        return _album_index
+
+class AlbumIndex:
+    """Persistent index of image metadata: dimensions, EXIF orientation, capture date, dominant colours and
+    content hash. Entries are keyed on the image path and recomputed when its modification time or size changes.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.loaded_mtime = None
+        # paths queued for background indexing
+        self.indexing = set()
+
+    def update(self, image_paths):
+        """Indexes the images that are new or changed since they were last indexed and returns their entries.
+
+        Images are read without holding the lock, so ordering a slideshow never waits for them.
+        """
+        with self.lock:
+            self._reload()
+            known = dict(self.entries)
+
+        changed = {}
+        removed = []
+        for image_path in image_paths:
+            try:
+                stat = os.stat(image_path)
+            except OSError:
+                removed.append(image_path)
+                continue
+            entry = known.get(image_path)
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                continue
+            try:
+                changed[image_path] = self._read_metadata(image_path, stat)
+            except Exception as e:
+                logger.error(f"Failed to index image {image_path}: {str(e)}")
+
+        with self.lock:
+            if changed or any(path in known for path in removed):
+                self._reload()
+                self.entries.update(changed)
+                # drop images that were deleted, e.g. by the upload garbage collection
+                for path in [path for path in self.entries if not os.path.exists(path)]:
+                    del self.entries[path]
+                self._write()
+            return {path: self.entries[path] for path in image_paths if path in self.entries}
+
+    def update_in_background(self, image_paths):
+        """Indexes the images in a background thread, e.g. right after they were uploaded."""
+        with self.lock:
+            image_paths = [path for path in image_paths if path not in self.indexing]
+            self.indexing.update(image_paths)
+        if not image_paths:
+            return
+        thread = threading.Thread(target=self._update_queued, args=(image_paths,), name="AlbumIndex", daemon=True)
+        thread.start()
+
+    def _update_queued(self, image_paths):
+        try:
+            self.update(image_paths)
+        finally:
+            with self.lock:
+                self.indexing.difference_update(image_paths)
+
+    def get(self, image_path):
+        with self.lock:
+            return self.entries.get(image_path)
+
+    def order(self, image_paths, ordering="upload", panel_size=None, seed=None):
+        """Returns the image paths in the given ordering, using only indexed metadata.
+
+        The image files are never opened or stat'ed here. Images missing from the index (e.g. uploaded before
+        it existed) are queued for background indexing and placed last until they are indexed.
+
+        Args:
+            image_paths: Paths in upload order
+            ordering: One of ORDERINGS
+                - "upload": The order the images were uploaded in
+                - "shuffle": A random order, stable for the same seed
+                - "date": Oldest capture date first, images without one by modification time
+                - "best-fit": Images closest to the aspect ratio of the panel first
+            panel_size: Tuple of (width, height), required for "best-fit"
+            seed: Seed of the "shuffle" ordering
+        """
+        with self.lock:
+            self._reload()
+            entries = {path: self.entries[path] for path in image_paths if path in self.entries}
+        missing = [path for path in image_paths if path not in entries]
+        if missing:
+            self.update_in_background(missing)
+
+        if ordering == "shuffle":
+            ordered = list(image_paths)
+            random.Random(seed).shuffle(ordered)
+            return ordered
+        if ordering == "date":
+            def date_key(path):
+                entry = entries.get(path)
+                if not entry:
+                    return (1, "")
+                return (0, entry.get("captured") or entry.get("modified") or "")
+            return sorted(image_paths, key=date_key)
+        if ordering == "best-fit" and panel_size:
+            panel_ratio = panel_size[0] / panel_size[1]
+            def fit_key(path):
+                entry = entries.get(path)
+                if not entry:
+                    return math.inf
+                return abs(math.log((entry["width"] / entry["height"]) / panel_ratio))
+            return sorted(image_paths, key=fit_key)
+        return list(image_paths)
+
+    def _read_metadata(self, image_path, stat):
+        with Image.open(image_path) as image:
+            width, height = image.size
+            exif = image.getexif()
+            orientation = exif.get(EXIF_ORIENTATION, 1)
+            # orientations 5-8 are rotated by 90 degrees, so the displayed image is transposed
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            captured = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+            colours = self._get_dominant_colours(image)
+
+        return {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "width": width,
+            "height": height,
+            "orientation": orientation,
+            "captured": self._parse_exif_date(captured),
+            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "colours": colours,
+            "content_hash": image_store.get_content_hash(image_path) or self._hash_file(image_path)
+        }
+
+    @staticmethod
+    def _get_dominant_colours(image):
+        """Returns the most common colours of the image as hex strings, most common first."""
+        # a thumbnail is plenty, and JPEGs can be decoded straight at that size
+        image.draft("RGB", (64, 64))
+        thumbnail = image.convert("RGB")
+        thumbnail.thumbnail((64, 64))
+        quantized = thumbnail.quantize(colors=DOMINANT_COLOURS)
+        palette = quantized.getpalette()
+        colours = sorted(quantized.getcolors(), reverse=True)
+        return ["#{:02x}{:02x}{:02x}".format(*palette[index * 3:index * 3 + 3]) for _, index in colours]
+
+    @staticmethod
+    def _parse_exif_date(value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(str(value).strip("\x00 "), "%Y:%m:%d %H:%M:%S").isoformat()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _hash_file(image_path):
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _reload(self):
+        """Reads the index file if another process (e.g. a plugin worker) wrote it since it was last read."""
+        try:
+            mtime = os.stat(self.index_file).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self.loaded_mtime:
+            return
+        try:
+            with open(self.index_file) as f:
+                self.entries = json.load(f)
+            self.loaded_mtime = mtime
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Failed to read album index {self.index_file}: {str(e)}")
+
+    def _write(self):
+        index_dir = os.path.dirname(self.index_file)
+        fd, tmp_path = tempfile.mkstemp(prefix=".album_index.", suffix=".json.tmp", dir=index_dir)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.entries, f)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.index_file)
+            self.loaded_mtime = os.stat(self.index_file).st_mtime_ns
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import tempfile
+import threading
+from PIL import Image, ImageOps
+from utils.app_utils import resolve_path
+from utils import image_store
+from utils.image_utils import open_image, resize_image
+
+logger = logging.getLogger(__name__)
+
+# panel-ready copies of uploaded images, one per display size and image settings
+DERIVED_DIR = resolve_path(os.path.join("static", "images", "derived"))
+
+_worker = None
+_worker_lock = threading.Lock()
+
+_preloaded = {}
+_preload_lock = threading.Lock()
+
+def get_derivative_path(image_path, dimensions, image_settings):
+    """Returns the path of the derivative of an image for the given dimensions and image settings.
+
+    Uploads in the image store are keyed on their content hash. Other files are keyed on their path, modification
+    time and size, so replacing a file invalidates its derivatives.
+    """
+    content_hash = image_store.get_content_hash(image_path)
+    if content_hash:
+        source_key = [content_hash]
+    else:
+        stat = os.stat(image_path)
+        source_key = [os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size]
+    key = json.dumps(source_key + [list(dimensions), list(image_settings)])
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    # derivatives are named after their source so they can be removed along with it
+    name = content_hash or os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(DERIVED_DIR, f"{name}-{digest}.png")
+
+def find_derivative(image_path, dimensions, image_settings):
+    """Returns the path of the derivative if it was already generated, otherwise None."""
+    try:
+        path = get_derivative_path(image_path, dimensions, image_settings)
+    except OSError:
+        return None
+    return path if os.path.isfile(path) else None
+
+def load_image(image_path, dimensions, image_settings):
+    """Decodes an upload, applies its EXIF orientation and resizes it for the display."""
+    # decode just enough pixels for the display (and zoom)
+    scale = 1.0
+    for setting in image_settings:
+        if setting.startswith("zoom-"):
+            try:
+                scale = max(1.0, float(setting.split("-")[1]) / 100)
+            except ValueError:
+                pass
+    target_size = (math.ceil(dimensions[0] * scale), math.ceil(dimensions[1] * scale))
+
+    # the image is fitted and may be rotated, so cover the display in either orientation
+    image = open_image(image_path, target_size, any_orientation=True)
+    logger.info(f"Original image dimensions: {image.size}")
+    image = ImageOps.exif_transpose(image)
+    return resize_image(image, dimensions, image_settings)
+
+def create_derivative(image_path, dimensions, image_settings):
+    """Generates the derivative of an image for the given dimensions and image settings and returns its path."""
+    path = get_derivative_path(image_path, dimensions, image_settings)
+    if os.path.isfile(path):
+        return path
+
+    image = load_image(image_path, dimensions, image_settings)
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+    # write under a temporary name so a partially written derivative is never served
+    fd, tmp_path = tempfile.mkstemp(suffix=".png.tmp", dir=DERIVED_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format="PNG")
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"Generated derivative {path} for {image_path}")
+    return path
+
+def queue_derivatives(image_path, specs):
+    """Queues generating the derivatives of an image in the background.
+
+    Args:
+        image_path: Path of the uploaded image
+        specs: List of (dimensions, image_settings) tuples
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = DerivativeWorker()
+        _worker.submit(image_path, specs)
+
+def preload_derivative(path):
+    """Decodes a derivative in the background so the next generate_image call finds it in memory."""
+    with _preload_lock:
+        if path in _preloaded:
+            return
+    thread = threading.Thread(target=_preload, args=(path,), name="PreloadDerivative", daemon=True)
+    thread.start()
+
+def take_preloaded(path):
+    """Returns the preloaded image for a derivative path, or None if it wasn't preloaded."""
+    with _preload_lock:
+        return _preloaded.pop(path, None)
+
+def _preload(path):
+    try:
+        image = Image.open(path)
+        image.load()
+    except Exception as e:
+        logger.warning(f"Failed to preload derivative {path}: {str(e)}")
+        return
+    with _preload_lock:
+        # only the upcoming image is kept in memory
+        _preloaded.clear()
+        _preloaded[path] = image
+
+class DerivativeWorker:
+    """Background thread generating derivatives of uploaded images, one at a time."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="DerivativeWorker", daemon=True)
+        self.thread.start()
+
+    def submit(self, image_path, specs):
+        for dimensions, image_settings in specs:
+            key = (image_path, tuple(dimensions), tuple(image_settings))
+            with self.lock:
+                if key in self.pending:
+                    continue
+                self.pending.add(key)
+            self.queue.put(key)
+
+    def _run(self):
+        while True:
+            key = self.queue.get()
+            image_path, dimensions, image_settings = key
+            try:
+                create_derivative(image_path, dimensions, image_settings)
+            except Exception as e:
+                logger.error(f"Failed to generate derivative of {image_path}: {str(e)}")
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
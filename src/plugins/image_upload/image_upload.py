@@ -2,7 +2,9 @@ from plugins.base_plugin.base_plugin import BasePlugin
 from PIL import Image
 from io import BytesIO
 import logging
-from utils.image_utils import resize_image
+import random
+from plugins.image_upload import derivatives, album_index
+from utils import image_store
 import time
 from datetime import datetime, timedelta
 
@@ -55,17 +57,77 @@ class ImageUpload(BasePlugin):
         if not image_locations:
             raise RuntimeError("No images provided.")
         
-        # Collect display settings
-        image_settings = ["preserve-aspect"]  # Always preserve aspect ratio
-        
         # Get display orientation
         device_orientation = device_config.get_config("orientation", "horizontal")
-        
+        dimensions, image_settings = self.get_display_settings(settings, device_config, device_orientation)
+
+        # order the slideshow from the album index, without opening the image files
+        ordering = settings.get("imageOrder", "upload")
+        if ordering != "upload":
+            if ordering == "shuffle":
+                # reshuffle whenever the slideshow starts a new round
+                if "shuffle_seed" not in settings or (img_index == 0 and settings.get("shuffle_position", 0) != 0):
+                    settings["shuffle_seed"] = random.randrange(2 ** 32)
+                settings["shuffle_position"] = img_index
+            image_locations = album_index.get_album_index().order(
+                image_locations, ordering, panel_size=dimensions, seed=settings.get("shuffle_seed"))
+
+        image_path = image_locations[img_index]
+        try:
+            logger.info(f"Display dimensions: {dimensions}")
+            logger.info(f"Device orientation: {device_orientation}")
+            logger.info(f"Image settings: {image_settings}")
+
+            # serve the derivative generated at upload time, falling back to processing the original
+            derivative_path = derivatives.find_derivative(image_path, dimensions, image_settings)
+            if derivative_path:
+                image = derivatives.take_preloaded(derivative_path) or Image.open(derivative_path)
+                logger.info(f"Using derivative {derivative_path}")
+            else:
+                image = derivatives.load_image(image_path, dimensions, image_settings)
+                derivatives.queue_derivatives(image_path, [(dimensions, image_settings)])
+
+            # Only increment the image index if timer is not enabled
+            if settings.get("timerEnabled") != "true":
+                settings['image_index'] = (img_index + 1) % len(image_locations)
+
+            # decode the next image of the slideshow while this one is displayed
+            next_path = image_locations[(img_index + 1) % len(image_locations)]
+            next_derivative = derivatives.find_derivative(next_path, dimensions, image_settings)
+            if next_derivative and next_derivative != derivative_path:
+                derivatives.preload_derivative(next_derivative)
+            return image
+        except Exception as e:
+            logger.error(f"Failed to read image file: {str(e)}")
+            raise RuntimeError(f"Failed to read image file: {str(e)}")
+
+    def generate_settings_template(self):
+        template_params = super().generate_settings_template()
+        # uploads are stored by content hash, show the names they were uploaded with
+        template_params['upload_names'] = image_store.get_names()
+        return template_params
+
+    def on_settings_saved(self, settings, device_config):
+        """Queues the derivatives of the uploaded images for both display orientations."""
+        image_locations = settings.get("imageFiles[]") or []
+        specs = []
+        for orientation in ("horizontal", "vertical"):
+            spec = self.get_display_settings(settings, device_config, orientation)
+            if spec not in specs:
+                specs.append(spec)
+        for image_path in image_locations:
+            derivatives.queue_derivatives(image_path, specs)
+        album_index.get_album_index().update_in_background(image_locations)
+
+    @staticmethod
+    def get_display_settings(settings, device_config, device_orientation):
+        """Returns the dimensions and image_settings images are resized with for the given orientation."""
+        # Collect display settings
+        image_settings = ["preserve-aspect"]  # Always preserve aspect ratio
+
         # Get display dimensions
-        dimensions = device_config.get_resolution()
-        # Store original dimensions (make a copy for logging)
-        original_dimensions = tuple(dimensions) if isinstance(dimensions, list) else dimensions
-        
+        dimensions = tuple(device_config.get_resolution())
+
         # Check if portrait mode should be applied
         portrait_mode_enabled = settings.get("portraitMode") == "true"
         
@@ -100,25 +162,4 @@ class ImageUpload(BasePlugin):
         center_y = settings.get("centerY")
         if center_x and center_y:
             image_settings.append(f"center-{center_x},{center_y}")
-            
-        # Open the image using Pillow
-        try:
-            image = Image.open(image_locations[img_index])
-            
-            # Log dimensions for debugging
-            logger.info(f"Original image dimensions: {image.size}")
-            logger.info(f"Display dimensions: {dimensions}")
-            logger.info(f"Portrait mode enabled: {portrait_mode_enabled}")
-            logger.info(f"Device orientation: {device_orientation}")
-            logger.info(f"Image settings: {image_settings}")
-            
-            # Use resize_image with our collected settings
-            image = resize_image(image, dimensions, image_settings)
-            
-            # Only increment the image index if timer is not enabled
-            if settings.get("timerEnabled") != "true":
-                settings['image_index'] = (img_index + 1) % len(image_locations)
-            return image
-        except Exception as e:
-            logger.error(f"Failed to read image file: {str(e)}")
-            raise RuntimeError(f"Failed to read image file: {str(e)}")
\ No newline at end of file
+        return dimensions, image_settings
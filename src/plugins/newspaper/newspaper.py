@@ -22,10 +22,15 @@ class Newspaper(BasePlugin):
         # check the next day, then today, then prior day
         days = [today + timedelta(days=diff) for diff in [1,0,-1,-2]]
 
+        # the front pages are far larger than the display, decode them at display size
+        dimensions = device_config.get_resolution()
+        if device_config.get_config("orientation") == "vertical":
+            dimensions = dimensions[::-1]
+
         image = None
         for date in days:
             image_url = FREEDOM_FORUM_URL.format(date.day, newspaper_slug)
-            image = get_image(image_url)
+            image = get_image(image_url, target_size=dimensions)
             if image:
                 logging.info(f"Found {newspaper_slug} front cover for {date.strftime('%Y-%m-%d')}")
                 break
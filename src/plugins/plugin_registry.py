@@ -49,4 +49,12 @@ def get_plugin_instance(plugin_config):
         # Initialize the plugin with its configuration
         return plugin_class
     else:
-        raise ValueError(f"Plugin '{plugin_id}' is not registered.")
\ No newline at end of file
+        raise ValueError(f"Plugin '{plugin_id}' is not registered.")
+
+def notify_settings_saved(device_config, plugin_id, settings):
+    """Lets the plugin prepare for the saved settings of an instance. Failures are logged, not raised."""
+    try:
+        plugin = get_plugin_instance(device_config.get_plugin(plugin_id) or {})
+        plugin.on_settings_saved(settings, device_config)
+    except Exception as e:
+        logger.error(f"Failed to handle saved settings of plugin '{plugin_id}': {str(e)}")
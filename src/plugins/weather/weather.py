@@ -1,11 +1,17 @@
 from plugins.base_plugin.base_plugin import BasePlugin
 from PIL import Image
 import os
-import requests
+import json
 import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import pytz
 from io import BytesIO
+from utils.app_utils import resolve_path
+from plugins.weather import widget_renderer
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +35,75 @@ WEATHER_URL = "https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lo
 AIR_QUALITY_URL = "http://api.openweathermap.org/data/2.5/air_pollution?lat={lat}&lon={long}&appid={api_key}"
 GEOCODING_URL = "http://api.openweathermap.org/geo/1.0/reverse?lat={lat}&lon={long}&limit=1&appid={api_key}"
 
+# decimal places coordinates are rounded to for the caches, about 100m
+COORDINATE_PRECISION = 3
+
+AQI_CACHE_TTL_SECONDS = 15 * 60
+
+LOCATION_CACHE_FILE = resolve_path(os.path.join("cache", "weather_locations.json"))
+
+# "native" draws the dashboard with PIL (see widget_renderer), "html" renders weather.html in the browser
+DEFAULT_RENDER_BACKEND = "html"
+
+def get_coordinates_key(lat, long):
+    return f"{round(float(lat), COORDINATE_PRECISION)},{round(float(long), COORDINATE_PRECISION)}"
+
+class TTLCache:
+    """In-memory cache whose entries expire after ttl_seconds."""
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl_seconds:
+                return entry[1]
+            self.entries.pop(key, None)
+            return None
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+
+class LocationCache:
+    """Reverse geocoding results persisted in a JSON file, keyed by rounded coordinates."""
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self._load().get(key)
+
+    def set(self, key, value):
+        with self.lock:
+            self._load()[key] = value
+            try:
+                os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(self.cache_file))
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp_path, self.cache_file)
+            except OSError as e:
+                logger.warning(f"Failed to write location cache {self.cache_file}: {str(e)}")
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.cache_file) as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self.entries = {}
+        return self.entries
+
+_aqi_cache = TTLCache(AQI_CACHE_TTL_SECONDS)
+_location_cache = LocationCache(LOCATION_CACHE_FILE)
+
 class Weather(BasePlugin):
     def generate_settings_template(self):
         template_params = super().generate_settings_template()
@@ -55,9 +130,7 @@ class Weather(BasePlugin):
         if not units or units not in ['metric', 'imperial', 'standard']:
             raise RuntimeError("Units are required.")
 
-        weather_data = self.get_weather_data(api_key, units, lat, long)
-        aqi_data = self.get_air_quality(api_key, lat, long)
-        location_data = self.get_location(api_key, lat, long)
+        weather_data, aqi_data, location_data = self.fetch_all(api_key, units, lat, long)
 
         dimensions = device_config.get_resolution()
         if device_config.get_config("orientation") == "vertical":
@@ -69,8 +142,13 @@ class Weather(BasePlugin):
 
         template_params["plugin_settings"] = settings
 
-        image = self.render_image(dimensions, "weather.html", "weather.css", template_params)
+        direct_render = settings.get('renderBackend', DEFAULT_RENDER_BACKEND) == "native"
+        image = self.render_image(dimensions, "weather.html", "weather.css", template_params,
+                                  direct_render=direct_render)
         return image
+
+    def render_direct(self, dimensions, params):
+        return widget_renderer.render_dashboard(dimensions, params)
     
     def parse_weather_data(self, weather_data, aqi_data, location_data, tz, units):
         current = weather_data.get("current")
@@ -219,9 +297,34 @@ class Weather(BasePlugin):
 
         return data_points
 
+    def fetch_all(self, api_key, units, lat, long):
+        """Fetches the forecast, air quality and location concurrently, skipping the calls that are cached.
+
+        The location of a coordinate never changes, so it is cached on disk. Air quality is cached for
+        AQI_CACHE_TTL_SECONDS, independently of the forecast which is fetched on every refresh.
+        """
+        key = get_coordinates_key(lat, long)
+        aqi_data = _aqi_cache.get(key)
+        location_data = _location_cache.get(key)
+
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="weather") as executor:
+            weather_future = executor.submit(self.get_weather_data, api_key, units, lat, long)
+            aqi_future = executor.submit(self.get_air_quality, api_key, lat, long) if aqi_data is None else None
+            location_future = executor.submit(self.get_location, api_key, lat, long) if location_data is None else None
+
+            weather_data = weather_future.result()
+            if aqi_future:
+                aqi_data = aqi_future.result()
+                _aqi_cache.set(key, aqi_data)
+            if location_future:
+                location_data = location_future.result()
+                _location_cache.set(key, location_data)
+
+        return weather_data, aqi_data, location_data
+
     def get_weather_data(self, api_key, units, lat, long):
         url = WEATHER_URL.format(lat=lat, long=long, units=units, api_key=api_key)
-        response = requests.get(url)
+        response = self.http_get(url)
         if not 200 <= response.status_code < 300:
             logging.error(f"Failed to retrieve weather data: {response.content}")
             raise RuntimeError("Failed to retrieve weather data.")
@@ -230,7 +333,7 @@ class Weather(BasePlugin):
     
     def get_air_quality(self, api_key, lat, long):
         url = AIR_QUALITY_URL.format(lat=lat, long=long, api_key=api_key)
-        response = requests.get(url)
+        response = self.http_get(url)
 
         if not 200 <= response.status_code < 300:
             logging.error(f"Failed to get air quality data: {response.content}")
@@ -240,7 +343,7 @@ class Weather(BasePlugin):
     
     def get_location(self, api_key, lat, long):
         url = GEOCODING_URL.format(lat=lat, long=long, api_key=api_key)
-        response = requests.get(url)
+        response = self.http_get(url)
 
         if not 200 <= response.status_code < 300:
             logging.error(f"Failed to get location: {response.content}")
@@ -0,0 +1,402 @@
+import logging
+import math
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageOps
+from utils.app_utils import get_font, get_text_bbox, get_text_length
+from utils import text_utils
+
+logger = logging.getLogger(__name__)
+
+# Rows of the dashboard, top to bottom, as (widget, height as a fraction of the screen height, setting that
+# enables it). The row without a height takes the space left by the others, like the flex layout of weather.css.
+LAYOUT = [
+    ("header", 0.15, None),
+    ("today", None, None),
+    ("chart", 0.16, "displayGraph"),
+    ("forecast", 0.22, "displayForecast"),
+]
+
+# gap between the rows, as a fraction of the screen height
+ROW_GAP = 0.01
+
+# scaled icons kept in memory, one per icon and size
+ICON_CACHE_SIZE = 64
+
+# points sampled along each segment of the smoothed temperature curve
+CURVE_STEPS = 12
+
+# curve tension of the temperature line, as in the chart of weather.html
+CURVE_TENSION = 0.5
+
+# at most this many hours are labelled under the chart
+MAX_CHART_LABELS = 12
+
+CHART_FONT_SIZE = 12
+CHART_TEXT_COLOR = (102, 102, 102)
+CHART_GRID_COLOR = (0, 0, 0, 25)
+TEMPERATURE_LINE_COLOR = (241, 122, 36)
+TEMPERATURE_FILL = ((252, 204, 5, 0.9), (252, 204, 5, 0.01))
+PRECIPITATION_LINE_COLOR = (26, 111, 176)
+PRECIPITATION_FILL = ((26, 111, 176, 0.9), (194, 223, 246, 0))
+
+@lru_cache(maxsize=ICON_CACHE_SIZE)
+def get_icon(path, size):
+    """Returns an icon scaled to fit in size (width, height), keeping its aspect ratio.
+
+    Icons are decoded and scaled once per size, so refreshes at the same resolution reuse them.
+    Returns None if the icon can't be loaded.
+    """
+    width, height = (max(1, int(value)) for value in size)
+    try:
+        with Image.open(path) as icon:
+            return ImageOps.contain(icon.convert("RGBA"), (width, height), Image.LANCZOS)
+    except Exception as e:
+        logger.warning(f"Failed to load weather icon {path}: {str(e)}")
+        return None
+
+def render_dashboard(dimensions, params):
+    """Draws the weather dashboard of weather.html with PIL."""
+    return WidgetRenderer(dimensions, params).render()
+
+class WidgetRenderer:
+    """Native renderer of the weather dashboard.
+
+    The rows of LAYOUT are sized first, then each row is drawn by the _draw_<widget> method of its widget,
+    with sizes relative to the screen and its box the way weather.css sizes them.
+    """
+
+    def __init__(self, dimensions, params):
+        self.width, self.height = dimensions
+        self.params = params
+        self.settings = params.get("plugin_settings", {})
+        self.image, self.box, self.text_color = text_utils.create_styled_canvas(dimensions, self.settings)
+        self.draw = ImageDraw.Draw(self.image, "RGBA")
+        # weather.css switches to the pixel font on small screens
+        self.font_name = "Dogica" if self.width <= 250 else "Jost"
+        self.degree = "" if params.get("units") == "standard" else "°"
+
+    def render(self):
+        for widget, box in self.get_rows():
+            getattr(self, f"_draw_{widget}")(box)
+        return self.image
+
+    def get_rows(self):
+        """Returns the (widget, box) of every enabled row of LAYOUT."""
+        left, top, right, bottom = self.box
+        rows = [(widget, height) for widget, height, setting in LAYOUT
+                if setting is None or self.settings.get(setting) == "true"]
+
+        gap = self.height * ROW_GAP
+        fixed = sum(self.height * height for _, height in rows if height is not None)
+        flexible = max(0, (bottom - top) - fixed - gap * (len(rows) - 1))
+
+        boxes = []
+        y = top
+        for widget, height in rows:
+            row_height = flexible if height is None else self.height * height
+            boxes.append((widget, (left, y, right, y + row_height)))
+            y += row_height + gap
+        return boxes
+
+    def _font(self, size, weight="normal"):
+        return get_font(self.font_name, max(1, round(size)), weight)
+
+    def _draw_header(self, box):
+        left, top, right, bottom = box
+        width, height = right - left, bottom - top
+        center = (left + right) / 2
+
+        date_font = self._font(min(height * 0.3, width * 0.06))
+        date = text_utils.truncate_text(self.params.get("current_date", ""), date_font, width)
+        self.draw.text((center, bottom), date, font=date_font, fill=self.text_color, anchor="md")
+
+        location_font = self._font(min(height * 0.5, width * 0.08), "bold")
+        location = text_utils.truncate_text(self.params.get("location", ""), location_font, width)
+        location_bottom = bottom + get_text_bbox(date_font, date, anchor="md")[1]
+        self.draw.text((center, location_bottom), location, font=location_font, fill=self.text_color, anchor="md")
+
+    def _draw_today(self, box):
+        left, top, right, bottom = box
+        width = right - left
+        data_points = self.params.get("data_points", [])
+        if self.settings.get("displayMetrics") != "true":
+            data_points = []
+
+        aspect = self.width / self.height
+        if aspect <= 1:
+            # portrait: the metrics go under the current weather, on two rows of fixed height
+            if data_points:
+                columns = 3 if aspect <= 0.5 else 4
+                rows = math.ceil(len(data_points) / columns)
+                gap = self.height * 0.01
+                points_height = rows * self.height * 0.07 + (rows - 1) * self.height * 0.005
+                points_top = bottom - points_height
+                self._draw_data_points((left, points_top, right, bottom), data_points, columns)
+                bottom = points_top - gap
+            self._draw_current((left, top, right, bottom))
+            return
+
+        center = (left + right) / 2
+        if data_points:
+            self._draw_current((left, top, center, bottom))
+            self._draw_data_points((center, top, right, bottom), data_points, 3 if aspect >= 2 else 2)
+        else:
+            self._draw_current((center - width / 4, top, center + width / 4, bottom))
+
+    def _draw_current(self, box):
+        left, top, right, bottom = box
+        padding = self.width * 0.02
+        left, right = left + padding, right - padding
+        middle = (left + right) / 2
+        height = bottom - top
+
+        icon = get_icon(self.params.get("current_day_icon"), ((middle - left) * 0.9, height))
+        if icon:
+            self.image.paste(icon, (round(middle - icon.width), round(top + (height - icon.height) / 2)), icon)
+
+        # sizes relative to the smaller side of the text box, like cqmin in weather.css
+        size = min(right - middle, height)
+        temperature_font = self._font(size * 0.45)
+        unit_font = self._font(temperature_font.size * 0.4)
+        feels_like_font = self._font(size * 0.1)
+
+        text_center = (middle + right) / 2
+        temperature_height = height * 0.55
+        baseline = top + temperature_height
+        temperature = self.params.get("current_temperature", "")
+        self.draw.text((text_center, baseline), temperature, font=temperature_font, fill=self.text_color,
+                       anchor="ms")
+        # the unit is placed after the temperature without moving it off center, as a superscript
+        unit_left = text_center + get_text_length(temperature_font, temperature) / 2
+        unit_top = baseline - temperature_font.size * 0.75
+        self.draw.text((unit_left, unit_top), self.params.get("temperature_unit", ""), font=unit_font,
+                       fill=self.text_color, anchor="la")
+
+        feels_like = f"Ressenti {self.params.get('feels_like', '')}{self.degree}"
+        feels_like = text_utils.truncate_text(feels_like, feels_like_font, right - middle)
+        self.draw.text((text_center, baseline + feels_like_font.size * 0.3), feels_like, font=feels_like_font,
+                       fill=self.text_color, anchor="ma")
+
+    def _draw_data_points(self, box, data_points, columns):
+        left, top, right, bottom = box
+        rows = math.ceil(len(data_points) / columns)
+        column_gap, row_gap = self.width * 0.01, self.height * 0.005
+        cell_width = (right - left - column_gap * (columns - 1)) / columns
+        cell_height = (bottom - top - row_gap * (rows - 1)) / rows
+
+        for index, data_point in enumerate(data_points):
+            row, column = divmod(index, columns)
+            cell_left = left + column * (cell_width + column_gap)
+            cell_top = top + row * (cell_height + row_gap)
+            self._draw_data_point((cell_left, cell_top, cell_left + cell_width, cell_top + cell_height), data_point)
+
+    def _draw_data_point(self, box, data_point):
+        left, top, right, bottom = box
+        width, height = right - left, bottom - top
+
+        icon_width = width * 0.25
+        icon = get_icon(data_point.get("icon"), (icon_width, height * 0.8))
+        if icon:
+            self.image.paste(icon, (round(left + (icon_width - icon.width) / 2),
+                                    round(top + (height - icon.height) / 2)), icon)
+
+        data_left = left + icon_width
+        data_width = width - icon_width
+        data_center = data_left + data_width / 2
+
+        label_font = self._font(min(height * 0.32, data_width * 0.15))
+        label = text_utils.truncate_text(str(data_point.get("label", "")), label_font, data_width)
+        self.draw.text((data_center, top + height * 0.15), label, font=label_font, fill=self.text_color,
+                       anchor="mm")
+
+        measurement_font = self._font(min(height * 0.46, data_width * 0.26), "bold")
+        unit_font = self._font(measurement_font.size * 0.6)
+        measurement = str(data_point.get("measurement", ""))
+        unit = data_point.get("unit") or ""
+        unit_gap = self.width * 0.002 if unit else 0
+        measurement_width = get_text_length(measurement_font, measurement)
+        total_width = measurement_width + unit_gap + get_text_length(unit_font, unit)
+
+        # the measurement and its unit share a baseline, centered together in the lower 70% of the cell
+        x = data_center - total_width / 2
+        baseline = top + height * 0.65 + measurement_font.size * 0.35
+        self.draw.text((x, baseline), measurement, font=measurement_font, fill=self.text_color, anchor="ls")
+        if unit:
+            self.draw.text((x + measurement_width + unit_gap, baseline), unit, font=unit_font,
+                           fill=self.text_color, anchor="ls")
+
+    def _draw_chart(self, box):
+        hourly = self.params.get("hourly_forecast", [])
+        if not hourly:
+            return
+        left, top, right, bottom = (round(value) for value in box)
+        # labels keep the size of weather.html unless the chart is too short for them
+        font = self._font(max(6, min(CHART_FONT_SIZE, (bottom - top) / 4)))
+
+        temperatures = np.array([hour.get("temperature", 0) for hour in hourly], dtype=float)
+        precipitation = np.array([hour.get("precipitiation") or 0 for hour in hourly], dtype=float) * 100
+
+        min_temperature, max_temperature = temperatures.min(), temperatures.max()
+        if max_temperature - min_temperature < 5:
+            max_temperature += 5
+        # as many ticks as fit the height with some space between their labels
+        max_ticks = max(1, int((bottom - top - font.size * 2) // (font.size * 1.8)))
+        ticks = _get_ticks(min_temperature, max_temperature, max_ticks)
+        y_min, y_max = ticks[0], ticks[-1]
+
+        tick_labels = [f"{tick:g}{self.degree}" for tick in ticks]
+        axis_width = max(get_text_length(font, label) for label in tick_labels) + font.size * 0.5
+        plot_left, plot_right = left + round(axis_width), right
+        plot_top, plot_bottom = top + round(font.size / 2), bottom - round(font.size * 1.6)
+        plot_width, plot_height = plot_right - plot_left, plot_bottom - plot_top
+        if plot_width <= 0 or plot_height <= 0:
+            return
+
+        # pixel coordinates of every hour, computed for all hours at once
+        slot = plot_width / len(hourly)
+        xs = plot_left + (np.arange(len(hourly)) + 0.5) * slot
+        ys = plot_bottom - (temperatures - y_min) / (y_max - y_min) * plot_height
+        bar_tops = plot_bottom - np.clip(precipitation, 0, 100) / 100 * plot_height
+
+        label_y = None
+        for tick, label in zip(ticks, tick_labels):
+            y = plot_bottom - (tick - y_min) / (y_max - y_min) * plot_height
+            self.draw.line((plot_left, y, plot_right, y), fill=CHART_GRID_COLOR, width=1)
+            # on very short charts, only the labels that don't overlap the previous one
+            if label_y is None or label_y - y >= font.size:
+                self.draw.text((plot_left - font.size * 0.4, y), label, font=font, fill=CHART_TEXT_COLOR,
+                               anchor="rm")
+                label_y = y
+
+        # skip labels so they don't overlap, like the autoSkip of Chart.js
+        label_width = max(get_text_length(font, hour.get("time", "")) for hour in hourly) + font.size
+        step = max(math.ceil(len(hourly) / MAX_CHART_LABELS), math.ceil(label_width / slot))
+        for x, hour in zip(xs[::step], hourly[::step]):
+            self.draw.text((x, plot_bottom + font.size * 0.4), hour.get("time", ""), font=font,
+                           fill=CHART_TEXT_COLOR, anchor="ma")
+
+        # both fills fade from the highest to the lowest temperature, as the gradients of weather.html
+        gradient_start = plot_bottom - (max_temperature - y_min) / (y_max - y_min) * plot_height
+        gradient_end = plot_bottom - (min_temperature - y_min) / (y_max - y_min) * plot_height
+        plot = (plot_left, plot_top, plot_right, plot_bottom)
+        rows = np.arange(plot_top, plot_bottom)[:, None] + 0.5
+        columns = np.arange(plot_left, plot_right)[None, :] + 0.5
+
+        # precipitation bars take the full width of their hour, drawn under the temperature
+        bar_index = np.minimum(((columns - plot_left) / slot).astype(int), len(hourly) - 1)
+        bar_mask = (rows >= bar_tops[bar_index]) & (precipitation[bar_index] > 0)
+        self._fill_gradient(plot, bar_mask, PRECIPITATION_FILL, gradient_start, gradient_end)
+        for x, bar_top, value in zip(xs, bar_tops, precipitation):
+            if value > 0:
+                self.draw.line((x - slot / 2, bar_top, x + slot / 2, bar_top), fill=PRECIPITATION_LINE_COLOR,
+                               width=2)
+
+        curve_x, curve_y = _smooth_curve(xs, ys, CURVE_TENSION, CURVE_STEPS)
+        curve_y = np.clip(curve_y, plot_top, plot_bottom)
+        line_mask = (rows >= np.interp(columns, curve_x, curve_y)) & (columns >= xs[0]) & (columns <= xs[-1])
+        self._fill_gradient(plot, line_mask, TEMPERATURE_FILL, gradient_start, gradient_end + 10)
+        self.draw.line(list(zip(curve_x.tolist(), curve_y.tolist())), fill=TEMPERATURE_LINE_COLOR, width=2,
+                       joint="curve")
+
+    def _fill_gradient(self, box, mask, colors, gradient_start, gradient_end):
+        """Fills the masked pixels of a box with a vertical gradient between two RGBA colours (alpha 0 to 1)."""
+        left, top, right, bottom = box
+        start, end = np.array(colors[0], dtype=float), np.array(colors[1], dtype=float)
+        rows = np.arange(top, bottom) + 0.5
+        position = np.clip((rows - gradient_start) / max(gradient_end - gradient_start, 1), 0, 1)[:, None]
+        row_colors = start + (end - start) * position
+
+        layer = np.zeros((bottom - top, right - left, 4), dtype=np.uint8)
+        layer[..., :3] = row_colors[:, None, :3].round().astype(np.uint8)
+        layer[..., 3] = (row_colors[:, 3:4] * 255 * mask).round().astype(np.uint8)
+        overlay = Image.fromarray(layer, "RGBA")
+        self.image.paste(overlay, (left, top), overlay)
+
+    def _draw_forecast(self, box):
+        left, top, right, bottom = box
+        try:
+            days = int(self.settings.get("forecastDays") or 0)
+        except ValueError:
+            days = 0
+        forecast = self.params.get("forecast", [])[:days]
+        if not forecast:
+            return
+
+        width, height = right - left, bottom - top
+        gap = self.width * 0.015
+        padding_x, padding_y = self.width * 0.01, self.height * 0.01
+        name_font = self._font(min(self.height * 0.035, self.width * 0.035), "bold")
+        temperature_font = self._font(min(self.height * 0.03, self.width * 0.025))
+        spacing = self.height * 0.005
+
+        slot = (width - gap * (len(forecast) - 1)) / len(forecast)
+        text_height = 2 * padding_y + name_font.size + temperature_font.size * 1.2 + 2 * spacing
+        icon_size = max(1, min(height - text_height, self.width * 0.15, slot - 4 * padding_x))
+        # the days are only as tall as their content, centered in the row
+        top += (height - text_height - icon_size) / 2
+        bottom = top + text_height + icon_size
+        temperatures = [f"{day.get('high')}{self.degree} / {day.get('low')}{self.degree}" for day in forecast]
+        day_width = min(slot, max(icon_size + 4 * padding_x,
+                                  max(get_text_length(temperature_font, text) for text in temperatures)
+                                  + 2 * padding_x))
+        # space-evenly: the same space around every day and at both ends
+        space = (width - day_width * len(forecast)) / (len(forecast) + 1)
+        radius = max(1, round(self.width * 0.012))
+
+        for index, (day, temperature) in enumerate(zip(forecast, temperatures)):
+            day_left = left + space + index * (day_width + space)
+            day_right = day_left + day_width
+            center = (day_left + day_right) / 2
+            self.draw.rounded_rectangle((day_left, top, day_right, bottom), radius=radius, outline=self.text_color,
+                                        width=1)
+
+            y = top + padding_y
+            self.draw.text((center, y), day.get("day", ""), font=name_font, fill=self.text_color, anchor="ma")
+            y += name_font.size + spacing
+
+            icon = get_icon(day.get("icon"), (icon_size, icon_size))
+            if icon:
+                self.image.paste(icon, (round(center - icon.width / 2), round(y + (icon_size - icon.height) / 2)),
+                                 icon)
+            y += icon_size + spacing
+
+            temperature = text_utils.truncate_text(temperature, temperature_font, day_width - 2 * padding_x)
+            self.draw.text((center, y), temperature, font=temperature_font, fill=self.text_color, anchor="ma")
+
+def _get_ticks(low, high, max_ticks=5):
+    """Returns evenly spaced round values covering [low, high], e.g. 0, 5, 10, 15."""
+    span = max(high - low, 1)
+    magnitude = 10 ** math.floor(math.log10(span / max_ticks))
+    step = next(magnitude * factor for factor in (1, 2, 5, 10) if span / (magnitude * factor) <= max_ticks)
+    start = math.floor(low / step) * step
+    end = math.ceil(high / step) * step
+    return np.arange(start, end + step / 2, step)
+
+def _smooth_curve(xs, ys, tension, steps):
+    """Samples a cubic Bézier spline through the points, with control points placed like Chart.js does.
+
+    All segments are evaluated at once: the control points of every point come from its neighbours, and each
+    segment is sampled at the same steps. Returns the x and y coordinates of the sampled curve.
+    """
+    points = np.stack([xs, ys], axis=1)
+    if len(points) < 3:
+        return xs, ys
+
+    previous = np.vstack([points[:1], points[:-1]])
+    following = np.vstack([points[1:], points[-1:]])
+    distance_before = np.hypot(*(points - previous).T)
+    distance_after = np.hypot(*(following - points).T)
+    total = np.where(distance_before + distance_after > 0, distance_before + distance_after, 1)
+    direction = following - previous
+    control_before = points - (tension * distance_before / total)[:, None] * direction
+    control_after = points + (tension * distance_after / total)[:, None] * direction
+
+    # segment i goes from point i to point i + 1
+    p0, p1 = points[:-1], control_after[:-1]
+    p2, p3 = control_before[1:], points[1:]
+    t = np.linspace(0, 1, steps, endpoint=False)[None, :, None]
+    curve = ((1 - t) ** 3 * p0[:, None] + 3 * (1 - t) ** 2 * t * p1[:, None]
+             + 3 * (1 - t) * t ** 2 * p2[:, None] + t ** 3 * p3[:, None])
+    curve = np.vstack([curve.reshape(-1, 2), points[-1:]])
+    return curve[:, 0], curve[:, 1]
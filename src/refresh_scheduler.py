@@ -0,0 +1,185 @@
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta
+from model import PlaylistManager
+
+logger = logging.getLogger(__name__)
+
+# upper bound on a single sleep, guards against wall clock changes (e.g. NTP sync after boot)
+MAX_WAIT_SECONDS = 3600
+
+class RefreshScheduler:
+    """Keeps the next due time of every refresh trigger in a priority queue.
+
+    The following kinds of entries are tracked:
+        cycle: the active playlist advancing to its next plugin after `plugin_cycle_interval_seconds`.
+        window: the next playlist start or end time, where the active playlist may change.
+        instance: the refresh rule (interval or scheduled time) of the plugin instance currently displayed.
+        prerender: `prerender_lead_seconds` before the next cycle, when the upcoming plugin is rendered ahead of time.
+
+    Entries are never removed from the heap directly. Rescheduling or invalidating a key bumps its
+    version, and stale entries are discarded when they reach the top of the heap.
+    """
+
+    CYCLE = "cycle"
+    WINDOW = "window"
+    INSTANCE = "instance"
+    PRERENDER = "prerender"
+
+    def __init__(self, device_config):
+        self.device_config = device_config
+        self._heap = []
+        self._versions = {}
+        self._due = {}
+        self._counter = itertools.count()
+
+        # cycle due time targeted by the scheduled prerender entry, and the one it last fired for
+        self.prerender_target = None
+        self._fired_prerender_target = None
+
+    def schedule(self, key, due_dt):
+        """Sets the due time for the given key, replacing any existing entry. A due time of None removes it."""
+        version = self._versions.get(key, 0) + 1
+        self._versions[key] = version
+        if due_dt is None:
+            self._due.pop(key, None)
+            return
+        self._due[key] = due_dt
+        heapq.heappush(self._heap, (due_dt.timestamp(), next(self._counter), key, version))
+
+    def invalidate(self, key):
+        """Removes the entry for the given key."""
+        self.schedule(key, None)
+
+    def get_next_due(self):
+        """Returns the (key, due datetime) of the earliest entry, or (None, None) if nothing is scheduled."""
+        self._discard_stale()
+        if not self._heap:
+            return None, None
+        key = self._heap[0][2]
+        return key, self._due[key]
+
+    def get_wait_seconds(self):
+        """Returns how long the refresh task should sleep before the next entry is due."""
+        key, due_dt = self.get_next_due()
+        if due_dt is None:
+            return MAX_WAIT_SECONDS
+        return min(max(due_dt.timestamp() - time.time(), 0), MAX_WAIT_SECONDS)
+
+    def pop_due(self, current_dt):
+        """Removes and returns the kinds of all entries that are due at the given time."""
+        due_kinds = set()
+        current_ts = current_dt.timestamp()
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > current_ts:
+                break
+            _, _, key, _ = heapq.heappop(self._heap)
+            self.invalidate(key)
+            due_kinds.add(key[0])
+            if key[0] == self.PRERENDER:
+                # only prerender once per cycle boundary
+                self._fired_prerender_target = self.prerender_target
+        return due_kinds
+
+    def update(self, current_dt, kinds=(CYCLE, WINDOW, INSTANCE), not_before=None):
+        """Recomputes the entries of the given kinds from the current device config.
+
+        Args:
+            current_dt: The current time in the device's timezone.
+            kinds: The entry kinds to recompute.
+            not_before: Optional datetime, entries due earlier are postponed to it (used to back off after failures).
+        """
+        playlist_manager = self.device_config.get_playlist_manager()
+        latest_refresh = self.device_config.get_refresh_info()
+        active_playlist = playlist_manager.determine_active_playlist(current_dt)
+
+        def clamp(due_dt):
+            if due_dt is not None and not_before is not None and due_dt < not_before:
+                return not_before
+            return due_dt
+
+        if self.CYCLE in kinds:
+            cycle_due = self._get_cycle_due(active_playlist, latest_refresh, current_dt)
+            self.schedule((self.CYCLE,), clamp(cycle_due))
+            self.schedule((self.PRERENDER,), clamp(self._get_prerender_due(cycle_due, current_dt)))
+
+        if self.WINDOW in kinds:
+            self.schedule((self.WINDOW,), clamp(self._get_window_due(playlist_manager, current_dt)))
+
+        if self.INSTANCE in kinds:
+            for key in [k for k in self._due if k[0] == self.INSTANCE]:
+                self.invalidate(key)
+            plugin_instance = self.get_displayed_instance(active_playlist, latest_refresh)
+            if plugin_instance:
+                key = (self.INSTANCE, active_playlist.name, plugin_instance.plugin_id, plugin_instance.name)
+                self.schedule(key, clamp(plugin_instance.get_next_refresh_dt(current_dt)))
+
+        key, due_dt = self.get_next_due()
+        if due_dt:
+            logger.info(f"Next refresh scheduled. | trigger: {key[0]} | due: {due_dt.strftime('%Y-%m-%d %H:%M:%S')}")
+        else:
+            logger.info("No refresh scheduled.")
+
+    @staticmethod
+    def get_displayed_instance(active_playlist, latest_refresh):
+        """Returns the plugin instance of the active playlist that is currently displayed, if any."""
+        if not active_playlist or latest_refresh.refresh_type != "Playlist":
+            return None
+        if latest_refresh.playlist != active_playlist.name:
+            return None
+        return active_playlist.find_plugin(latest_refresh.plugin_id, latest_refresh.plugin_instance)
+
+    def _get_cycle_due(self, active_playlist, latest_refresh, current_dt):
+        if not active_playlist or not active_playlist.plugins:
+            return None
+        latest_refresh_dt = latest_refresh.get_refresh_datetime()
+        if not latest_refresh_dt:
+            return current_dt
+        plugin_cycle_interval = self.device_config.get_config("plugin_cycle_interval_seconds", default=3600)
+        return latest_refresh_dt + timedelta(seconds=plugin_cycle_interval)
+
+    def _get_prerender_due(self, cycle_due, current_dt):
+        lead_seconds = self.device_config.get_config("prerender_lead_seconds", default=0)
+        self.prerender_target = None
+        if not lead_seconds or not cycle_due or cycle_due <= current_dt or cycle_due == self._fired_prerender_target:
+            return None
+        self.prerender_target = cycle_due
+        return max(cycle_due - timedelta(seconds=lead_seconds), current_dt)
+
+    def _get_window_due(self, playlist_manager, current_dt):
+        """Returns the next playlist start or end time after the current time."""
+        boundaries = set()
+        for playlist in playlist_manager.playlists:
+            boundaries.update([playlist.start_time, playlist.end_time])
+        boundaries.discard(PlaylistManager.DEFAULT_PLAYLIST_START)
+        boundaries.discard(PlaylistManager.DEFAULT_PLAYLIST_END)
+
+        tz = current_dt.tzinfo
+        next_boundary = None
+        for boundary in boundaries:
+            boundary_time = datetime.strptime(boundary, "%H:%M").time()
+            for day_offset in (0, 1):
+                naive_dt = datetime.combine(current_dt.date() + timedelta(days=day_offset), boundary_time)
+                # pytz timezones need localize() to pick the correct UTC offset
+                boundary_dt = tz.localize(naive_dt.replace(tzinfo=None)) if hasattr(tz, "localize") else naive_dt.replace(tzinfo=tz)
+                if boundary_dt > current_dt:
+                    break
+            if next_boundary is None or boundary_dt < next_boundary:
+                next_boundary = boundary_dt
+
+        # midnight is a boundary for any playlist that doesn't span the whole day
+        if any(p.start_time != PlaylistManager.DEFAULT_PLAYLIST_START or p.end_time != PlaylistManager.DEFAULT_PLAYLIST_END
+               for p in playlist_manager.playlists):
+            midnight = datetime.combine(current_dt.date() + timedelta(days=1), datetime.min.time())
+            midnight_dt = tz.localize(midnight) if hasattr(tz, "localize") else midnight.replace(tzinfo=tz)
+            if next_boundary is None or midnight_dt < next_boundary:
+                next_boundary = midnight_dt
+
+        return next_boundary
+
+    def _discard_stale(self):
+        while self._heap and self._versions.get(self._heap[0][2]) != self._heap[0][3]:
+            heapq.heappop(self._heap)
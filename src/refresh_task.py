@@ -1,16 +1,26 @@
+import copy
+import hashlib
+import json
 import threading
 import time
 import os
+import uuid
+from collections import deque, OrderedDict
 import logging
 import pytz
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from plugins.plugin_registry import get_plugin_instance
-from utils.image_utils import compute_image_hash
+from plugin_executor import generate_plugin_image
+from utils.progress_utils import stage_callback
 from model import RefreshInfo, PlaylistManager
+from refresh_scheduler import RefreshScheduler
 from PIL import Image
 
 logger = logging.getLogger(__name__)
 
+# number of manual update jobs kept around for status polling
+MAX_JOB_HISTORY = 50
+
 class RefreshTask:
     """Handles the logic for refreshing the display using a backgroud thread."""
 
@@ -22,11 +32,16 @@ class RefreshTask:
         self.lock = threading.Lock()
         self.condition = threading.Condition(self.lock)
         self.running = False
-        self.manual_update_request = ()
+        self.manual_jobs = deque()
+        self.jobs = OrderedDict()
+        self.scheduler = RefreshScheduler(device_config)
+        # start with every entry pending so the first pass of the loop builds the full schedule
+        self.pending_changes = {RefreshScheduler.CYCLE, RefreshScheduler.WINDOW, RefreshScheduler.INSTANCE}
 
-        self.refresh_event = threading.Event()
-        self.refresh_event.set()
-        self.refresh_result = {}
+        # frame of the upcoming playlist slot rendered ahead of time, see _start_prerender()
+        self.staged_frame = None
+        self.prerender_epoch = 0
+        self.prerender_thread = None
 
     def start(self):
         """Starts the background thread for refreshing the display."""
@@ -46,137 +61,378 @@ class RefreshTask:
             self.thread.join()
 
     def _run(self):
-        """Background task that manages the periodic refresh of the display.
+        """Background task that manages the refresh of the display.
 
-        This function runs in a loop, sleeping for a configured duration (`scheduler_sleep_time`) or until manually 
-        triggered via `manual_update()`. Detrmines the next plugin to refresh based on active playlists and 
-        updates the display accordingly.
+        Rather than polling on a fixed interval, the task sleeps until the earliest entry in the
+        `RefreshScheduler` is due (playlist cycle, playlist window boundary or the displayed instance's
+        refresh rule), until a manual update is queued via `submit_manual_update()`, or until the web
+        blueprints report a config change via `signal_config_change()`.
 
         Workflow:
-        1. Waits for the configured sleep duration or until notified of a manual update.
-        2. Checks if a manual update has been requested:
-        - If so, refreshes the specified plugin immediately.
-        3. Otherwise, determines the next plugin to refresh based on the active playlist and generates an image.
-        4. Compares the image hash with the last displayed image hash.
+        1. Waits until the next scheduled entry is due or until notified.
+        2. Recomputes the scheduler entries affected by any pending config changes.
+        3. Checks if a manual update job is queued:
+        - If so, refreshes the specified plugin immediately, reporting its progress on the job.
+        4. Otherwise, pops the due entries and determines the plugin to refresh:
+        - A due cycle, or a window boundary that changed the active playlist, advances the playlist.
+        - A due instance entry refreshes the currently displayed instance in place.
+        5. Compares the image hash with the last displayed image hash.
         - If the image has changed, updates the display.
         - If the image is the same, skips the refresh.
-        5. Updates the refresh metadata in the device configuration.
-        6. Repeats the process until `stop()` is called.
+        6. Updates the refresh metadata in the device configuration and reschedules the entries.
+        7. Repeats the process until `stop()` is called.
 
-        Handles any exceptions that occur during the refresh process and ensures the refresh event is set 
-        to indicate completion.
+        The lock is only held while deciding what to refresh, so jobs can be queued while an image is generated.
+        Handles any exceptions that occur during the refresh process and marks the manual update job as failed.
+        After a failure the due entries are retried after `scheduler_sleep_time`.
 
         Exceptions:
         - Captures and logs any unexpected errors during execution to prevent the thread from exiting.
         """
         while True:
+            job = None
             try:
                 with self.condition:
-                    sleep_time = self.device_config.get_config("scheduler_sleep_time")
-
-                    # Wait for sleep_time or until notified
-                    self.condition.wait(timeout=sleep_time)
-                    self.refresh_result = {}
-                    self.refresh_event.clear()
+                    if self.running and not self.manual_jobs and not self.pending_changes:
+                        # Wait until the next refresh is due or until notified
+                        self.condition.wait(timeout=self.scheduler.get_wait_seconds())
 
                     # Exit if `stop()` is called
                     if not self.running:
                         break 
 
+                    current_dt = self._get_current_datetime()
+                    if self.pending_changes:
+                        logger.info(f"Config changed, rescheduling. | changes: {sorted(self.pending_changes)}")
+                        self.scheduler.update(current_dt, self.pending_changes)
+                        self.pending_changes = set()
+
                     playlist_manager = self.device_config.get_playlist_manager()
                     latest_refresh = self.device_config.get_refresh_info()
-                    current_dt = self._get_current_datetime()
 
                     refresh_action = None
-                    if self.manual_update_request:
+                    due_kinds = set()
+                    if self.manual_jobs:
                         # handle immediate update request
-                        logger.info("Manual update requested")
-                        refresh_action = self.manual_update_request
-                        self.manual_update_request = ()
+                        job = self.manual_jobs.popleft()
+                        logger.info(f"Manual update requested. | job_id: {job.job_id}")
+                        refresh_action = job.refresh_action
                     else:
+                        due_kinds = self.scheduler.pop_due(current_dt)
+                        if RefreshScheduler.PRERENDER in due_kinds:
+                            self._start_prerender(playlist_manager, current_dt)
+                            due_kinds.discard(RefreshScheduler.PRERENDER)
+                        if not due_kinds:
+                            continue
                         # handle refresh based on playlists
-                        logger.info(f"Running interval refresh check. | current_time: {current_dt.strftime('%Y-%m-%d %H:%M:%S')}")
-                        playlist, plugin_instance = self._determine_next_plugin(playlist_manager, latest_refresh, current_dt)
-                        if plugin_instance:
-                            refresh_action = PlaylistRefresh(playlist, plugin_instance)
-
-                    if refresh_action:
-                        plugin_config = self.device_config.get_plugin(refresh_action.get_plugin_id())
-                        plugin = get_plugin_instance(plugin_config)
-                        image = refresh_action.execute(plugin, self.device_config, current_dt)
-                        image_hash = compute_image_hash(image)
-
-                        refresh_info = refresh_action.get_refresh_info()
-                        refresh_info.update({"refresh_time": current_dt.isoformat(), "image_hash": image_hash})
-                        # check if image is the same as current image
-                        if image_hash != latest_refresh.image_hash:
-                            logger.info(f"Updating display. | refresh_info: {refresh_info}")
-                            self.display_manager.display_image(image, image_settings=plugin.config.get("image_settings", []))
-                        else:
-                            logger.info(f"Image already displayed, skipping refresh. | refresh_info: {refresh_info}")
-
-                        # update latest refresh data in the device config
-                        self.device_config.refresh_info = RefreshInfo(**refresh_info)
+                        logger.info(f"Running scheduled refresh. | due: {sorted(due_kinds)} | current_time: {current_dt.strftime('%Y-%m-%d %H:%M:%S')}")
+                        refresh_action = self._determine_refresh_action(playlist_manager, latest_refresh, current_dt, due_kinds)
+
+                # the lock is released while refreshing so new jobs and config changes can be queued meanwhile
+                if refresh_action:
+                    with stage_callback(job.set_status if job else None):
+                        self._refresh_display(refresh_action, latest_refresh, current_dt, job)
 
+                if refresh_action or due_kinds:
                     self.device_config.write_config()
+                    self.scheduler.update(current_dt, due_kinds | {RefreshScheduler.CYCLE, RefreshScheduler.INSTANCE})
+
+                if job:
+                    job.set_status(RefreshJob.DONE)
 
             except Exception as e:
                 logging.exception('Exception during refresh')
-                self.refresh_result["exception"] = e  # Capture exception
-            finally:
-                self.refresh_event.set()
+                if job:
+                    job.fail(e)
+                # back off before retrying so a failing plugin doesn't spin the loop
+                retry_seconds = self.device_config.get_config("scheduler_sleep_time", default=60)
+                current_dt = self._get_current_datetime()
+                self.scheduler.update(current_dt, not_before=current_dt + timedelta(seconds=retry_seconds))
+
+    def _refresh_display(self, refresh_action, latest_refresh, current_dt, job=None):
+        """Generates the image for the refresh action and updates the display if the image changed."""
+        if job:
+            job.set_status(RefreshJob.FETCHING)
+        plugin_config = self.device_config.get_plugin(refresh_action.get_plugin_id())
+        plugin = get_plugin_instance(plugin_config)
+        image = refresh_action.execute(plugin, self.device_config, current_dt)
+        # compare what the panel would show, renders that quantize to the same frame don't need a refresh
+        frame = self.display_manager.prepare_frame(image, image_settings=plugin.config.get("image_settings", []))
+        image_hash = frame.hash
+
+        refresh_info = refresh_action.get_refresh_info()
+        # an in place refresh of the displayed instance doesn't restart the playlist cycle
+        refresh_time = latest_refresh.refresh_time if refresh_action.in_place else current_dt.isoformat()
+        refresh_info.update({"refresh_time": refresh_time, "image_hash": image_hash})
+        # check if image is the same as current image
+        if image_hash != latest_refresh.image_hash:
+            logger.info(f"Updating display. | refresh_info: {refresh_info}")
+            if job:
+                job.set_status(RefreshJob.DISPLAYING)
+            if not self.display_manager.display_frame(frame):
+                logger.info("Frame within display_change_tolerance of the displayed one, panel not refreshed.")
+        else:
+            logger.info(f"Image already displayed, skipping refresh. | refresh_info: {refresh_info}")
 
-    def manual_update(self, refresh_action):
-        """Manually triggers an update for the specified plugin id and plugin settings by notifying the background process."""
-        if self.running:
-            with self.condition:
-                self.manual_update_request = refresh_action
-                self.refresh_result = {}
-                self.refresh_event.clear()
+        # update latest refresh data in the device config
+        self.device_config.refresh_info = RefreshInfo(**refresh_info)
+
+    def signal_config_change(self, playlist=False, plugin_instance=False):
+        """Notifies the background thread that the device config changed so affected refreshes are rescheduled.
 
-                self.condition.notify_all()  # Wake the thread to process manual update
+        Args:
+            playlist (bool): Playlists were added, removed or had their time window changed.
+            plugin_instance (bool): A plugin instance was added, removed or updated.
+            With neither set, every entry is recomputed (e.g. timezone or cycle interval changes).
+        """
+        changes = set()
+        if playlist:
+            changes.update([RefreshScheduler.WINDOW, RefreshScheduler.CYCLE, RefreshScheduler.INSTANCE])
+        if plugin_instance:
+            changes.update([RefreshScheduler.CYCLE, RefreshScheduler.INSTANCE])
+        if not changes:
+            changes.update([RefreshScheduler.WINDOW, RefreshScheduler.CYCLE, RefreshScheduler.INSTANCE])
+
+        with self.condition:
+            self.pending_changes.update(changes)
+            self._invalidate_staged_frame()
+            self.condition.notify_all()
 
-            self.refresh_event.wait()
-            if self.refresh_result.get("exception"):
-                raise self.refresh_result.get("exception")
+    def _start_prerender(self, playlist_manager, current_dt):
+        """Renders the plugin instance of the upcoming playlist slot in a background thread.
+
+        The image is generated from a copy of the instance settings and staged along with a fingerprint
+        of its inputs. At the cycle boundary it is swapped onto the display if the same instance is up
+        and its inputs haven't changed, otherwise it is discarded and the instance is rendered as usual.
+        """
+        if self.prerender_thread and self.prerender_thread.is_alive():
+            logger.info("Previous prerender still running, skipping.")
+            return
+
+        target_dt = self.scheduler.prerender_target
+        playlist = playlist_manager.determine_active_playlist(target_dt) if target_dt else None
+        plugin_instance = playlist.peek_next_plugin() if playlist else None
+        if not plugin_instance:
+            return
+        if not plugin_instance.should_refresh(target_dt):
+            logger.info(f"Next plugin instance will use its latest image, nothing to prerender. | plugin_instance: {plugin_instance.name}")
+            return
+
+        plugin_config = self.device_config.get_plugin(plugin_instance.plugin_id)
+        settings = copy.deepcopy(plugin_instance.settings)
+        fingerprint = self._get_instance_fingerprint(playlist, plugin_instance)
+        epoch = self.prerender_epoch
+
+        def prerender():
+            try:
+                logger.info(f"Prerendering next plugin instance. | playlist: {playlist.name} | plugin_instance: {plugin_instance.name}")
+                plugin = get_plugin_instance(plugin_config)
+                image = generate_plugin_image(plugin, settings, self.device_config)
+            except Exception:
+                logger.exception(f"Failed to prerender plugin instance '{plugin_instance.name}'")
+                return
+
+            with self.condition:
+                if epoch != self.prerender_epoch:
+                    logger.info(f"Inputs changed during prerender, discarding frame. | plugin_instance: {plugin_instance.name}")
+                    return
+                self.staged_frame = StagedFrame(playlist.name, plugin_instance, fingerprint, settings, image, current_dt)
+
+        self.prerender_thread = threading.Thread(target=prerender, daemon=True)
+        self.prerender_thread.start()
+
+    def _take_staged_frame(self, playlist, plugin_instance, current_dt):
+        """Returns the staged frame if it was rendered for the given instance and is still valid, and clears it."""
+        staged_frame = self.staged_frame
+        self._invalidate_staged_frame()
+        if not staged_frame:
+            return None
+
+        lead_seconds = self.device_config.get_config("prerender_lead_seconds", default=0)
+        if staged_frame.playlist_name != playlist.name or staged_frame.plugin_instance is not plugin_instance:
+            reason = "different plugin instance"
+        elif staged_frame.fingerprint != self._get_instance_fingerprint(playlist, plugin_instance):
+            reason = "inputs changed"
+        elif (current_dt - staged_frame.rendered_at) > timedelta(seconds=2 * lead_seconds):
+            reason = "frame too old"
         else:
-            logger.warn("Background refresh task is not running, unable to do a manual update")
+            logger.info(f"Using prerendered frame. | plugin_instance: {plugin_instance.name}")
+            return staged_frame
+
+        logger.info(f"Discarding prerendered frame, {reason}. | plugin_instance: {staged_frame.plugin_instance.name}")
+        return None
+
+    def _invalidate_staged_frame(self):
+        """Drops the staged frame and any prerender still in progress."""
+        self.staged_frame = None
+        self.prerender_epoch += 1
+
+    def _get_instance_fingerprint(self, playlist, plugin_instance):
+        """Returns a hash of everything a prerendered frame depends on."""
+        inputs = {
+            "playlist": playlist.name,
+            "plugin_id": plugin_instance.plugin_id,
+            "name": plugin_instance.name,
+            "settings": plugin_instance.settings,
+            "resolution": self.device_config.get_config("resolution"),
+            "orientation": self.device_config.get_config("orientation"),
+            "timezone": self.device_config.get_config("timezone")
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def submit_manual_update(self, refresh_action):
+        """Queues a manual update and returns its RefreshJob without waiting for it.
+
+        A request for the same plugin instance (or the same plugin, for updates that aren't part of a playlist)
+        that is still queued is merged into the existing job, the latest settings win. Returns None if the
+        background refresh task is not running.
+        """
+        if not self.running:
+            logger.warning("Background refresh task is not running, unable to do a manual update")
+            return None
+
+        with self.condition:
+            job_key = refresh_action.get_job_key()
+            job = next((j for j in self.manual_jobs if j.refresh_action.get_job_key() == job_key), None)
+            if job:
+                logger.info(f"Merging manual update into queued job. | job_id: {job.job_id}")
+                job.refresh_action = refresh_action
+                return job
+
+            job = RefreshJob(refresh_action)
+            self.manual_jobs.append(job)
+            self.jobs[job.job_id] = job
+            self._trim_jobs()
+
+            self.condition.notify_all()  # Wake the thread to process manual update
+        return job
+
+    def get_job(self, job_id):
+        """Returns the manual update job with the given id, or None if it is unknown or expired."""
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    def _trim_jobs(self):
+        """Forgets the oldest finished jobs once more than MAX_JOB_HISTORY are kept."""
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= MAX_JOB_HISTORY:
+                break
+            if self.jobs[job_id].is_finished():
+                del self.jobs[job_id]
 
     def _get_current_datetime(self):
         """Retrieves the current datetime based on the device's configured timezone."""
         tz_str = self.device_config.get_config("timezone", default="UTC")
         return datetime.now(pytz.timezone(tz_str))
 
-    def _determine_next_plugin(self, playlist_manager, latest_refresh_info, current_dt):
-        """Determines the next plugin to refresh based on the active playlist, plugin cycle interval, and current time."""
+    def _determine_refresh_action(self, playlist_manager, latest_refresh_info, current_dt, due_kinds):
+        """Determines the refresh to perform based on the due scheduler entries and the active playlist."""
+        previous_playlist = playlist_manager.active_playlist
         playlist = playlist_manager.determine_active_playlist(current_dt)
         if not playlist:
             playlist_manager.active_playlist = None
             logger.info(f"No active playlist determined.")
-            return None, None
+            return None
 
         playlist_manager.active_playlist = playlist.name
         if not playlist.plugins:
             logger.info(f"Active playlist '{playlist.name}' has no plugins.")
-            return None, None
+            return None
+
+        playlist_changed = RefreshScheduler.WINDOW in due_kinds and playlist.name != previous_playlist
+        if RefreshScheduler.CYCLE in due_kinds or playlist_changed:
+            latest_refresh_dt = latest_refresh_info.get_refresh_datetime()
+            plugin_cycle_interval = self.device_config.get_config("plugin_cycle_interval_seconds", default=3600)
+            should_refresh = PlaylistManager.should_refresh(latest_refresh_dt, plugin_cycle_interval, current_dt)
+
+            if should_refresh or playlist_changed:
+                plugin = playlist.get_next_plugin()
+                logger.info(f"Determined next plugin. | active_playlist: {playlist.name} | plugin_instance: {plugin.name}")
+                return PlaylistRefresh(playlist, plugin, staged_frame=self._take_staged_frame(playlist, plugin, current_dt))
+
+        if RefreshScheduler.INSTANCE in due_kinds:
+            plugin = RefreshScheduler.get_displayed_instance(playlist, latest_refresh_info)
+            if plugin and plugin.should_refresh(current_dt):
+                logger.info(f"Displayed plugin instance is due. | active_playlist: {playlist.name} | plugin_instance: {plugin.name}")
+                return PlaylistRefresh(playlist, plugin, in_place=True)
+
+        logger.info("Not time to update display.")
+        return None
+
+class RefreshJob:
+    """A manual update queued on the refresh task, used to report its progress back to the web UI.
 
-        latest_refresh_dt = latest_refresh_info.get_refresh_datetime()
-        plugin_cycle_interval = self.device_config.get_config("plugin_cycle_interval_seconds", default=3600)
-        should_refresh = PlaylistManager.should_refresh(latest_refresh_dt, plugin_cycle_interval, current_dt)
+    Attributes:
+        job_id (str): Unique id of the job.
+        refresh_action (RefreshAction): The refresh to perform.
+        status (str): One of queued, fetching, rendering, displaying, done or failed.
+        error (str): Error message if the job failed.
+        updated_at (float): Epoch time of the latest status change.
+    """
 
-        if not should_refresh:
-            latest_refresh_str = latest_refresh_dt.strftime('%Y-%m-%d %H:%M:%S') if latest_refresh_dt else "None"
-            logger.info(f"Not time to update display. | latest_update: {latest_refresh_str} | plugin_cycle_interval: {plugin_cycle_interval}")
-            return None, None
+    QUEUED = "queued"
+    FETCHING = "fetching"
+    RENDERING = "rendering"
+    DISPLAYING = "displaying"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, refresh_action):
+        self.job_id = uuid.uuid4().hex
+        self.refresh_action = refresh_action
+        self.status = RefreshJob.QUEUED
+        self.error = None
+        self.updated_at = time.time()
+        self.condition = threading.Condition()
+
+    def set_status(self, status):
+        """Updates the status and wakes anyone waiting on the job."""
+        with self.condition:
+            if self.is_finished():
+                return
+            self.status = status
+            self.updated_at = time.time()
+            self.condition.notify_all()
+
+    def fail(self, exception):
+        """Marks the job as failed with the given exception."""
+        with self.condition:
+            self.error = str(exception)
+        self.set_status(RefreshJob.FAILED)
 
-        plugin = playlist.get_next_plugin()
-        logger.info(f"Determined next plugin. | active_playlist: {playlist.name} | plugin_instance: {plugin.name}")
+    def is_finished(self):
+        return self.status in (RefreshJob.DONE, RefreshJob.FAILED)
 
-        return playlist, plugin
+    def wait_for_update(self, status, timeout=None):
+        """Blocks until the status differs from the given one. Returns the current status."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.status != status, timeout)
+            return self.status
+
+    def to_dict(self):
+        refresh_info = self.refresh_action.get_refresh_info()
+        job_dict = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "plugin_id": refresh_info.get("plugin_id"),
+            "updated_at": self.updated_at
+        }
+        if refresh_info.get("plugin_instance"):
+            job_dict["plugin_instance"] = refresh_info.get("plugin_instance")
+        if self.error:
+            job_dict["error"] = self.error
+        return job_dict
 
 class RefreshAction:
     """Base class for a refresh action. Subclasses should override the methods below."""
-    
+
+    # True when the refresh re-renders the displayed content without advancing the playlist cycle
+    in_place = False
+
+    def get_job_key(self):
+        """Return a key identifying duplicate manual update requests."""
+        raise NotImplementedError("Subclasses must implement the get_job_key method.")
+
     def refresh(self, plugin, device_config, current_dt):
         """Perform a refresh operation and return the updated image."""
         raise NotImplementedError("Subclasses must implement the refresh method.")
@@ -203,7 +459,7 @@ class ManualRefresh(RefreshAction):
 
     def execute(self, plugin, device_config, current_dt: datetime):
         """Performs a manual refresh using the stored plugin ID and settings."""
-        return plugin.generate_image(self.plugin_settings, device_config)
+        return generate_plugin_image(plugin, self.plugin_settings, device_config)
 
     def get_refresh_info(self):
         """Return refresh metadata as a dictionary."""
@@ -213,17 +469,25 @@ class ManualRefresh(RefreshAction):
         """Return the plugin ID associated with this refresh."""
         return self.plugin_id
 
+    def get_job_key(self):
+        """Return a key identifying duplicate manual update requests."""
+        return ("manual", self.plugin_id)
+
 class PlaylistRefresh(RefreshAction):
     """Performs a refresh using a plugin instance within a playlist context.
 
     Attributes:
         playlist: The playlist object associated with the refresh.
         plugin_instance: The plugin instance to refresh.
+        in_place (bool): Whether this refreshes the displayed instance without advancing the playlist cycle.
+        staged_frame (StagedFrame): Optional prerendered frame to use instead of generating the image.
     """
 
-    def __init__(self, playlist, plugin_instance):
+    def __init__(self, playlist, plugin_instance, in_place=False, staged_frame=None):
         self.playlist = playlist
         self.plugin_instance = plugin_instance
+        self.in_place = in_place
+        self.staged_frame = staged_frame
 
     def get_refresh_info(self):
         """Return refresh metadata as a dictionary."""
@@ -238,6 +502,10 @@ class PlaylistRefresh(RefreshAction):
         """Return the plugin ID associated with this refresh."""
         return self.plugin_instance.plugin_id
 
+    def get_job_key(self):
+        """Return a key identifying duplicate manual update requests."""
+        return ("playlist", self.playlist.name, self.plugin_instance.plugin_id, self.plugin_instance.name)
+
     def execute(self, plugin, device_config, current_dt: datetime):
         """Performs a refresh for the specified plugin instance within its playlist context."""
         # Determine the file path for the plugin's image
@@ -245,9 +513,15 @@ class PlaylistRefresh(RefreshAction):
 
         # Check if a refresh is needed based on the plugin instance's criteria
         if self.plugin_instance.should_refresh(current_dt):
-            logger.info(f"Refreshing plugin instance. | plugin_instance: '{self.plugin_instance.name}'") 
-            # Generate a new image
-            image = plugin.generate_image(self.plugin_instance.settings, device_config)
+            if self.staged_frame:
+                logger.info(f"Refreshing plugin instance from prerendered frame. | plugin_instance: '{self.plugin_instance.name}'")
+                image = self.staged_frame.image
+                # keep any settings the plugin updated while rendering (e.g. the current image index)
+                self.plugin_instance.settings = self.staged_frame.settings
+            else:
+                logger.info(f"Refreshing plugin instance. | plugin_instance: '{self.plugin_instance.name}'") 
+                # Generate a new image
+                image = generate_plugin_image(plugin, self.plugin_instance.settings, device_config)
             image.save(plugin_image_path)
             self.plugin_instance.latest_refresh_time = current_dt.isoformat()
         else:
@@ -255,4 +529,24 @@ class PlaylistRefresh(RefreshAction):
             # Load the existing image from disk
             image = Image.open(plugin_image_path)
 
-        return image
\ No newline at end of file
+        return image
+
+class StagedFrame:
+    """An image rendered ahead of time for the upcoming playlist slot.
+
+    Attributes:
+        playlist_name (str): Name of the playlist the frame was rendered for.
+        plugin_instance: The plugin instance the frame was rendered for.
+        fingerprint (str): Hash of the inputs the frame was rendered from.
+        settings (dict): Copy of the instance settings after rendering.
+        image: The rendered image.
+        rendered_at (datetime): When the prerender was started.
+    """
+
+    def __init__(self, playlist_name, plugin_instance, fingerprint, settings, image, rendered_at):
+        self.playlist_name = playlist_name
+        self.plugin_instance = plugin_instance
+        self.fingerprint = fingerprint
+        self.settings = settings
+        self.image = image
+        self.rendered_at = rendered_at
@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# number of appended entries after which the journal is rewritten as a single snapshot
+DEFAULT_MAX_ENTRIES = 500
+
+class StateJournal:
+    """Append-only journal of the runtime state the refresh task updates on every rotation.
+
+    Each line is a JSON object setting one value at a path in the state dictionary, e.g.
+    `{"path": ["playlists", "Default", "current_plugin_index"], "value": 2}`. A `{"snapshot": {...}}`
+    line replaces the whole state. The state is rebuilt by replaying the lines in order, and the
+    journal is compacted into a single snapshot line once it grows past `max_entries`.
+    """
+
+    def __init__(self, journal_file, max_entries=DEFAULT_MAX_ENTRIES):
+        self.journal_file = journal_file
+        self.max_entries = max_entries
+        self.entry_count = 0
+        self.state = {}
+
+    def load(self):
+        """Replays the journal and returns the resulting state. A torn last line (e.g. power loss) is ignored."""
+        self.state = {}
+        self.entry_count = 0
+        if not os.path.exists(self.journal_file):
+            return self.state
+
+        with open(self.journal_file) as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt state journal entry. | file: {self.journal_file} | line: {line_number}")
+                    continue
+                self._apply(entry)
+                self.entry_count += 1
+
+        logger.debug(f"Replayed {self.entry_count} state journal entries from {self.journal_file}")
+        return self.state
+
+    def update(self, state):
+        """Appends entries for every value that differs from the journaled state, compacting when needed.
+
+        Returns the number of entries written.
+        """
+        entries = []
+        self._diff([], self.state, state, entries)
+        if not entries:
+            return 0
+
+        if self.entry_count + len(entries) > self.max_entries:
+            self.compact(state)
+            return 1
+
+        lines = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+        with open(self.journal_file, "a") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        for entry in entries:
+            self._apply(entry)
+        self.entry_count += len(entries)
+        return len(entries)
+
+    def needs_compaction(self):
+        """Returns True once the journal holds more than `max_entries` entries."""
+        return self.entry_count > self.max_entries
+
+    def compact(self, state):
+        """Rewrites the journal as a single snapshot of the given state."""
+        logger.debug(f"Compacting state journal {self.journal_file} after {self.entry_count} entries")
+        line = json.dumps({"snapshot": state}, separators=(",", ":")) + "\n"
+
+        journal_dir = os.path.dirname(self.journal_file)
+        fd, tmp_path = tempfile.mkstemp(prefix=".state.", suffix=".tmp", dir=journal_dir)
+        try:
+            if os.path.exists(self.journal_file):
+                shutil.copymode(self.journal_file, tmp_path)
+            with os.fdopen(fd, "w") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.state = json.loads(line)["snapshot"]
+        self.entry_count = 1
+
+    def _apply(self, entry):
+        if "snapshot" in entry:
+            self.state = entry["snapshot"]
+            return
+
+        path, value = entry["path"], entry["value"]
+        node = self.state
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = value
+
+    def _diff(self, path, old, new, entries):
+        """Collects entries turning `old` into `new`. Keys missing from `new` are left in place until compaction."""
+        for key, value in new.items():
+            old_value = old.get(key) if isinstance(old, dict) else None
+            if isinstance(value, dict) and value and isinstance(old_value, dict):
+                self._diff(path + [key], old_value, value, entries)
+            elif old_value != value or (isinstance(old, dict) and key not in old):
+                entries.append({"path": path + [key], "value": value})
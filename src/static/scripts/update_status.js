@@ -0,0 +1,40 @@
+// Waits for a queued display update to finish and resolves with the final job status.
+// Uses the server-sent events stream when the browser supports it, and falls back to polling.
+function waitForUpdate(statusUrl, jobId, onStatus) {
+    const jobUrl = statusUrl + jobId;
+    if (!window.EventSource) {
+        return pollUpdate(jobUrl, onStatus);
+    }
+
+    return new Promise((resolve) => {
+        const source = new EventSource(jobUrl + '/stream');
+        source.onmessage = (event) => {
+            const job = JSON.parse(event.data);
+            if (onStatus) onStatus(job);
+            if (job.status === 'done' || job.status === 'failed') {
+                source.close();
+                resolve(job);
+            }
+        };
+        source.onerror = () => {
+            // stream interrupted, keep following the job by polling
+            source.close();
+            resolve(pollUpdate(jobUrl, onStatus));
+        };
+    });
+}
+
+async function pollUpdate(jobUrl, onStatus, intervalMs = 1000) {
+    while (true) {
+        const response = await fetch(jobUrl);
+        const job = await response.json();
+        if (!response.ok) {
+            return { status: 'failed', error: job.error };
+        }
+        if (onStatus) onStatus(job);
+        if (job.status === 'done' || job.status === 'failed') {
+            return job;
+        }
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+}
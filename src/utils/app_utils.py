@@ -1,7 +1,10 @@
 import logging
 import os
 import socket
+import threading
 
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 
@@ -71,23 +74,120 @@ def is_connected():
     except OSError:
         return False
 
+def get_process_rss_mb(pid, include_children=True):
+    """Returns the resident set size of a process (and optionally its descendants) in MB.
+
+    Reads /proc directly so it works without extra dependencies on the Pi. Returns None when
+    the information is unavailable (e.g. non-Linux development machines or a dead process).
+    """
+    def read_rss_kb(process_id):
+        try:
+            with open(f"/proc/{process_id}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
+
+    if not os.path.isdir(f"/proc/{pid}"):
+        return None
+
+    pids = {pid}
+    if include_children:
+        # build the parent -> children map once and walk it from the given pid
+        children = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # the process name may contain spaces, the ppid is the 2nd field after the closing paren
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+
+        stack = [pid]
+        while stack:
+            for child in children.get(stack.pop(), []):
+                if child not in pids:
+                    pids.add(child)
+                    stack.append(child)
+
+    return sum(read_rss_kb(p) for p in pids) / 1024
+
+# loaded fonts kept in memory, keyed by (family, weight, size)
+FONT_CACHE_SIZE = 64
+
+# text measurements kept in memory, keyed by (font file, size, text)
+TEXT_METRICS_CACHE_SIZE = 4096
+
+# keyed by the file and size of the font rather than the font, so fonts evicted from _load_font can be freed
+_text_metrics = OrderedDict()
+_text_metrics_lock = threading.Lock()
+
 def get_font(font_name, font_size=50, font_weight="normal"):
+    """Returns the font of a family in FONT_FAMILIES (or a FONTS name such as "Jost-SemiBold") at a size.
+
+    Fonts are loaded once and shared, so callers must not modify them.
+    """
+    font_path = get_font_file(font_name, font_weight)
+    if font_path is None:
+        logger.warning(f"Requested font not found: font_name={font_name}")
+        return None
+    return _load_font(font_path, font_size)
+
+@lru_cache(maxsize=None)
+def get_font_file(font_name, font_weight="normal"):
+    """Returns the path of a font family's file for a weight, defaulting to its first variant."""
     if font_name in FONT_FAMILIES:
         font_variants = FONT_FAMILIES[font_name]
 
         font_entry = next((entry for entry in font_variants if entry["font-weight"] == font_weight), None)
         if font_entry is None:
             font_entry = font_variants[0]  # Default to first available variant
+        return resolve_path(os.path.join("static", "fonts", font_entry["file"]))
 
-        if font_entry:
-            font_path = resolve_path(os.path.join("static", "fonts", font_entry["file"]))
-            return ImageFont.truetype(font_path, font_size)
-        else:
-            logger.warn(f"Requested font weight not found: font_name={font_name}, font_weight={font_weight}")
-    else:
-        logger.warn(f"Requested font not found: font_name={font_name}")
+    font_file = FONTS.get(font_name.lower())
+    if font_file is None:
+        return None
+    font_path = next((resolve_path(os.path.join("static", "fonts", variant["file"]))
+                      for variants in FONT_FAMILIES.values() for variant in variants
+                      if os.path.basename(variant["file"]) == font_file), None)
+    return font_path or get_font_path(font_name.lower())
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_font(font_path, font_size):
+    return ImageFont.truetype(font_path, font_size)
+
+def get_text_bbox(font, text, anchor=None):
+    """Returns font.getbbox(text), memoized for the shared fonts returned by get_font."""
+    return _get_text_metric(("bbox", anchor), font, text, lambda: font.getbbox(text, anchor=anchor))
 
-    return None
+def get_text_length(font, text):
+    """Returns font.getlength(text), the advance width of the text, memoized like get_text_bbox."""
+    return _get_text_metric(("length",), font, text, lambda: font.getlength(text))
+
+def _get_text_metric(metric, font, text, measure):
+    font_path = getattr(font, "path", None)
+    if not isinstance(font_path, str):
+        # e.g. the default bitmap font, which has no file to key it on
+        return measure()
+
+    key = (metric, font_path, font.size, text)
+    with _text_metrics_lock:
+        value = _text_metrics.get(key)
+        if value is not None:
+            _text_metrics.move_to_end(key)
+            return value
+
+    value = measure()
+    with _text_metrics_lock:
+        _text_metrics[key] = value
+        while len(_text_metrics) > TEXT_METRICS_CACHE_SIZE:
+            _text_metrics.popitem(last=False)
+    return value
 
 def get_fonts():
     fonts_list = []
@@ -124,7 +224,16 @@ def generate_startup_image(dimensions=(800,480)):
 
     return image
 
+def parse_form(request_form):
+    """Returns the form data as a dict, with the values of keys ending in [] as lists."""
+    request_dict = request_form.to_dict()
+    for key in request_form.keys():
+        if key.endswith('[]'):
+            request_dict[key] = request_form.getlist(key)
+    return request_dict
+
 def handle_request_files(request_files, form_data={}):
+    from utils import image_store
     allowed_file_extensions = {'pdf', 'png', 'jpg', 'jpeg', 'gif'}
     file_location_map = {}
     # handle existing file locations being provided as part of the form data
@@ -143,11 +252,8 @@ def handle_request_files(request_files, form_data={}):
         if not extension or extension.lower() not in allowed_file_extensions:
             continue
 
-        file_name = os.path.basename(file_name)
-
-        file_save_dir = resolve_path(os.path.join("static", "images", "saved"))
-        file_path = os.path.join(file_save_dir, file_name)
-        file.save(file_path)
+        # stored by content, so duplicates are kept once and names never collide
+        file_path = image_store.save_upload(file)
 
         if is_list:
             file_location_map.setdefault(key, [])
@@ -0,0 +1,366 @@
+import base64
+import fcntl
+import json
+import logging
+import os
+import queue
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+from PIL import Image
+from utils.app_utils import get_process_rss_mb
+
+logger = logging.getLogger(__name__)
+
+BROWSER_EXECUTABLES = ["chromium-browser", "chromium"]
+BROWSER_FLAGS = [
+    "--headless=old", "--remote-debugging-pipe", "--no-sandbox", "--disable-gpu",
+    "--disable-software-rasterizer", "--disable-dev-shm-usage", "--hide-scrollbars",
+    "--no-first-run", "--no-default-browser-check", "--mute-audio"
+]
+
+# run between fork and the browser: moves the pipe ends given as its first two arguments onto the fds the
+# DevTools pipe uses (3 and 4), then execs the command that follows them
+FD_TRAMPOLINE = (
+    "import os, sys\n"
+    "read_fd, write_fd = int(sys.argv[1]), int(sys.argv[2])\n"
+    "os.dup2(read_fd, 3)\n"
+    "os.dup2(write_fd, 4)\n"
+    "os.close(read_fd)\n"
+    "os.close(write_fd)\n"
+    "os.execvp(sys.argv[3], sys.argv[3:])\n"
+)
+
+DEFAULT_POOL_SIZE = 1
+DEFAULT_MAX_RENDERS = 50
+DEFAULT_MAX_RSS_MB = 400
+DEFAULT_RENDER_TIMEOUT = 30
+
+# consecutive failures before the pool is reported unhealthy, and how long to wait before trying again
+MAX_CONSECUTIVE_FAILURES = 3
+UNHEALTHY_RETRY_SECONDS = 300
+
+_render_pool = None
+
+def find_browser():
+    """Returns the path of the first available chromium executable, or None."""
+    for executable in BROWSER_EXECUTABLES:
+        path = shutil.which(executable)
+        if path:
+            return path
+    return None
+
+def init_render_pool(device_config):
+    """Creates the process-wide render pool from the device config and starts warming it up."""
+    global _render_pool
+
+    pool_size = int(device_config.get_config("render_pool_size", default=DEFAULT_POOL_SIZE))
+    if pool_size <= 0:
+        logger.info("Browser render pool disabled, screenshots will spawn a new browser per render")
+        return None
+
+    browser_path = find_browser()
+    if not browser_path:
+        logger.warning("chromium-browser not found, browser render pool not started")
+        return None
+
+    _render_pool = RenderPool(
+        browser_path,
+        pool_size=pool_size,
+        max_renders=int(device_config.get_config("render_pool_max_renders", default=DEFAULT_MAX_RENDERS)),
+        max_rss_mb=int(device_config.get_config("render_pool_max_rss_mb", default=DEFAULT_MAX_RSS_MB)),
+        timeout=int(device_config.get_config("render_timeout_seconds", default=DEFAULT_RENDER_TIMEOUT))
+    )
+    _render_pool.start()
+    return _render_pool
+
+def get_render_pool():
+    """Returns the process-wide render pool, or None if it has not been initialized."""
+    return _render_pool
+
+class BrowserWorker:
+    """A long-lived headless chromium instance driven over the DevTools protocol.
+
+    The browser is started with `--remote-debugging-pipe`, so commands are exchanged as
+    null-terminated JSON messages over file descriptors 3 and 4 and no extra client library
+    is required. The worker keeps a single page open and reuses it for every render.
+    """
+
+    def __init__(self, browser_path, timeout=DEFAULT_RENDER_TIMEOUT):
+        self.browser_path = browser_path
+        self.timeout = timeout
+
+        self.process = None
+        self.render_count = 0
+        self._read_fd = None
+        self._write_fd = None
+        self._user_data_dir = None
+        self._session_id = None
+        self._message_id = 0
+        self._buffer = bytearray()
+        self._events = []
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Launches the browser and opens the page used for rendering."""
+        self.close()
+        logger.info("Starting headless browser worker")
+
+        # chromium reads commands from fd 3 and writes responses to fd 4
+        child_read, parent_write = os.pipe()
+        parent_read, child_write = os.pipe()
+        # move the child ends above 4, so moving them onto 3 and 4 in the child can't overwrite one another
+        child_fds = [fcntl.fcntl(fd, fcntl.F_DUPFD_CLOEXEC, 5) for fd in (child_read, child_write)]
+        os.close(child_read)
+        os.close(child_write)
+
+        self._user_data_dir = tempfile.mkdtemp(prefix="inkypi-browser-")
+        command = [self.browser_path, *BROWSER_FLAGS, f"--user-data-dir={self._user_data_dir}", "about:blank"]
+        # only the two pipe ends are inherited, a python trampoline puts them on 3 and 4 and then execs the
+        # browser, so no other descriptor of this process leaks into it and nothing runs between fork and exec
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, "-I", "-S", "-c", FD_TRAMPOLINE, *(str(fd) for fd in child_fds), *command],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                close_fds=True, pass_fds=child_fds
+            )
+        except Exception:
+            os.close(parent_read)
+            os.close(parent_write)
+            raise
+        finally:
+            for fd in child_fds:
+                os.close(fd)
+        self._read_fd, self._write_fd = parent_read, parent_write
+        self._buffer = bytearray()
+        self._events = []
+        self.render_count = 0
+
+        target_id = self._call("Target.createTarget", {"url": "about:blank"})["targetId"]
+        self._session_id = self._call("Target.attachToTarget", {"targetId": target_id, "flatten": True})["sessionId"]
+        self._call("Page.enable", session_id=self._session_id)
+
+    def render(self, html_str, dimensions):
+        """Renders the HTML at the given dimensions and returns the screenshot as a PIL Image."""
+        if not self.is_running():
+            self.start()
+
+        width, height = int(dimensions[0]), int(dimensions[1])
+        self._call("Emulation.setDeviceMetricsOverride", {
+            "width": width, "height": height, "deviceScaleFactor": 1, "mobile": False
+        }, session_id=self._session_id)
+
+        # load from a file so stylesheets, fonts and images referenced by absolute path resolve
+        with tempfile.NamedTemporaryFile(suffix=".html", delete=False) as html_file:
+            html_file.write(html_str.encode("utf-8"))
+            html_file_path = html_file.name
+
+        try:
+            deadline = time.monotonic() + self.timeout
+            self._events = []
+            result = self._call("Page.navigate", {"url": f"file://{html_file_path}"}, session_id=self._session_id)
+            if result.get("errorText"):
+                raise RuntimeError(f"Failed to load page: {result['errorText']}")
+            self._wait_for_event("Page.loadEventFired", deadline)
+
+            result = self._call("Page.captureScreenshot", {"format": "png"}, session_id=self._session_id)
+            image = Image.open(BytesIO(base64.b64decode(result["data"])))
+            image.load()
+        finally:
+            os.remove(html_file_path)
+
+        self.render_count += 1
+        return image
+
+    def get_rss_mb(self):
+        """Returns the memory used by the browser and all of its helper processes."""
+        if not self.is_running():
+            return None
+        return get_process_rss_mb(self.process.pid)
+
+    def close(self):
+        """Shuts the browser down, killing it if it does not exit promptly."""
+        if self.process is not None:
+            if self.process.poll() is None:
+                try:
+                    self._call("Browser.close", timeout=5)
+                except Exception:
+                    pass
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+
+        for fd in (self._read_fd, self._write_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._read_fd = self._write_fd = None
+        self._session_id = None
+
+        if self._user_data_dir:
+            shutil.rmtree(self._user_data_dir, ignore_errors=True)
+            self._user_data_dir = None
+
+    def _call(self, method, params=None, session_id=None, timeout=None):
+        """Sends a DevTools command and blocks until its response arrives."""
+        self._message_id += 1
+        message_id = self._message_id
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+
+        data = json.dumps(message).encode("utf-8") + b"\0"
+        while data:
+            written = os.write(self._write_fd, data)
+            data = data[written:]
+
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while True:
+            response = self._read_message(deadline)
+            if response.get("id") == message_id:
+                if "error" in response:
+                    raise RuntimeError(f"{method} failed: {response['error'].get('message')}")
+                return response.get("result", {})
+            if "method" in response:
+                self._events.append(response)
+
+    def _wait_for_event(self, method, deadline):
+        """Blocks until the given event is received for the render session."""
+        while True:
+            for event in self._events:
+                if event.get("method") == method and event.get("sessionId") == self._session_id:
+                    self._events.remove(event)
+                    return event
+            message = self._read_message(deadline)
+            if "method" in message:
+                self._events.append(message)
+
+    def _read_message(self, deadline):
+        """Reads the next null-terminated message from the browser."""
+        while True:
+            end = self._buffer.find(b"\0")
+            if end != -1:
+                message = bytes(self._buffer[:end])
+                del self._buffer[:end + 1]
+                return json.loads(message)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Timed out waiting for the browser")
+            ready, _, _ = select.select([self._read_fd], [], [], remaining)
+            if not ready:
+                raise TimeoutError("Timed out waiting for the browser")
+            chunk = os.read(self._read_fd, 65536)
+            if not chunk:
+                raise RuntimeError("Browser closed the debugging pipe")
+            self._buffer.extend(chunk)
+
+class RenderPool:
+    """Keeps a fixed number of headless browser workers warm and hands out renders to them.
+
+    Workers are recycled after `max_renders` screenshots or once their process tree grows past
+    `max_rss_mb`. After repeated consecutive failures the pool reports itself unhealthy so callers
+    can fall back to a simpler rendering path, and it retries after a cool down period.
+    """
+
+    def __init__(self, browser_path, pool_size=DEFAULT_POOL_SIZE, max_renders=DEFAULT_MAX_RENDERS,
+                 max_rss_mb=DEFAULT_MAX_RSS_MB, timeout=DEFAULT_RENDER_TIMEOUT):
+        self.max_renders = max_renders
+        self.max_rss_mb = max_rss_mb
+        self.timeout = timeout
+
+        self.workers = [BrowserWorker(browser_path, timeout) for _ in range(pool_size)]
+        self._idle_workers = queue.Queue()
+        for worker in self.workers:
+            self._idle_workers.put(worker)
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._unhealthy_since = None
+
+    def start(self):
+        """Starts the browser workers in the background so the first render doesn't pay for the launch."""
+        threading.Thread(target=self._warm_up, daemon=True).start()
+
+    def is_healthy(self):
+        """Returns False while the pool is cooling down after repeated failures."""
+        with self._lock:
+            if self._unhealthy_since is None:
+                return True
+            if time.monotonic() - self._unhealthy_since >= UNHEALTHY_RETRY_SECONDS:
+                logger.info("Retrying browser render pool after cool down")
+                self._unhealthy_since = None
+                self._consecutive_failures = 0
+                return True
+            return False
+
+    def render(self, html_str, dimensions):
+        """Renders the HTML on the next idle worker and returns a PIL Image."""
+        try:
+            worker = self._idle_workers.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError("Timed out waiting for an idle browser worker")
+
+        try:
+            image = worker.render(html_str, dimensions)
+            self._record_result(success=True)
+            self._recycle_if_needed(worker)
+            return image
+        except Exception:
+            worker.close()
+            self._record_result(success=False)
+            raise
+        finally:
+            self._idle_workers.put(worker)
+
+    def shutdown(self):
+        """Closes all browser workers."""
+        for worker in self.workers:
+            worker.close()
+
+    def _warm_up(self):
+        for _ in self.workers:
+            worker = self._idle_workers.get()
+            try:
+                if not worker.is_running():
+                    worker.start()
+            except Exception as e:
+                logger.error(f"Failed to start browser worker: {str(e)}")
+                worker.close()
+                self._record_result(success=False)
+            finally:
+                self._idle_workers.put(worker)
+
+    def _recycle_if_needed(self, worker):
+        rss_mb = worker.get_rss_mb() if self.max_rss_mb else None
+        if self.max_renders and worker.render_count >= self.max_renders:
+            logger.info(f"Recycling browser worker after {worker.render_count} renders")
+        elif rss_mb is not None and rss_mb > self.max_rss_mb:
+            logger.info(f"Recycling browser worker using {rss_mb:.0f}MB, limit is {self.max_rss_mb}MB")
+        else:
+            return
+        worker.close()
+        # bring a fresh browser up in the background once the worker is back in the idle queue
+        self.start()
+
+    def _record_result(self, success):
+        with self._lock:
+            if success:
+                self._consecutive_failures = 0
+                return
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= MAX_CONSECUTIVE_FAILURES and self._unhealthy_since is None:
+                logger.error(f"Browser render pool unhealthy after {self._consecutive_failures} consecutive failures")
+                self._unhealthy_since = time.monotonic()
@@ -0,0 +1,388 @@
+import email.utils
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+from utils.app_utils import resolve_path
+
+logger = logging.getLogger(__name__)
+
+# connect and read timeouts used when a request doesn't set its own
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# keep-alive connections kept per host
+POOL_MAXSIZE = 4
+
+DEFAULT_CACHE_DIR = resolve_path(os.path.join("cache", "http"))
+DEFAULT_CACHE_MAX_MB = 50
+
+# responses without explicit freshness but with Last-Modified are considered fresh for this fraction
+# of their age (RFC 9111 section 4.2.2)
+HEURISTIC_FRESHNESS_FRACTION = 0.1
+
+# size of the reads when a streamed body is written to or read from the cache
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# response headers kept with a cached body
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control", "Expires", "Date", "Age", "Vary")
+
+_session = None
+_cache = None
+_openai_clients = {}
+_lock = threading.Lock()
+
+_settings = {
+    "timeout": (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+    "retries": DEFAULT_RETRIES,
+    "cache_dir": DEFAULT_CACHE_DIR,
+    "cache_max_mb": DEFAULT_CACHE_MAX_MB
+}
+
+def init_http_client(device_config):
+    """Applies the http_* config keys to the shared HTTP client."""
+    global _session, _cache
+    with _lock:
+        _settings["timeout"] = (
+            device_config.get_config("http_connect_timeout_seconds", default=DEFAULT_CONNECT_TIMEOUT),
+            device_config.get_config("http_timeout_seconds", default=DEFAULT_READ_TIMEOUT)
+        )
+        _settings["retries"] = device_config.get_config("http_retries", default=DEFAULT_RETRIES)
+        _settings["cache_max_mb"] = device_config.get_config("http_cache_max_mb", default=DEFAULT_CACHE_MAX_MB)
+        # recreated with the new settings on next use
+        _session = None
+        _cache = None
+
+def get_session():
+    """Returns the process-wide requests session, which keeps connections alive and retries with backoff."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = TimeoutSession(_settings["timeout"])
+            retry = Retry(
+                total=_settings["retries"],
+                backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=["GET", "HEAD"],
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def get_cache():
+    """Returns the process-wide on-disk response cache."""
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = HttpCache(_settings["cache_dir"], _settings["cache_max_mb"])
+        return _cache
+
+def get(url, params=None, headers=None, timeout=None, cache=True, stream=False):
+    """Sends a GET request through the shared session.
+
+    With `cache` set, fresh cached responses are returned without a request, stale ones are revalidated with
+    If-None-Match / If-Modified-Since, and cacheable responses are stored. Cached responses have `from_cache` set.
+    With `stream`, the body is never read into memory: a cacheable response is written to the cache as it
+    arrives and read back from there, so it should be used as a context manager to close the body.
+    """
+    session = get_session()
+    if params:
+        url = requests.Request("GET", url, params=params).prepare().url
+    headers = dict(headers or {})
+    if not cache:
+        return session.get(url, headers=headers, timeout=timeout, stream=stream)
+
+    http_cache = get_cache()
+    entry = http_cache.lookup(url, headers)
+    if entry and entry.is_fresh():
+        return entry.to_response(url, stream)
+
+    if entry:
+        headers.update(entry.get_validators())
+    try:
+        response = session.get(url, headers=headers, timeout=timeout, stream=stream)
+        if entry and response.status_code == 304:
+            response.close()
+            entry = http_cache.refresh(url, headers, entry, response)
+            return entry.to_response(url, stream)
+    except Exception:
+        if entry:
+            entry.close()
+        raise
+    if entry:
+        # superseded by the new response
+        entry.close()
+
+    if response.status_code == 200:
+        stored = http_cache.store(url, headers, response)
+        if stored and stream:
+            # the body was consumed into the cache, stream it back from there
+            response = stored.to_response(url, stream)
+        elif stored:
+            stored.close()
+    response.from_cache = False
+    return response
+
+def get_openai_client(api_key):
+    """Returns an OpenAI client for the api key, reused between calls so its connections are kept alive."""
+    from openai import OpenAI
+
+    with _lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            client = OpenAI(api_key=api_key, timeout=_settings["timeout"][1], max_retries=_settings["retries"])
+            _openai_clients[api_key] = client
+        return client
+
+class TimeoutSession(requests.Session):
+    """Session applying a default timeout to requests that don't set one."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.default_timeout
+        return super().request(method, url, **kwargs)
+
+class CachedBody(io.FileIO):
+    """The body file of a cache entry. Used as the raw stream of a response, which closes it on release."""
+
+    def release_conn(self):
+        self.close()
+
+class CacheEntry:
+    """A cached response: its open body file, the headers needed to serve and revalidate it, and when it was
+    stored. The body is opened on lookup, so replacing the entry meanwhile doesn't change what is served."""
+
+    def __init__(self, meta, body_file):
+        self.meta = meta
+        self.body_file = body_file
+        self.headers = CaseInsensitiveDict(meta["headers"])
+
+    def close(self):
+        self.body_file.close()
+
+    def get_directives(self):
+        return parse_cache_control(self.headers.get("Cache-Control"))
+
+    def get_freshness_lifetime(self):
+        """Returns how many seconds the response is fresh for after it was received."""
+        directives = self.get_directives()
+        if "no-cache" in directives:
+            return 0
+        if "max-age" in directives:
+            try:
+                return int(directives["max-age"])
+            except (TypeError, ValueError):
+                return 0
+
+        date = parse_http_date(self.headers.get("Date")) or self.meta["stored_at"]
+        expires = self.headers.get("Expires")
+        if expires is not None:
+            expires_at = parse_http_date(expires)
+            return max(0, expires_at - date) if expires_at else 0
+
+        last_modified = parse_http_date(self.headers.get("Last-Modified"))
+        if last_modified:
+            return max(0, (date - last_modified) * HEURISTIC_FRESHNESS_FRACTION)
+        return 0
+
+    def get_age(self):
+        try:
+            age = int(self.headers.get("Age", 0))
+        except ValueError:
+            age = 0
+        return age + time.time() - self.meta["stored_at"]
+
+    def is_fresh(self):
+        return self.get_age() < self.get_freshness_lifetime()
+
+    def get_validators(self):
+        validators = {}
+        if self.headers.get("ETag"):
+            validators["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = self.headers["Last-Modified"]
+        return validators
+
+    def to_response(self, url, stream=False):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        if stream:
+            response.raw = self.body_file
+        else:
+            with self.body_file:
+                response._content = self.body_file.read()
+            response._content_consumed = True
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.from_cache = True
+        return response
+
+class HttpCache:
+    """On-disk HTTP response cache for GET requests (RFC 9111, private cache).
+
+    Each entry is a body file and a JSON metadata file named after the hash of the URL and the request
+    headers listed in Vary. Entries are written atomically, so the cache can be shared by worker processes.
+    When the cache grows past `max_mb`, the least recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir, max_mb):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def lookup(self, url, request_headers):
+        vary = self._read_json(self._get_path(self._get_key(url), ".vary"))
+        key = self._get_key(url, vary, request_headers)
+        meta = self._read_json(self._get_path(key, ".json"))
+        if not meta:
+            return None
+        try:
+            body_file = CachedBody(self._get_path(key, ".body"))
+        except OSError:
+            return None
+        # access time drives the eviction order
+        os.utime(self._get_path(key, ".json"))
+        return CacheEntry(meta, body_file)
+
+    def store(self, url, request_headers, response):
+        """Stores a 200 response and returns its entry, or None if it isn't cacheable.
+
+        The body is written in chunks as it is read, so a streamed response is never held in memory.
+        """
+        directives = parse_cache_control(response.headers.get("Cache-Control"))
+        vary = [header.strip() for header in response.headers.get("Vary", "").split(",") if header.strip()]
+        if "no-store" in directives or "*" in vary or "Authorization" in request_headers:
+            return None
+        if not (response.headers.get("ETag") or response.headers.get("Last-Modified")
+                or "max-age" in directives or response.headers.get("Expires")):
+            # neither fresh nor revalidatable, caching it would never save a request
+            return None
+
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        # the URL isn't stored, its query string can hold API keys and the hashed key is enough for lookups
+        meta = {"stored_at": time.time(), "headers": headers}
+        vary_path = self._get_path(self._get_key(url), ".vary")
+        if vary:
+            self._write(vary_path, json.dumps(vary).encode("utf-8"))
+        else:
+            # the representation no longer varies, stop looking up entries by the old headers
+            try:
+                os.remove(vary_path)
+            except FileNotFoundError:
+                pass
+        key = self._get_key(url, vary, request_headers)
+        self._write(self._get_path(key, ".body"), response.iter_content(STREAM_CHUNK_BYTES))
+        self._write(self._get_path(key, ".json"), json.dumps(meta).encode("utf-8"))
+        # opened before evicting, the body stays readable even if this entry is evicted right away
+        body_file = CachedBody(self._get_path(key, ".body"))
+        self._evict()
+        return CacheEntry(meta, body_file)
+
+    def refresh(self, url, request_headers, entry, response):
+        """Updates a revalidated entry with the headers of the 304 response."""
+        headers = dict(entry.meta["headers"])
+        for name in CACHED_HEADERS:
+            if name in response.headers:
+                headers[name] = response.headers[name]
+        headers.pop("Age", None)
+        meta = dict(entry.meta, stored_at=time.time(), headers=headers)
+        vary = self._read_json(self._get_path(self._get_key(url), ".vary"))
+        self._write(self._get_path(self._get_key(url, vary, request_headers), ".json"), json.dumps(meta).encode("utf-8"))
+        return CacheEntry(meta, entry.body_file)
+
+    def _get_key(self, url, vary=None, request_headers=None):
+        parts = [url]
+        if vary:
+            request_headers = CaseInsensitiveDict(request_headers or {})
+            # validators are added by the cache itself and never select a different representation
+            parts += [f"{name.lower()}:{request_headers.get(name, '')}" for name in vary]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def _get_path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _read_json(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write(self, path, data):
+        """Atomically writes bytes, or an iterable of byte chunks, to path."""
+        if isinstance(data, bytes):
+            data = (data,)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in data:
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _evict(self):
+        entries = {}
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            total += stat.st_size
+            key = os.path.splitext(name)[0]
+            entry = entries.setdefault(key, {"size": 0, "used": 0})
+            entry["size"] += stat.st_size
+            entry["used"] = max(entry["used"], stat.st_mtime)
+
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            for suffix in (".json", ".body", ".vary"):
+                try:
+                    os.remove(self._get_path(key, suffix))
+                except OSError:
+                    pass
+            total -= entry["size"]
+            logger.debug(f"Evicted cached response {key}")
+
+def parse_cache_control(value):
+    """Parses a Cache-Control header into a dict of lower case directives and their values (or None)."""
+    directives = {}
+    for part in (value or "").split(","):
+        match = re.match(r'\s*([\w-]+)\s*(?:=\s*"?([^"]*)"?)?\s*$', part)
+        if match:
+            directives[match.group(1).lower()] = match.group(2)
+    return directives
+
+def parse_http_date(value):
+    """Returns the timestamp of an HTTP date, or None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
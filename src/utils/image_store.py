@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from utils.app_utils import resolve_path
+
+logger = logging.getLogger(__name__)
+
+# directory holding the uploaded files, each stored once under the SHA-256 of its content
+STORE_DIR = resolve_path(os.path.join("static", "images", "saved"))
+
+# maps the content hash of every stored file to its original names, size and reference count
+INDEX_FILE = os.path.join(STORE_DIR, "index.json")
+
+# bytes copied at a time when saving uploaded files
+CHUNK_SIZE = 1024 * 1024
+
+# seconds an unreferenced file is kept, e.g. an upload used for "update now" before the settings are saved
+DEFAULT_GC_GRACE_SECONDS = 3600
+
+_lock = threading.RLock()
+
+def save_upload(file):
+    """Stores an uploaded file by the hash of its content and returns its path.
+
+    The upload is streamed to a temporary file while it is hashed. Identical content uploaded again, under any
+    name, resolves to the existing file, and different files with the same name no longer overwrite each other.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    file_name = os.path.basename(file.filename)
+    extension = os.path.splitext(file_name)[1].lower()
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(suffix=".upload", dir=STORE_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        content_hash = digest.hexdigest()
+        file_path = get_path(content_hash, extension)
+
+        with _lock:
+            if os.path.exists(file_path):
+                os.remove(tmp_path)
+            else:
+                # mkstemp creates the file private to the owner
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, file_path)
+
+            index = read_index()
+            entry = index.setdefault(content_hash, {"extension": extension, "names": [], "refs": 0})
+            entry["size"] = os.path.getsize(file_path)
+            entry["last_used"] = time.time()
+            if file_name not in entry["names"]:
+                entry["names"].append(file_name)
+            write_index(index)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    logger.info(f"Stored upload {file_name} as {file_path}")
+    return file_path
+
+def get_path(content_hash, extension):
+    """Returns the path a file with the given content hash and extension is stored at."""
+    return os.path.join(STORE_DIR, f"{content_hash}{extension}")
+
+def get_content_hash(file_path):
+    """Returns the content hash of a stored file, or None if the path isn't in the store."""
+    if os.path.dirname(os.path.abspath(file_path)) != os.path.abspath(STORE_DIR):
+        return None
+    content_hash = os.path.splitext(os.path.basename(file_path))[0]
+    with _lock:
+        return content_hash if content_hash in read_index() else None
+
+def get_names(file_paths=None):
+    """Maps the given stored paths (or all of them) to the name they were uploaded with, for display."""
+    with _lock:
+        index = read_index()
+    if file_paths is None:
+        file_paths = [get_path(content_hash, entry.get("extension", "")) for content_hash, entry in index.items()]
+    names = {}
+    for file_path in file_paths:
+        entry = index.get(os.path.splitext(os.path.basename(file_path))[0])
+        names[file_path] = entry["names"][0] if entry and entry["names"] else os.path.basename(file_path)
+    return names
+
+def collect_garbage(device_config):
+    """Recounts the references from plugin instance settings and removes stored files nobody uses.
+
+    Unreferenced files are removed once they haven't been used for `upload_gc_grace_seconds`, along with
+    the derived images generated from them. Returns the number of files removed.
+    """
+    grace_seconds = device_config.get_config("upload_gc_grace_seconds", default=DEFAULT_GC_GRACE_SECONDS)
+    refs = count_references(device_config)
+    now = time.time()
+    removed = []
+
+    with _lock:
+        index = read_index()
+        for content_hash, entry in list(index.items()):
+            entry["refs"] = refs.get(content_hash, 0)
+            if entry["refs"]:
+                entry["last_used"] = now
+                continue
+            if now - entry.get("last_used", 0) < grace_seconds:
+                continue
+            file_path = get_path(content_hash, entry.get("extension", ""))
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except OSError as e:
+                logger.error(f"Failed to remove unreferenced upload {file_path}: {str(e)}")
+                continue
+            del index[content_hash]
+            removed.append(content_hash)
+        write_index(index)
+
+    if removed:
+        _remove_derived(removed)
+        logger.info(f"Removed {len(removed)} unreferenced uploads")
+    return len(removed)
+
+def count_references(device_config):
+    """Counts the plugin instance settings referring to each stored file, by content hash."""
+    refs = {}
+    store_dir = os.path.abspath(STORE_DIR)
+    for playlist in device_config.get_playlist_manager().playlists:
+        for plugin_instance in playlist.plugins:
+            for value in plugin_instance.settings.values():
+                for item in value if isinstance(value, list) else [value]:
+                    if isinstance(item, str) and os.path.dirname(os.path.abspath(item)) == store_dir:
+                        content_hash = os.path.splitext(os.path.basename(item))[0]
+                        refs[content_hash] = refs.get(content_hash, 0) + 1
+    return refs
+
+def read_index():
+    if not os.path.exists(INDEX_FILE):
+        return {}
+    try:
+        with open(INDEX_FILE) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Failed to read upload index {INDEX_FILE}: {str(e)}")
+        return {}
+
+def write_index(index):
+    fd, tmp_path = tempfile.mkstemp(prefix=".index.", suffix=".json.tmp", dir=STORE_DIR)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=4)
+        if os.path.exists(INDEX_FILE):
+            shutil.copymode(INDEX_FILE, tmp_path)
+        os.replace(tmp_path, INDEX_FILE)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _remove_derived(content_hashes):
+    """Removes derived images named after the given content hashes."""
+    derived_dir = resolve_path(os.path.join("static", "images", "derived"))
+    if not os.path.isdir(derived_dir):
+        return
+    prefixes = tuple(f"{content_hash}-" for content_hash in content_hashes)
+    for file_name in os.listdir(derived_dir):
+        if file_name.startswith(prefixes):
+            os.remove(os.path.join(derived_dir, file_name))
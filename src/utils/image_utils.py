@@ -1,29 +1,105 @@
-import requests
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 import os
+import math
 import logging
 import hashlib
+import zlib
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import tempfile
 import subprocess
 import shutil
+from utils.browser_renderer import get_render_pool
+from utils import http_client
 
 logger = logging.getLogger(__name__)
 
-def get_image(image_url):
-    response = requests.get(image_url)
+# size in pixels of the square tiles used to detect which parts of a frame changed
+DEFAULT_TILE_SIZE = 32
+
+DITHER_MODES = ("none", "ordered", "diffusion")
+
+# bits per channel kept when looking up the nearest palette colour, 5 bits gives a 32x32x32 table
+LUT_BITS = 5
+
+# smallest band of rows worth handing to another quantization thread
+MIN_BAND_ROWS = 64
+
+# 8x8 Bayer threshold matrix, normalised to offsets between -0.5 and 0.5
+BAYER_MATRIX = (np.array([
+    [0, 32, 8, 40, 2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21]
+]) + 0.5) / 64 - 0.5
+
+# modes Image.reduce supports, palette images are left at full size
+REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "CMYK")
+
+# transposes rotating an image counter clockwise by the given number of quarter turns
+QUARTER_TURNS = {
+    1: Image.Transpose.ROTATE_90,
+    2: Image.Transpose.ROTATE_180,
+    3: Image.Transpose.ROTATE_270
+}
+
+_quantize_pool = None
+_quantize_pool_lock = threading.Lock()
+
+def get_image(image_url, target_size=None):
+    response = http_client.get(image_url)
     img = None
     if 200 <= response.status_code < 300 or response.status_code == 304:
-        img = Image.open(BytesIO(response.content))
+        img = open_image(BytesIO(response.content), target_size)
     else:
         logger.error(f"Received non-200 response from {image_url}: status_code: {response.status_code}")
     return img
 
+def open_image(source, target_size=None, any_orientation=False):
+    """Opens an image, decoding it at the smallest size that still covers target_size.
+
+    JPEGs are decoded at a reduced scale with draft mode, which skips most of the decoding work, and the
+    result is shrunk further by an integer factor with reduce. Images are never scaled below target_size.
+
+    Args:
+        source: File path or file object
+        target_size: Tuple of (width, height) the image is displayed at, or None to decode at full size
+        any_orientation: Cover target_size in the orientation of the image (e.g. when the image is rotated
+            to fit the display)
+    """
+    image = Image.open(source)
+    if not target_size:
+        return image
+
+    target_width, target_height = target_size
+    if any_orientation and (image.width > image.height) != (target_width > target_height):
+        target_width, target_height = target_height, target_width
+    scale = max(target_width / image.width, target_height / image.height)
+    if scale >= 1:
+        return image
+
+    requested_size = (math.ceil(image.width * scale), math.ceil(image.height * scale))
+    original_size = image.size
+    if image.format == "JPEG":
+        # picks the largest DCT scaling that still produces at least the requested size
+        image.draft(None, requested_size)
+    factor = min(image.width // requested_size[0], image.height // requested_size[1])
+    if factor >= 2 and image.mode in REDUCIBLE_MODES:
+        image = image.reduce(factor)
+    if image.size != original_size:
+        logger.debug(f"Decoded image at {image.size} instead of {original_size} for target {target_size}")
+    return image
+
 def change_orientation(image, orientation):
-    if orientation == 'horizontal':
-        image = image.rotate(0, expand=1)
-    elif orientation == 'vertical':
-        image = image.rotate(90, expand=1)
+    if orientation == 'vertical':
+        image = image.transpose(Image.Transpose.ROTATE_90)
     return image
 
 def resize_image(image, desired_size, image_settings=[]):
@@ -42,80 +118,129 @@ def resize_image(image, desired_size, image_settings=[]):
             - "rotate-X": Rotate X degrees (e.g. rotate-90 = 90°)
             - "quality-X": X can be "high", "medium" or "low"
             - "center-X,Y": Center point as percentages (e.g. center-25,75)
+            - "dither-X": Dither mode used when quantizing for the panel (see quantize_image)
     
     Returns:
         Processed PIL Image object
     """
-    # Get original dimensions
-    img_width, img_height = image.size
+    return transform_image(image, desired_size, image_settings)
+
+def transform_image(image, desired_size, image_settings=[], orientation=None):
+    """Applies the panel orientation and the image_settings of resize_image in a single resampling pass."""
+    plan = get_transform_plan(image.size, desired_size, image_settings, orientation)
+    if plan.rotation:
+        # rotations that aren't multiples of 90 degrees need their own resampling pass
+        # (Pillow's rotate doesn't support LANCZOS)
+        resample = Image.BICUBIC if plan.resample == Image.LANCZOS else plan.resample
+        image = image.rotate(plan.rotation, expand=True, resample=resample)
+        settings = [setting for setting in image_settings if not setting.startswith("rotate-")]
+        plan = get_transform_plan(image.size, desired_size, settings)
+    return plan.apply(image)
+
+def get_transform_plan(source_size, desired_size, image_settings=[], orientation=None):
+    """Returns the TransformPlan for images of source_size, cached per source size, settings and panel."""
+    desired_size = (int(desired_size[0]), int(desired_size[1]))
+    return _build_transform_plan(tuple(source_size), desired_size, tuple(image_settings), orientation)
+
+class TransformPlan:
+    """The geometry turning a source image into a panel frame: a crop box resized in one pass, an optional
+    lossless transpose of the (small) result and, for preserve-aspect, a white canvas to paste it on.
+    """
+
+    def __init__(self, source_size, box, resize_size, quarter_turns, canvas_size, offset, resample, reducing_gap, rotation=0):
+        self.source_size = source_size
+        self.box = box
+        self.resize_size = resize_size
+        self.quarter_turns = quarter_turns
+        self.canvas_size = canvas_size
+        self.offset = offset
+        self.resample = resample
+        self.reducing_gap = reducing_gap
+        # arbitrary rotation to apply before the plan can be computed, in degrees counter clockwise
+        self.rotation = rotation
+
+    def is_identity(self):
+        return (not self.quarter_turns and not self.canvas_size and self.resize_size == self.source_size
+                and self.box == (0, 0) + self.source_size)
+
+    def apply(self, image):
+        if image.size != self.source_size:
+            raise ValueError(f"Transform plan for {self.source_size} applied to an image of size {image.size}")
+        if self.is_identity():
+            return image
+
+        result = image
+        if self.resize_size != self.source_size or self.box != (0, 0) + self.source_size:
+            result = image.resize(self.resize_size, self.resample, box=self.box, reducing_gap=self.reducing_gap)
+        if self.quarter_turns:
+            result = result.transpose(QUARTER_TURNS[self.quarter_turns])
+        if self.canvas_size:
+            canvas = Image.new("RGB", self.canvas_size, (255, 255, 255))
+            canvas.paste(result, self.offset)
+            result = canvas
+        return result
+
+@lru_cache(maxsize=32)
+def _build_transform_plan(source_size, desired_size, image_settings, orientation):
     desired_width, desired_height = desired_size
-    desired_width, desired_height = int(desired_width), int(desired_height)
-    
+
     # Initialize quality setting (affects resampling method)
     quality = "high"
+    rotation_degrees = 0.0
+    zoom_level = 1.0
+    center_x, center_y = 50, 50  # Default center point (50%, 50%)
     for setting in image_settings:
-        if setting.startswith("quality-"):
-            quality = setting.split("-")[1]
-    
+        try:
+            if setting.startswith("quality-"):
+                quality = setting.split("-")[1]
+            elif setting.startswith("rotate-"):
+                rotation_degrees = float(setting[len("rotate-"):])
+            elif setting.startswith("zoom-") and zoom_level == 1.0:
+                # Extract zoom percentage (e.g., zoom-80 = 80%)
+                zoom_level = float(setting.split("-")[1]) / 100.0
+            elif setting.startswith("center-"):
+                center_parts = setting.split("-")[1].split(",")
+                if len(center_parts) == 2:
+                    center_x, center_y = float(center_parts[0]), float(center_parts[1])
+        except (IndexError, ValueError):
+            pass
+
     # Get resampling method based on quality
     if quality == "high":
         resample_method = Image.LANCZOS  # Highest quality, slowest
+        reducing_gap = None
     elif quality == "medium":
         resample_method = Image.BICUBIC  # Good quality, medium speed
+        reducing_gap = 3.0
     else:
         resample_method = Image.BILINEAR  # Lower quality, fastest
-    
-    # Check for custom rotation
-    for setting in image_settings:
-        if setting.startswith("rotate-"):
-            try:
-                rotation_degrees = float(setting.split("-")[1])
-                # Note: expand=True ensures the entire rotated image is visible
-                image = image.rotate(rotation_degrees, expand=True, resample=resample_method)
-                # Update dimensions after rotation
-                img_width, img_height = image.size
-            except (ValueError, IndexError):
-                pass
-    
+        reducing_gap = 2.0
+
+    quarter_turns = 1 if orientation == 'vertical' else 0
+    if rotation_degrees % 90:
+        total_rotation = rotation_degrees + 90 * quarter_turns
+        return TransformPlan(source_size, None, None, 0, None, None, resample_method, reducing_gap, rotation=total_rotation)
+    quarter_turns = (quarter_turns + int(rotation_degrees // 90)) % 4
+
+    # Work out the crop and resize in the rotated frame, then map them back onto the source
+    img_width, img_height = source_size
+    if quarter_turns % 2:
+        img_width, img_height = img_height, img_width
+
     # Check for portrait mode setting
-    portrait_mode = "portrait-mode" in image_settings
-    if portrait_mode and img_width > img_height:
-        # Rotate the image to portrait orientation
-        image = image.transpose(Image.ROTATE_90)
-        img_width, img_height = img_height, img_width  # Update dimensions after rotation
-    
-    # Check for zoom level (defaults to 1.0 = 100%)
-    zoom_level = 1.0
-    for setting in image_settings:
-        if setting.startswith("zoom-"):
-            try:
-                # Extract zoom percentage (e.g., zoom-80 = 80%)
-                zoom_percent = float(setting.split("-")[1])
-                zoom_level = zoom_percent / 100.0
-                break
-            except (IndexError, ValueError):
-                pass
-    
-    # Calculate custom center point for cropping (default: center of image)
-    center_x, center_y = 50, 50  # Default center point (50%, 50%)
-    for setting in image_settings:
-        if setting.startswith("center-"):
-            try:
-                center_parts = setting.split("-")[1].split(",")
-                if len(center_parts) == 2:
-                    center_x = float(center_parts[0])
-                    center_y = float(center_parts[1])
-            except (IndexError, ValueError):
-                pass
-    
+    if "portrait-mode" in image_settings and img_width > img_height:
+        quarter_turns = (quarter_turns + 1) % 4
+        img_width, img_height = img_height, img_width
+
     # Calculate aspect ratios
     img_ratio = img_width / img_height
     desired_ratio = desired_width / desired_height
-    
+
     # Set up processing flags
     keep_width = "keep-width" in image_settings
     preserve_aspect = "preserve-aspect" in image_settings or "fit" in image_settings
 
+    canvas_size, offset = None, None
     if preserve_aspect:
         # Scale the image to fit within the desired dimensions
         # while maintaining aspect ratio and applying zoom level
@@ -127,68 +252,229 @@ def resize_image(image, desired_size, image_settings=[]):
             # Image is taller than the target ratio
             new_height = int(desired_height * zoom_level)
             new_width = int((desired_height * img_ratio) * zoom_level)
-            
-        # Resize the image while maintaining aspect ratio
-        resized_image = image.resize((new_width, new_height), resample_method)
-        
-        # Create a blank image with the desired dimensions
-        result = Image.new("RGB", (desired_width, desired_height), (255, 255, 255))
-        
-        # Paste the resized image centered in the blank image
-        offset_x = (desired_width - new_width) // 2
-        offset_y = (desired_height - new_height) // 2
-        result.paste(resized_image, (offset_x, offset_y))
-        
-        return result
+
+        box = (0, 0, img_width, img_height)
+        output_size = (new_width, new_height)
+        # The resized image is pasted centered on a blank image with the desired dimensions
+        canvas_size = (desired_width, desired_height)
+        offset = ((desired_width - new_width) // 2, (desired_height - new_height) // 2)
     else:
-        # Original cropping behavior with custom center point
-        # Calculate crop dimensions
+        # Crop with custom center point
         if img_ratio > desired_ratio:
             # Image is wider than desired aspect ratio
             new_width = int(img_height * desired_ratio)
-            
+            x_offset = 0
             if not keep_width:
-                # Calculate x offset based on center_x preference (as percentage)
                 # 0% = left edge, 50% = center, 100% = right edge
-                total_crop = img_width - new_width
-                x_offset = int((center_x / 100) * total_crop)
+                x_offset = int((center_x / 100) * (img_width - new_width))
                 x_offset = max(0, min(x_offset, img_width - new_width))  # Ensure valid range
-            else:
-                x_offset = 0
-            
-            y_offset = 0
-            new_height = img_height
+            box = (x_offset, 0, x_offset + new_width, img_height)
         else:
             # Image is taller than desired aspect ratio
             new_height = int(img_width / desired_ratio)
-            
+            y_offset = 0
             if not keep_width:
-                # Calculate y offset based on center_y preference (as percentage)
                 # 0% = top edge, 50% = center, 100% = bottom edge
-                total_crop = img_height - new_height
-                y_offset = int((center_y / 100) * total_crop)
+                y_offset = int((center_y / 100) * (img_height - new_height))
                 y_offset = max(0, min(y_offset, img_height - new_height))  # Ensure valid range
-            else:
-                y_offset = 0
-            
-            x_offset = 0
-            new_width = img_width
+            box = (0, y_offset, img_width, y_offset + new_height)
+        output_size = (desired_width, desired_height)
 
-        # Crop the image
-        cropped_image = image.crop((x_offset, y_offset, x_offset + new_width, y_offset + new_height))
+    # Undo the counter clockwise quarter turns one at a time to find the box in source coordinates
+    rotated_width, rotated_height = img_width, img_height
+    for _ in range(quarter_turns):
+        left, top, right, bottom = box
+        box = (rotated_height - bottom, left, rotated_height - top, right)
+        rotated_width, rotated_height = rotated_height, rotated_width
 
-        # Resize to the exact desired dimensions
-        return cropped_image.resize((desired_width, desired_height), resample_method)
+    resize_size = output_size if quarter_turns % 2 == 0 else (output_size[1], output_size[0])
+    return TransformPlan(source_size, box, resize_size, quarter_turns, canvas_size, offset, resample_method, reducing_gap)
 
 def compute_image_hash(image):
     """Compute SHA-256 hash of an image."""
-    image = image.convert("RGB")
+    if image.mode != "RGB":
+        image = image.convert("RGB")
     img_bytes = image.tobytes()
     return hashlib.sha256(img_bytes).hexdigest()
 
+def get_palette_lut(palette):
+    """Returns a lookup table mapping RGB values, reduced to LUT_BITS per channel, to the nearest palette index.
+
+    Tables are cached per palette, so they are only computed for the first frame.
+    """
+    return _build_palette_lut(tuple(tuple(colour) for colour in palette))
+
+@lru_cache(maxsize=8)
+def _build_palette_lut(palette):
+    size = 1 << LUT_BITS
+    shift = 8 - LUT_BITS
+    # compare the centre of every bucket against each palette colour
+    levels = (np.arange(size, dtype=np.int32) << shift) + (1 << (shift - 1))
+    r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+    colours = np.stack([r, g, b], axis=-1).reshape(-1, 1, 3)
+    palette_colours = np.array(palette, dtype=np.int32).reshape(1, -1, 3)
+    distances = ((colours - palette_colours) ** 2).sum(axis=2)
+    return distances.argmin(axis=1).astype(np.uint8).reshape(size, size, size)
+
+def quantize_image(image, palette, dither="diffusion"):
+    """Map an image onto a fixed palette, producing the buffer the panel shows.
+
+    Args:
+        image: PIL Image object
+        palette: List of (r, g, b) tuples, in the order of the panel's colour indices
+        dither: One of DITHER_MODES
+            - "none": Map every pixel to the nearest palette colour
+            - "ordered": Bayer matrix dithering, fast and stable between similar frames
+            - "diffusion": Floyd-Steinberg error diffusion, as done by the Inky drivers
+
+    Returns:
+        A "P" mode image whose pixel values are the palette indices.
+    """
+    if dither not in DITHER_MODES:
+        raise ValueError(f"Unsupported dither mode: {dither}")
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    flat_palette = [channel for colour in palette for channel in colour]
+
+    if dither == "diffusion":
+        # error diffusion is sequential by nature, Pillow does it in C in a single pass
+        palette_image = Image.new("P", (1, 1))
+        # pad with copies of the first colour so unused entries are never picked
+        palette_image.putpalette(flat_palette + list(palette[0]) * (256 - len(palette)))
+        quantized = image.quantize(palette=palette_image, dither=Image.Dither.FLOYDSTEINBERG)
+        quantized.putpalette(flat_palette)
+        return quantized
+
+    lut = get_palette_lut(palette)
+    # ordered dithering offsets pixels by up to half the spread of the palette on each side
+    spread = int(np.ptp(np.array(palette, dtype=np.int16), axis=0).max()) if dither == "ordered" else 0
+    pixels = np.asarray(image)
+    indices = np.empty(pixels.shape[:2], dtype=np.uint8)
+
+    bands = _split_bands(pixels.shape[0])
+    if len(bands) == 1:
+        _quantize_band(pixels, indices, lut, spread, 0, pixels.shape[0])
+    else:
+        pool = _get_quantize_pool()
+        futures = [pool.submit(_quantize_band, pixels, indices, lut, spread, top, bottom) for top, bottom in bands]
+        for future in futures:
+            future.result()
+
+    quantized = Image.fromarray(indices)
+    quantized.putpalette(flat_palette)
+    return quantized
+
+def _quantize_band(pixels, indices, lut, spread, top, bottom):
+    """Quantizes rows top to bottom of the pixels into the indices array."""
+    band = pixels[top:bottom]
+    if spread:
+        rows = np.arange(top, bottom) % BAYER_MATRIX.shape[0]
+        cols = np.arange(band.shape[1]) % BAYER_MATRIX.shape[1]
+        threshold = (BAYER_MATRIX[np.ix_(rows, cols)] * spread).astype(np.int16)
+        band = np.clip(band.astype(np.int16) + threshold[..., np.newaxis], 0, 255).astype(np.uint8)
+    shift = 8 - LUT_BITS
+    indices[top:bottom] = lut[band[..., 0] >> shift, band[..., 1] >> shift, band[..., 2] >> shift]
+
+def _split_bands(height):
+    """Splits the rows of an image into one band per core, but not into bands smaller than MIN_BAND_ROWS."""
+    band_count = max(1, min(os.cpu_count() or 1, height // MIN_BAND_ROWS))
+    band_rows = -(-height // band_count)
+    return [(top, min(top + band_rows, height)) for top in range(0, height, band_rows)]
+
+def _get_quantize_pool():
+    global _quantize_pool
+    with _quantize_pool_lock:
+        if _quantize_pool is None:
+            _quantize_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="quantize")
+        return _quantize_pool
+
+def compute_tile_hashes(image, tile_size=DEFAULT_TILE_SIZE):
+    """Compute a CRC32 hash for each tile_size x tile_size tile of an image.
+
+    Returns a 2D numpy array of hashes indexed by (tile row, tile column). Edge tiles are zero padded.
+    "P" mode images are hashed by palette index, so they should share the same palette.
+    """
+    if image.mode not in ("RGB", "L", "P"):
+        image = image.convert("RGB")
+    pixels = np.asarray(image)
+    height, width = pixels.shape[:2]
+    rows, cols = -(-height // tile_size), -(-width // tile_size)
+
+    padding = [(0, rows * tile_size - height), (0, cols * tile_size - width)] + [(0, 0)] * (pixels.ndim - 2)
+    pixels = np.pad(pixels, padding)
+    # regroup the pixels so each tile is one contiguous block
+    tiles = np.ascontiguousarray(pixels.reshape(rows, tile_size, cols, tile_size, -1).swapaxes(1, 2)).reshape(rows, cols, -1)
+
+    hashes = np.empty((rows, cols), dtype=np.uint32)
+    for row in range(rows):
+        for col in range(cols):
+            hashes[row, col] = zlib.crc32(tiles[row, col])
+    return hashes
+
+def get_changed_regions(previous_hashes, tile_hashes, image_size, tile_size=DEFAULT_TILE_SIZE):
+    """Returns the bounding boxes (left, top, right, bottom) of the tiles that differ between two frames.
+
+    Adjacent changed tiles are grouped into a single box and overlapping boxes are merged. The full frame is
+    returned when there is no previous frame to compare against.
+    """
+    width, height = image_size
+    if previous_hashes is None or previous_hashes.shape != tile_hashes.shape:
+        return [(0, 0, width, height)]
+
+    changed = previous_hashes != tile_hashes
+    visited = np.zeros_like(changed)
+    regions = []
+    for row, col in zip(*np.nonzero(changed)):
+        if visited[row, col]:
+            continue
+        # flood fill the group of changed tiles connected to this one
+        stack = [(row, col)]
+        visited[row, col] = True
+        top, left, bottom, right = row, col, row, col
+        while stack:
+            r, c = stack.pop()
+            top, left, bottom, right = min(top, r), min(left, c), max(bottom, r), max(right, c)
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= nr < changed.shape[0] and 0 <= nc < changed.shape[1] and changed[nr, nc] and not visited[nr, nc]:
+                    visited[nr, nc] = True
+                    stack.append((nr, nc))
+        regions.append((int(left) * tile_size, int(top) * tile_size,
+                        min(int(right + 1) * tile_size, width), min(int(bottom + 1) * tile_size, height)))
+
+    return _merge_regions(regions)
+
+def _merge_regions(regions):
+    """Merges overlapping bounding boxes until none overlap."""
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
 def take_screenshot_html(html_str, dimensions):
     """Take a screenshot of rendered HTML content."""
     image = None
+
+    # Prefer the warm browser pool when it has been started
+    render_pool = get_render_pool()
+    if render_pool:
+        if render_pool.is_healthy():
+            try:
+                return render_pool.render(html_str, dimensions)
+            except Exception as e:
+                logger.error(f"Failed to take screenshot: {str(e)}")
+        else:
+            logger.warning("Browser render pool is unhealthy, using fallback rendering method")
+        return render_fallback_image(dimensions, "")
     
     # Check if chromium-browser is available
     chromium_available = shutil.which("chromium-browser") is not None
@@ -0,0 +1,26 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_context = threading.local()
+
+@contextmanager
+def stage_callback(callback):
+    """Routes stages reported by code running in this thread to the given callback for the duration of the block."""
+    previous = getattr(_context, "callback", None)
+    _context.callback = callback
+    try:
+        yield
+    finally:
+        _context.callback = previous
+
+def report_stage(stage):
+    """Reports the stage of the current refresh (e.g. 'rendering'), a no-op when nobody is listening."""
+    callback = getattr(_context, "callback", None)
+    if callback:
+        try:
+            callback(stage)
+        except Exception as e:
+            logger.warning(f"Failed to report stage '{stage}': {str(e)}")
@@ -0,0 +1,190 @@
+import logging
+from PIL import Image, ImageColor, ImageDraw, ImageOps
+from utils.app_utils import get_font, get_text_length
+
+logger = logging.getLogger(__name__)
+
+# spacing between lines as a fraction of the font size
+DEFAULT_LINE_SPACING = 0.25
+
+# smallest font size fit_text goes down to
+MIN_FONT_SIZE = 8
+
+ELLIPSIS = "…"
+
+def wrap_text(text, font, max_width):
+    """Breaks text into lines no wider than max_width.
+
+    Newlines in the text start a new line. Each word is measured once and lines are built by adding up the
+    word widths, instead of measuring the growing line again for every word. Words wider than max_width are
+    broken over several lines.
+    """
+    space_width = get_text_length(font, " ")
+    lines = []
+    for paragraph in text.split("\n"):
+        line = []
+        line_width = 0
+        for word in paragraph.split():
+            word_width = get_text_length(font, word)
+            if word_width > max_width:
+                if line:
+                    lines.append(" ".join(line))
+                # the remainder of the word starts the next line
+                pieces = _break_word(word, font, max_width)
+                lines.extend(pieces[:-1])
+                line = [pieces[-1]]
+                line_width = get_text_length(font, pieces[-1])
+                continue
+            if line and line_width + space_width + word_width > max_width:
+                lines.append(" ".join(line))
+                line, line_width = [], 0
+            line_width += (space_width if line else 0) + word_width
+            line.append(word)
+        lines.append(" ".join(line))
+    return lines
+
+def truncate_text(text, font, max_width):
+    """Shortens text to fit max_width, ending it with an ellipsis if it had to be cut."""
+    if get_text_length(font, text) <= max_width:
+        return text
+    length = _longest_prefix(text, lambda prefix: get_text_length(font, prefix + ELLIPSIS) <= max_width)
+    return text[:length].rstrip() + ELLIPSIS
+
+def get_line_height(font, line_spacing=DEFAULT_LINE_SPACING):
+    """Returns the distance between the baselines of two lines of text."""
+    return font.size * (1 + line_spacing)
+
+def measure_lines(lines, font, line_spacing=DEFAULT_LINE_SPACING):
+    """Returns the (width, height) of a block of lines."""
+    if not lines:
+        return 0, 0
+    width = max(get_text_length(font, line) for line in lines)
+    return width, get_line_height(font, line_spacing) * (len(lines) - 1) + font.size
+
+def fit_text(text, box_size, font_name="Jost", font_weight="normal", max_size=None, min_size=MIN_FONT_SIZE,
+             line_spacing=DEFAULT_LINE_SPACING):
+    """Finds the largest font size at which the wrapped text fits in a box.
+
+    Binary searches the font size between min_size and max_size (by default the box height), wrapping the text
+    at every candidate size. Returns (font, lines); at min_size the lines may still overflow the box.
+    """
+    box_width, box_height = box_size
+    low = int(min_size)
+    high = max(low, int(max_size or box_height))
+    best = None
+    while low <= high:
+        size = (low + high) // 2
+        font = get_font(font_name, size, font_weight)
+        lines = wrap_text(text, font, box_width)
+        width, height = measure_lines(lines, font, line_spacing)
+        if width <= box_width and height <= box_height:
+            best = (font, lines)
+            low = size + 1
+        else:
+            high = size - 1
+
+    if best is None:
+        font = get_font(font_name, int(min_size), font_weight)
+        best = (font, wrap_text(text, font, box_width))
+    return best
+
+def draw_lines(draw, lines, font, box, fill, align="center", line_spacing=DEFAULT_LINE_SPACING):
+    """Draws lines of text centered vertically in a box (left, top, right, bottom), aligned horizontally."""
+    left, top, right, bottom = box
+    _, height = measure_lines(lines, font, line_spacing)
+    y = top + (bottom - top - height) / 2
+    line_height = get_line_height(font, line_spacing)
+    for line in lines:
+        if align == "left":
+            x, anchor = left, "la"
+        elif align == "right":
+            x, anchor = right, "ra"
+        else:
+            x, anchor = (left + right) / 2, "ma"
+        # ascender anchors keep lines the same distance apart whatever their glyphs
+        draw.text((x, y), line, font=font, fill=fill, anchor=anchor)
+        y += line_height
+
+def create_styled_canvas(dimensions, settings):
+    """Creates an image styled by the base plugin's style settings, like plugin.html does for the browser.
+
+    Applies the background colour or image, the margin, the frame and the padding. Returns
+    (image, content_box, text_color) with content_box the (left, top, right, bottom) area left for content.
+    """
+    width, height = dimensions
+    image = Image.new("RGB", dimensions, (255, 255, 255))
+    text_color = _parse_color(settings.get("textColor"), (0, 0, 0))
+
+    try:
+        margin = int(settings.get("margin") or 5)
+    except ValueError:
+        margin = 5
+    body = (margin, margin, width - margin, height - margin)
+
+    if settings.get("backgroundOption") == "image" and settings.get("backgroundImageFile"):
+        try:
+            with Image.open(settings["backgroundImageFile"]) as background:
+                background = ImageOps.fit(ImageOps.exif_transpose(background).convert("RGB"),
+                                          (body[2] - body[0], body[3] - body[1]))
+            image.paste(background, body[:2])
+        except Exception as e:
+            logger.warning(f"Failed to load background image: {str(e)}")
+    elif settings.get("backgroundOption") == "color":
+        ImageDraw.Draw(image).rectangle(body, fill=_parse_color(settings.get("backgroundColor"), (255, 255, 255)))
+
+    draw = ImageDraw.Draw(image)
+    # frame sizes are relative to the viewport width, as in plugin.css
+    line_width = max(1, round(width * 0.007))
+    frame = settings.get("selectedFrame")
+    left, top, right, bottom = body[0], body[1], body[2] - 1, body[3] - 1
+    if frame == "Rectangle":
+        draw.rectangle((left, top, right, bottom), outline=text_color, width=line_width)
+    elif frame == "Top and Bottom":
+        draw.rectangle((left, top, right, top + line_width - 1), fill=text_color)
+        draw.rectangle((left, bottom - line_width + 1, right, bottom), fill=text_color)
+    elif frame == "Corner":
+        corner = round(width * 0.1)
+        bottom_width = max(1, round(width * 0.005))
+        draw.rectangle((left, top, left + corner, top + line_width - 1), fill=text_color)
+        draw.rectangle((left, top, left + line_width - 1, top + corner), fill=text_color)
+        draw.rectangle((right - corner, bottom - bottom_width + 1, right, bottom), fill=text_color)
+        draw.rectangle((right - bottom_width + 1, bottom - corner, right, bottom), fill=text_color)
+
+    padding = round(width * 0.015)
+    border = line_width if frame in ("Rectangle", "Top and Bottom") else 0
+    content_box = (
+        body[0] + padding + (border if frame == "Rectangle" else 0),
+        body[1] + padding + border,
+        body[2] - padding - (border if frame == "Rectangle" else 0),
+        body[3] - padding - border
+    )
+    return image, content_box, text_color
+
+def _parse_color(value, default):
+    if not value:
+        return default
+    try:
+        return ImageColor.getrgb(value)
+    except ValueError:
+        return default
+
+def _break_word(word, font, max_width):
+    pieces = []
+    while get_text_length(font, word) > max_width:
+        # at least one character per line, even if it is wider than max_width
+        length = max(1, _longest_prefix(word, lambda prefix: get_text_length(font, prefix) <= max_width))
+        pieces.append(word[:length])
+        word = word[length:]
+    pieces.append(word)
+    return pieces
+
+def _longest_prefix(text, fits):
+    """Returns the length of the longest prefix of text for which fits(prefix) holds, by binary search."""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(text[:middle]):
+            low = middle
+        else:
+            high = middle - 1
+    return low